@@ -0,0 +1,271 @@
+"""
+performance regression benchmark of the OpenMM RE-EDS engines
+
+every engine variant runs a short RE-EDS simulation of the six benzene derivatives in vacuum
+(examples/openmm/input) on a CPU platform (OPENMM_DEFAULT_PLATFORM, no GPU is used). the serial
+engines run in one process, the parallel engines with mpirun -n num_replicas.
+
+the time of every run is split into phases by timing the engine methods (exclusive times, i.e. the
+time of a nested phase is not counted for the enclosing one):
+
+  md:       propagation (EDSSimulation.step, for the serial engines everything not in the other phases)
+  energy:   evaluation of the end-state energies (get_Vi, get_VR, end_state_energies)
+  exchange: replica exchanges, including the MPI communication of the parallel engines
+  io:       energy trajectories (including gathering the energies on rank 0), repdat files, checkpoints and state files
+  other:    remaining time of run (parallel engines)
+
+the results are printed and written as JSON, optionally together with the relative change of the
+steps/s with respect to a previous result file.
+
+the results are written to benchmarks/results (not tracked by git) by default.
+
+usage:
+    python benchmarks/engines.py --platform CPU
+    python benchmarks/engines.py --engines parallel CI_parallel --output benchmarks/results/engines_new.json --compare benchmarks/results/engines.json
+"""
+
+import argparse
+import datetime
+import functools
+import importlib
+import json
+import os
+import platform as platform_module
+import subprocess
+import sys
+import tempfile
+import time
+
+ENGINES = {
+  "reeds_openmm": ("serial", "reeds.openmm.reeds_openmm"),
+  "custom_integrator": ("serial", "reeds.openmm.reeds_openmm_custom_integrator"),
+  "parallel": ("mpi", "reeds.openmm.reeds_openmm_parallel"),
+  "CI_parallel": ("mpi", "reeds.openmm.reeds_openmm_CI_parallel"),
+  "CustomCVForce_parallel": ("mpi", "reeds.openmm.reeds_openmm_CustomCVForce_parallel"),
+  "parallel_ptp": ("mpi", "reeds.openmm.reeds_openmm_parallel_ptp"),
+}
+
+PHASES = ["md", "energy", "exchange", "io", "other"]
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# method name -> phase, looked up on the engine classes (methods which do not exist are skipped)
+TIMED_METHODS = {
+  "serial": {
+    "Reeds": {"run": "md", "end_state_energies": "energy", "exchange_probability": "exchange", "save_state": "io"},
+  },
+  "mpi": {
+    "EDSSimulation": {"step": "md", "get_Vi": "energy", "get_VR": "energy", "minimizeEnergy": "setup"},
+    "REEDS": {"run": "other", "perform_replica_exchanges": "exchange", "write_ene_traj": "io",
+              "flush_output": "io", "save_checkpoint": "io", "save_state": "io"},
+  },
+}
+
+input_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "examples", "openmm", "input")
+
+# set A in vacuum, see examples/openmm/set_A_vacuum_parallel.py
+s_values = [1.0, 0.518, 0.393, 0.3305, 0.268, 0.225, 0.182, 0.1605, 0.139, 0.1055, 0.0887, 0.072, 0.0546, 0.0373, 0.0193, 0.01]
+energy_offsets = [0.0, -25.13, -94.15, 105.73, 122.62, 139.76]
+restraint_pairs = [[31,78], [34,75], [35,80], [32,77], [16,52], [19,49], [18,54], [15,51], [49,78], [52,75], [53,80], [50,77], [1,32], [4,35], [5,34], [2,31], [16,64], [19,67], [18,66], [15,63], [2,67], [5,64], [4,65], [1,68]]
+
+class PhaseTimer:
+  """
+  accumulates the exclusive wall-clock time of nested phases
+  """
+  def __init__(self):
+    self.times = {}
+    self.stack = []
+    self.last = None
+
+  def enter(self, phase):
+    now = time.perf_counter()
+    if self.stack:
+      self.times[self.stack[-1]] = self.times.get(self.stack[-1], 0.0) + now - self.last
+    self.stack.append(phase)
+    self.last = now
+
+  def exit(self):
+    now = time.perf_counter()
+    phase = self.stack.pop()
+    self.times[phase] = self.times.get(phase, 0.0) + now - self.last
+    self.last = now
+
+  def wrap(self, function, phase):
+    @functools.wraps(function)
+    def timed(*args, **kwargs):
+      self.enter(phase)
+      try:
+        return function(*args, **kwargs)
+      finally:
+        self.exit()
+    return timed
+
+class TimedFile:
+  """
+  file proxy which counts write and flush calls as io
+  """
+  def __init__(self, file, timer):
+    self.file = file
+    self.write = timer.wrap(file.write, "io")
+    self.flush = timer.wrap(file.flush, "io")
+
+  def __getattr__(self, name):
+    return getattr(self.file, name)
+
+def instrument(module, kind, timer):
+  for class_name, methods in TIMED_METHODS[kind].items():
+    cls = getattr(module, class_name)
+    for method, phase in methods.items():
+      if hasattr(cls, method):
+        setattr(cls, method, timer.wrap(getattr(cls, method), phase))
+  if kind == "serial":
+    # the custom integrator engine writes its state files with app.Simulation.saveState
+    module.app.Simulation.saveState = timer.wrap(module.app.Simulation.saveState, "io")
+
+def run_worker(args):
+  """
+  runs one engine in the current process (one MPI rank for the parallel engines) and writes the timings as JSON
+  """
+  kind, module_name = ENGINES[args.engine]
+  module = importlib.import_module(module_name)
+  timer = PhaseTimer()
+  instrument(module, kind, timer)
+
+  parameter_file = os.path.join(input_dir, "all_ligands_vac.leap.prm")
+  coordinate_file = os.path.join(input_dir, "all_ligands_vac.leap.crd")
+  replica_s_values = module.np.array(s_values[:: len(s_values) // args.num_replicas][: args.num_replicas])
+  variables = dict(total_steps = args.total_steps, num_steps_between_exchanges = args.num_steps_between_exchanges,
+                   distance_restraints_start_at_1 = True, eps_reaction_field = 1, pressure = None)
+
+  os.chdir(args.work_dir)
+  start = time.perf_counter()
+  if kind == "serial":
+    simulation_variables = module.ReedsSimulationVariables(replica_s_values, module.np.array(energy_offsets), restraint_pairs, **variables)
+    simulation = module.Reeds(args.engine, simulation_variables, module.ReedsInputFiles(parameter_file, coordinate_file))
+    simulation.ene_traj_files = [TimedFile(file, timer) for file in simulation.ene_traj_files]
+    simulation.repdat = TimedFile(simulation.repdat, timer)
+    simulation.repdat_gromos = TimedFile(simulation.repdat_gromos, timer)
+    rank, comm = 0, None
+  else:
+    # GPU-free benchmark: the DevicePolicy picks the platform of OPENMM_DEFAULT_PLATFORM and OPENMM_CPU_THREADS threads
+    simulation_variables = module.REEDSSimulationVariables(replica_s_values, module.np.array(energy_offsets), restraint_pairs, **variables)
+    simulation = module.REEDS(args.engine, simulation_variables, module.REEDSInputFiles(parameter_file, coordinate_file))
+    comm = module.MPI.COMM_WORLD
+    rank = comm.Get_rank()
+  setup_time = time.perf_counter() - start
+  if comm is not None:
+    # the setup time differs between ranks, rank 0 would otherwise wait for the others in its first exchange
+    comm.Barrier()
+
+  start = time.perf_counter()
+  simulation.run()
+  wall_time = time.perf_counter() - start
+
+  phases = {phase: timer.times.get(phase, 0.0) for phase in PHASES}
+  run_time = wall_time - timer.times.get("setup", 0.0)
+  rank_result = {"rank": rank, "setup_time": setup_time, "minimization_time": timer.times.get("setup", 0.0), "run_time": run_time, "phases": phases}
+  ranks = comm.gather(rank_result, root = 0) if comm is not None else [rank_result]
+
+  if rank == 0:
+    # the slowest rank determines the time of the parallel engines
+    run_time = max(r["run_time"] for r in ranks)
+    result = {
+      "engine": args.engine,
+      "num_replicas": args.num_replicas,
+      "total_steps": args.total_steps,
+      "num_steps_between_exchanges": args.num_steps_between_exchanges,
+      "setup_time": max(r["setup_time"] for r in ranks),
+      "run_time": run_time,
+      "steps_per_second": args.total_steps / run_time,
+      "replica_steps_per_second": args.total_steps * args.num_replicas / run_time,
+      "phases": {phase: max(r["phases"][phase] for r in ranks) for phase in PHASES},
+      "ranks": ranks,
+    }
+    with open(args.result_file, "w") as file:
+      json.dump(result, file)
+
+def run_engine(engine, args):
+  """
+  runs the worker for engine in a subprocess (with mpirun for the parallel engines) and returns its result
+  """
+  kind, _ = ENGINES[engine]
+  with tempfile.TemporaryDirectory(prefix = f"reeds_benchmark_{engine}_") as work_dir:
+    result_file = os.path.join(work_dir, "result.json")
+    command = [sys.executable, os.path.abspath(__file__), "--worker", engine,
+               "--work-dir", work_dir, "--result-file", result_file,
+               "--num-replicas", str(args.num_replicas), "--total-steps", str(args.total_steps),
+               "--num-steps-between-exchanges", str(args.num_steps_between_exchanges)]
+    if kind == "mpi":
+      command = args.mpirun.split() + ["-n", str(args.num_replicas)] + command
+    env = dict(os.environ, OPENMM_DEFAULT_PLATFORM = args.platform)
+    if args.platform == "CPU":
+      env.setdefault("OPENMM_CPU_THREADS", str(args.threads if kind == "serial" else max(1, args.threads // args.num_replicas)))
+    process = subprocess.run(command, env = env, capture_output = True, text = True)
+    if process.returncode != 0 or not os.path.exists(result_file):
+      return {"engine": engine, "error": process.stderr[-2000:]}
+    with open(result_file) as file:
+      return json.load(file)
+
+def metadata(args):
+  try:
+    commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd = os.path.dirname(os.path.abspath(__file__)), capture_output = True, text = True).stdout.strip()
+  except OSError:
+    commit = None
+  import openmm
+  return {
+    "date": datetime.datetime.now().isoformat(timespec = "seconds"),
+    "host": platform_module.node(),
+    "python": platform_module.python_version(),
+    "openmm": openmm.__version__,
+    "commit": commit,
+    "platform": args.platform,
+    "threads": args.threads,
+  }
+
+def print_results(results, previous = None):
+  print(f"{'engine':<24} {'steps/s':>10} {'md [s]':>9} {'energy [s]':>11} {'exchange [s]':>13} {'io [s]':>9} {'change':>8}")
+  for result in results:
+    if "error" in result:
+      print(f"{result['engine']:<24} failed: {result['error'].strip().splitlines()[-1] if result['error'].strip() else ''}")
+      continue
+    phases = result["phases"]
+    change = ""
+    if previous is not None and result["engine"] in previous:
+      change = f"{result['steps_per_second'] / previous[result['engine']] - 1:+.1%}"
+    print(f"{result['engine']:<24} {result['steps_per_second']:>10.1f} {phases['md']:>9.2f} {phases['energy']:>11.2f} {phases['exchange']:>13.2f} {phases['io']:>9.2f} {change:>8}")
+
+def main():
+  parser = argparse.ArgumentParser(description = "performance regression benchmark of the OpenMM RE-EDS engines")
+  parser.add_argument("--engines", nargs = "+", default = list(ENGINES), choices = list(ENGINES))
+  parser.add_argument("--platform", default = "CPU", choices = ["CPU", "Reference"])
+  parser.add_argument("--threads", type = int, default = os.cpu_count(), help = "CPU threads in total (divided by the number of ranks for the parallel engines)")
+  parser.add_argument("--num-replicas", type = int, default = 4)
+  parser.add_argument("--total-steps", type = int, default = 1000)
+  parser.add_argument("--num-steps-between-exchanges", type = int, default = 20)
+  parser.add_argument("--mpirun", default = "mpirun")
+  parser.add_argument("--output", default = os.path.join(RESULTS_DIR, "engines.json"), help = "JSON result file")
+  parser.add_argument("--compare", help = "previous JSON result file")
+  parser.add_argument("--worker", choices = list(ENGINES), dest = "engine", help = argparse.SUPPRESS)
+  parser.add_argument("--work-dir", help = argparse.SUPPRESS)
+  parser.add_argument("--result-file", help = argparse.SUPPRESS)
+  args = parser.parse_args()
+
+  if args.engine is not None:
+    run_worker(args)
+    return
+  if not 2 <= args.num_replicas <= len(s_values):
+    parser.error(f"--num-replicas has to be between 2 and {len(s_values)}")
+
+  previous = None
+  if args.compare is not None:
+    with open(args.compare) as file:
+      previous = {result["engine"]: result["steps_per_second"] for result in json.load(file)["results"] if "error" not in result}
+
+  results = [run_engine(engine, args) for engine in args.engines]
+  print_results(results, previous)
+  os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok = True)
+  with open(args.output, "w") as file:
+    json.dump({"metadata": metadata(args), "results": results}, file, indent = 2)
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,226 @@
+"""
+benchmark of the per end-state vs. combined reaction field forces of hybrid topologies (ptp files)
+
+a toy system of environment particles on a lattice and a chain of perturbed particles with random per end-state
+parameters (in the amber units of the ptp files) is set up in two ways with the methods of
+reeds_openmm_parallel_ptp.EDSSimulation:
+
+  per_state: custom_reaction_field_ptp, four forces per end state in the force groups 1, 2, ...
+  combined:  custom_reaction_field_ptp_combined, the parameters of all end states are per particle parameters
+             of a single set of forces in force group 1, V_i are the derivatives with respect to scaling_i
+
+for both, the construction time of the forces, the time to evaluate all V_i and the time of an EDS step
+(V_i, scaling factors and one integrator step, as in EDSSimulation.step) are measured.
+
+the perturbed chain is held together by harmonic bonds between its neighbors (1-2, 1-3 and 1-4), otherwise the
+reaction field terms of the excluded pairs pull them apart without bound. a purely repulsive r^-12 floor between all
+particles and an energy minimization before the steps prevent the collapse of opposite charges. both are in force
+group 0, i.e. not part of V_i.
+
+usage:
+    python benchmarks/ptp_forces.py --platforms CPU --num-endstates 5 10 20
+"""
+
+import argparse
+import contextlib
+import io
+import time
+
+import numpy as np
+import openmm as mm
+from openmm import unit as u
+
+from reeds.openmm.reaction_field import NonbondedParameters, PerturbedParameters
+from reeds.openmm.reeds_openmm_parallel_ptp import EDSSimulation
+
+kb = 0.0083144626 # kJ/(mol K)
+
+class ForceBuilder:
+  """
+  the attributes of EDSSimulation used by the ptp reaction field methods
+  """
+  topology_type = "amber"
+  custom_reaction_field_ptp = EDSSimulation.custom_reaction_field_ptp
+  custom_reaction_field_ptp_combined = EDSSimulation.custom_reaction_field_ptp_combined
+
+  def __init__(self, num_endstates):
+    self.num_endstates = num_endstates
+
+def create_nonbonded_force(num_particles, num_perturbed, box_length, rng):
+  """
+  returns the NonbondedForce of the toy system, its lattice positions and the chain of perturbed particles
+  """
+  num_cells = int(np.ceil(num_particles**(1/3)))
+  # the lattice is traversed as a snake, particles with consecutive indices (the chain) are lattice neighbors
+  grid = []
+  for x in range(num_cells):
+    for y in (range(num_cells) if x % 2 == 0 else reversed(range(num_cells))):
+      row = x * num_cells + y
+      grid.extend((x, y, z) for z in (range(num_cells) if row % 2 == 0 else reversed(range(num_cells))))
+  positions = (np.array(grid[:num_particles]) + 0.5) * box_length / num_cells
+
+  force = mm.NonbondedForce()
+  force.setNonbondedMethod(mm.NonbondedForce.CutoffPeriodic)
+  force.setCutoffDistance(1.2)
+  for i in range(num_particles):
+    force.addParticle(0.4 * (-1)**i, 0.3, 0.5)
+
+  # perturbed chain in the middle of the lattice, with excluded (1-2, 1-3) and third (1-4) neighbors
+  center = num_particles // 2 - num_perturbed // 2
+  perturbed = list(range(center, center + num_perturbed))
+  for j in range(num_perturbed):
+    for k in range(j+1, min(j+4, num_perturbed)):
+      if k - j < 3:
+        force.addException(perturbed[j], perturbed[k], 0, 0.1, 0)
+      else:
+        force.addException(perturbed[j], perturbed[k], 0.1 / 1.2, 0.3, 0.25)
+  return force, positions, perturbed
+
+def create_perturbations(perturbed, num_endstates, rng):
+  """
+  random per end-state parameters [charge*18.2223, A, B] of the perturbed particles, about a third are dummy atoms
+  """
+  perturbations = {}
+  for particle in perturbed:
+    parameters = []
+    for _ in range(num_endstates):
+      if rng.uniform() < 0.3:
+        parameters.append([0.0, 0.0, 0.0])
+      else:
+        sigma = rng.uniform(2.5, 3.5) # angstrom
+        epsilon = rng.uniform(0.05, 0.2) # kcal/mol
+        parameters.append([rng.uniform(-0.5, 0.5) * 18.2223, 4 * epsilon * sigma**12, 4 * epsilon * sigma**6])
+    perturbations[particle] = parameters
+  return perturbations
+
+def create_repulsive_floor(num_particles, exclusions, sigma = 0.3, epsilon = 0.5):
+  """
+  returns a purely repulsive 4*epsilon*(sigma/r)^12 force between all particles in force group 0, with the
+  exclusions of the end-state forces (OpenMM requires identical exclusions of all nonbonded forces)
+  """
+  force = mm.CustomNonbondedForce(f"4*{epsilon}*({sigma}/r)^12")
+  force.setNonbondedMethod(mm.CustomNonbondedForce.CutoffPeriodic)
+  force.setCutoffDistance(1.2)
+  for _ in range(num_particles):
+    force.addParticle([])
+  for j, k in exclusions:
+    force.addExclusion(j, k)
+  force.setForceGroup(0)
+  return force
+
+def create_chain_bonds(nonbonded_force, positions, k = 5000.0):
+  """
+  returns harmonic bonds (force group 0) between the neighbors of the perturbed chain (the exceptions of
+  nonbonded_force) with the lattice distances as equilibrium lengths
+  """
+  force = mm.HarmonicBondForce()
+  for index in range(nonbonded_force.getNumExceptions()):
+    j, l, _, _, _ = nonbonded_force.getExceptionParameters(index)
+    force.addBond(j, l, float(np.linalg.norm(positions[j] - positions[l])), k)
+  force.setForceGroup(0)
+  return force
+
+def create_system(mode, nonbonded_force, positions, perturbations, num_endstates, box_length):
+  """
+  returns the system with the end-state forces of mode and the construction time of these forces
+  """
+  num_particles = nonbonded_force.getNumParticles()
+  system = mm.System()
+  system.setDefaultPeriodicBoxVectors(mm.Vec3(box_length, 0, 0), mm.Vec3(0, box_length, 0), mm.Vec3(0, 0, box_length))
+  for _ in range(num_particles):
+    system.addParticle(16.0)
+
+  builder = ForceBuilder(num_endstates)
+  environment_particles = [i for i in range(num_particles) if i not in perturbations]
+  forces = []
+  start = time.perf_counter()
+  with contextlib.redirect_stdout(io.StringIO()):
+    if mode == "per_state":
+      for i in range(num_endstates):
+        for force in builder.custom_reaction_field_ptp(i, nonbonded_force, perturbations, environment_particles):
+          force.setForceGroup(i+1)
+          forces.append(force)
+    else:
+      perturbed_parameters = PerturbedParameters(NonbondedParameters(nonbonded_force), perturbations, num_endstates)
+      for force in builder.custom_reaction_field_ptp_combined(nonbonded_force, perturbed_parameters, environment_particles):
+        force.setForceGroup(1)
+        forces.append(force)
+  construction_time = time.perf_counter() - start
+
+  for force in forces:
+    if not isinstance(force, mm.CustomBondForce) or force.getNumBonds():
+      system.addForce(force)
+  custom_nonbonded = [force for force in forces if isinstance(force, mm.CustomNonbondedForce)]
+  exclusions = [custom_nonbonded[0].getExclusionParticles(i) for i in range(custom_nonbonded[0].getNumExclusions())] if custom_nonbonded else []
+  system.addForce(create_repulsive_floor(num_particles, exclusions))
+  system.addForce(create_chain_bonds(nonbonded_force, positions))
+  return system, construction_time
+
+def get_Vi(mode, context, num_endstates):
+  if mode == "per_state":
+    return np.array([context.getState(getEnergy = True, groups = 1<<i+1).getPotentialEnergy().value_in_unit(u.kilojoule_per_mole) for i in range(num_endstates)])
+  derivatives = context.getState(getParameterDerivatives = True, groups = 1<<1).getEnergyParameterDerivatives()
+  return np.array([derivatives['scaling_' + str(i)] for i in range(num_endstates)])
+
+def eds_step(mode, context, integrator, num_endstates, s, beta, steps):
+  scaling_parameters = ['scaling_' + str(j) for j in range(num_endstates)]
+  for step in range(steps):
+    for name in scaling_parameters:
+      context.setParameter(name, 1.0)
+    Vi = get_Vi(mode, context, num_endstates)
+    terms = np.exp(-beta * s * (Vi - np.min(Vi)))
+    for name, scaling in zip(scaling_parameters, terms / np.sum(terms)):
+      context.setParameter(name, scaling)
+    integrator.step(1)
+
+def benchmark(platform_name, num_endstates, num_particles, num_perturbed, num_steps, seed = 1):
+  temperature = 298.15
+  beta = 1 / (kb * temperature)
+  box_length = 4.0
+  rng = np.random.default_rng(seed)
+  nonbonded_force, positions, perturbed = create_nonbonded_force(num_particles, num_perturbed, box_length, rng)
+  perturbations = create_perturbations(perturbed, num_endstates, rng)
+
+  results = {}
+  for mode in ["per_state", "combined"]:
+    system, construction_time = create_system(mode, nonbonded_force, positions, perturbations, num_endstates, box_length)
+    integrator = mm.LangevinMiddleIntegrator(temperature * u.kelvin, 1 / u.picoseconds, 0.001 * u.picoseconds)
+    integrator.setRandomNumberSeed(seed)
+    context = mm.Context(system, integrator, mm.Platform.getPlatformByName(platform_name))
+    context.setPositions(positions * u.nanometer)
+    # the energies of both modes are compared at the lattice positions
+    Vi = get_Vi(mode, context, num_endstates)
+    # minimized with all end states at scaling 1, the timings do not depend on the start
+    mm.LocalEnergyMinimizer.minimize(context, 10, 500)
+    context.setVelocitiesToTemperature(temperature * u.kelvin, seed)
+
+    start = time.perf_counter()
+    for _ in range(num_steps):
+      get_Vi(mode, context, num_endstates)
+    Vi_time = (time.perf_counter() - start) / num_steps
+
+    start = time.perf_counter()
+    eds_step(mode, context, integrator, num_endstates, 0.1, beta, num_steps)
+    step_time = (time.perf_counter() - start) / num_steps
+    results[mode] = {"construction": construction_time, "Vi": Vi_time, "step": step_time, "energies": Vi}
+  return results
+
+def main():
+  parser = argparse.ArgumentParser(description = "per end-state vs. combined reaction field forces of hybrid topologies")
+  parser.add_argument("--platforms", nargs = "+", default = ["CPU"])
+  parser.add_argument("--num-endstates", type = int, nargs = "+", default = [5, 10])
+  parser.add_argument("--num-particles", type = int, default = 1000)
+  parser.add_argument("--num-perturbed", type = int, default = 30)
+  parser.add_argument("--num-steps", type = int, default = 50)
+  args = parser.parse_args()
+
+  print(f"{'platform':<12} {'states':>6} {'forces':>10} {'construction [s]':>18} {'V_i [ms]':>10} {'step [ms]':>10} {'max |dV_i|':>12}")
+  for platform_name in args.platforms:
+    for num_endstates in args.num_endstates:
+      results = benchmark(platform_name, num_endstates, args.num_particles, args.num_perturbed, args.num_steps)
+      deviation = np.max(np.abs(results["per_state"]["energies"] - results["combined"]["energies"]))
+      for mode, result in results.items():
+        print(f"{platform_name:<12} {num_endstates:>6} {mode:>10} {result['construction']:>18.4f} {1000*result['Vi']:>10.3f} {1000*result['step']:>10.3f} {deviation:>12.2e}")
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,113 @@
+"""
+benchmark of the python overhead of the EDS step dispatch
+
+a small vacuum toy system with num_endstates end states (harmonic chains in the force groups 1, 2, ...)
+is propagated in two ways:
+
+  python: as in reeds_openmm_parallel.EDSSimulation.step, the scaling factors are calculated in python
+          from the end-state energies and the integrator is called for every single step
+  device: as in reeds_openmm_CustomCVForce_parallel, the reference state is a CustomCVForce and all steps
+          between two exchanges are performed with a single call of step
+
+usage:
+    python benchmarks/step_dispatch.py --platforms CPU Reference --num-steps 2000
+"""
+
+import argparse
+import time
+
+import numpy as np
+import openmm as mm
+from openmm import unit as u
+
+kb = 0.0083144626 # kJ/(mol K)
+
+def end_state_force(particles, scaling_parameter = None):
+  energy = "0.5*k*(r-r0)^2; k = 1000; r0 = 0.15"
+  if scaling_parameter is not None:
+    energy = scaling_parameter + "*" + energy
+  force = mm.CustomBondForce(energy)
+  if scaling_parameter is not None:
+    force.addGlobalParameter(scaling_parameter, 1.0)
+  for j, k in zip(particles[:-1], particles[1:]):
+    force.addBond(j, k, [])
+  return force
+
+def create_system(num_endstates, particles_per_state, mode, s, beta, energy_offsets):
+  system = mm.System()
+  for _ in range(num_endstates * particles_per_state):
+    system.addParticle(12.0)
+
+  if mode == "python":
+    for i in range(num_endstates):
+      force = end_state_force(list(range(i * particles_per_state, (i+1) * particles_per_state)), f"scaling_{i}")
+      force.setForceGroup(i+1)
+      system.addForce(force)
+  else:
+    energy = "-1/(beta*s)*log(" + "+".join([f"exp(-beta*s*(v{i}-eoff{i}))" for i in range(num_endstates)]) + ");"
+    energy += f"beta = {beta:f};"
+    cvforce = mm.CustomCVForce(energy)
+    cvforce.addGlobalParameter("s", s)
+    for i in range(num_endstates):
+      cvforce.addGlobalParameter(f"eoff{i}", energy_offsets[i])
+      force = end_state_force(list(range(i * particles_per_state, (i+1) * particles_per_state)))
+      force.setForceGroup(i+2)
+      cvforce.addCollectiveVariable(f"v{i}", force)
+    cvforce.setForceGroup(1)
+    system.addForce(cvforce)
+  return system
+
+def python_step(context, integrator, num_endstates, s, beta, energy_offsets, steps):
+  scaling_parameters = [f"scaling_{j}" for j in range(num_endstates)]
+  for step in range(steps):
+    for name in scaling_parameters:
+      context.setParameter(name, 1.0)
+    Vi = np.array([context.getState(getEnergy = True, groups = 1<<j+1).getPotentialEnergy().value_in_unit(u.kilojoule_per_mole) for j in range(num_endstates)])
+    terms = np.exp(-beta * s * (Vi - energy_offsets))
+    for name, scaling in zip(scaling_parameters, terms / np.sum(terms)):
+      context.setParameter(name, scaling)
+    integrator.step(1)
+
+def benchmark(platform_name, mode, num_endstates, particles_per_state, num_steps, num_steps_between_exchanges):
+  temperature = 298.15
+  beta = 1 / (kb * temperature)
+  s = 0.1
+  energy_offsets = np.zeros(num_endstates)
+
+  system = create_system(num_endstates, particles_per_state, mode, s, beta, energy_offsets)
+  integrator = mm.LangevinMiddleIntegrator(temperature * u.kelvin, 1 / u.picoseconds, 0.002 * u.picoseconds)
+  context = mm.Context(system, integrator, mm.Platform.getPlatformByName(platform_name))
+  positions = np.zeros((system.getNumParticles(), 3))
+  positions[:, 0] = np.arange(system.getNumParticles()) * 0.15
+  positions[:, 1] = np.repeat(np.arange(num_endstates), particles_per_state)
+  context.setPositions(positions * u.nanometer)
+  context.setVelocitiesToTemperature(temperature * u.kelvin)
+
+  start = time.perf_counter()
+  for _ in range(num_steps // num_steps_between_exchanges):
+    if mode == "python":
+      python_step(context, integrator, num_endstates, s, beta, energy_offsets, num_steps_between_exchanges)
+    else:
+      integrator.step(num_steps_between_exchanges)
+    # energies for the energy trajectory, as done once per exchange interval by the engines
+    context.getState(getEnergy = True)
+  return (time.perf_counter() - start) / num_steps
+
+def main():
+  parser = argparse.ArgumentParser(description = "python vs. on-device scaling of the EDS step")
+  parser.add_argument("--platforms", nargs = "+", default = ["CPU", "Reference"])
+  parser.add_argument("--num-endstates", type = int, default = 5)
+  parser.add_argument("--particles-per-state", type = int, default = 20)
+  parser.add_argument("--num-steps", type = int, default = 2000)
+  parser.add_argument("--num-steps-between-exchanges", type = int, default = 20)
+  args = parser.parse_args()
+
+  print(f"{'platform':<12} {'python [ms/step]':>18} {'device [ms/step]':>18} {'speedup':>10}")
+  for platform_name in args.platforms:
+    times = {}
+    for mode in ["python", "device"]:
+      times[mode] = benchmark(platform_name, mode, args.num_endstates, args.particles_per_state, args.num_steps, args.num_steps_between_exchanges)
+    print(f"{platform_name:<12} {1000*times['python']:>18.4f} {1000*times['device']:>18.4f} {times['python']/times['device']:>10.1f}")
+
+if __name__ == "__main__":
+  main()
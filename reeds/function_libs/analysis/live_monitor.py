@@ -0,0 +1,389 @@
+"""
+    live monitoring of running RE-EDS simulations
+
+    The LiveREEDSMonitor follows the energy trajectories and the repdat file of a running simulation with
+    tail readers and updates the sampling fractions, the exchange frequencies and the Zwanzig free energy
+    differences with the new frames only. The free energies are accumulated as running log-sum-exp, so an
+    update costs O(new data) and the memory does not grow with the simulation length.
+"""
+import json
+import os
+import re
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+from scipy import constants as const
+from scipy.special import logsumexp
+
+from reeds.function_libs.file_management.tail_reader import TailReader, open_tail_reader
+
+# V_1 (OpenMM) or e1 (GROMOS) and V_R or eR
+_state_column_pattern = re.compile(r"^(?:V_|e)(\d+)$")
+_reference_columns = ("V_R", "eR")
+
+
+class ZwanzigAccumulator:
+    """ZwanzigAccumulator
+    running Zwanzig (exponential averaging) free energy differences between the end states, relative to the
+    reference state: dF_ij = -kT ln(<exp(-(V_j - V_R)/kT)>_R / <exp(-(V_i - V_R)/kT)>_R)
+    """
+
+    def __init__(self, num_states: int, temperature: float = 298.0):
+        """
+        Parameters
+        ----------
+        num_states : int
+            number of end states
+        temperature : float, optional
+            temperature in K (default 298.0)
+        """
+        self.num_states = num_states
+        self.kt = (temperature * const.k * const.Avogadro) / 1000  # in kJ/mol
+        self.num_frames = 0
+        self.log_sum_exp = np.full(num_states, -np.inf)
+
+    def update(self, state_energies: np.ndarray, reference_energies: np.ndarray):
+        """update
+        adds frames
+
+        Parameters
+        ----------
+        state_energies : np.ndarray
+            energies of the end states (frames x states) in kJ/mol
+        reference_energies : np.ndarray
+            energies of the reference state (frames) in kJ/mol
+        """
+        if (len(reference_energies) == 0):
+            return
+        exponents = -(np.asarray(state_energies) - np.asarray(reference_energies)[:, None]) / self.kt
+        self.log_sum_exp = logsumexp(np.vstack([self.log_sum_exp[None, :], exponents]), axis=0)
+        self.num_frames += len(reference_energies)
+
+    def free_energy_differences(self) -> np.ndarray:
+        """free_energy_differences
+
+        Returns
+        -------
+        np.ndarray
+            dF_ij = F_j - F_i (states x states) in kJ/mol, nan without frames
+        """
+        if (self.num_frames == 0):
+            return np.full((self.num_states, self.num_states), np.nan)
+        return -self.kt * (self.log_sum_exp[None, :] - self.log_sum_exp[:, None])
+
+
+class LiveREEDSMonitor:
+    """LiveREEDSMonitor
+    follows the output of a running RE-EDS simulation
+    """
+
+    def __init__(self, ene_traj_paths: List[str], repdat_path: str = None, temperature: float = 298.0,
+                 energy_offsets: List[List[float]] = None, verbose: bool = False):
+        """
+        Parameters
+        ----------
+        ene_traj_paths : List[str]
+            energy trajectories, one per s value (ene_traj_<name>_<i>, .bin or GROMOS energies .dat)
+        repdat_path : str, optional
+            repdat file (OpenMM repdat_<name> or GROMOS repdat) (default None)
+        temperature : float, optional
+            temperature in K (default 298.0)
+        energy_offsets : List[List[float]], optional
+            energy offsets of each s value, for the maximal contributing state sampling (default None)
+        verbose : bool, optional
+            print a report at each update (default False)
+        """
+        self.ene_traj_readers = [open_tail_reader(path) for path in ene_traj_paths]
+        self.repdat_reader = open_tail_reader(repdat_path) if (repdat_path is not None) else None
+        self.temperature = temperature
+        self.energy_offsets = None if (energy_offsets is None) else np.array(energy_offsets, dtype=np.float64)
+        self.verbose = verbose
+        self.num_replicas = len(ene_traj_paths)
+        self.num_states = None
+        self.num_updates = 0
+
+        self.exchange_scheme = None
+        self._reset_exchanges("metropolis")
+        self._repdat_resets = 0
+        self._replicas: List[Dict] = [None] * self.num_replicas
+
+    @classmethod
+    def from_openmm_output(cls, system_name: str, num_replicas: int, in_folder: str = ".",
+                           output_format: str = "text", **kwargs) -> "LiveREEDSMonitor":
+        """from_openmm_output
+        monitor of the output files of the OpenMM RE-EDS simulation of system_name
+
+        Parameters
+        ----------
+        system_name : str
+            name of the system
+        num_replicas : int
+            number of s values
+        in_folder : str, optional
+            folder of the simulation (default ".")
+        output_format : str, optional
+            "text" or "binary" (default "text")
+        kwargs
+            see LiveREEDSMonitor
+
+        Returns
+        -------
+        LiveREEDSMonitor
+        """
+        suffix = ".bin" if (output_format == "binary") else ""
+        if (num_replicas > 1):
+            ene_traj_paths = [os.path.join(in_folder, "ene_traj_" + system_name + "_" + str(i) + suffix) for i in range(1, num_replicas + 1)]
+        else:
+            ene_traj_paths = [os.path.join(in_folder, "ene_traj_" + system_name + suffix)]
+        return cls(ene_traj_paths, os.path.join(in_folder, "repdat_" + system_name + suffix), **kwargs)
+
+    def _init_replica(self, replicaID: int, columns: List[str]) -> Dict:
+        states = {int(_state_column_pattern.match(column).group(1)): column for column in columns
+                  if (_state_column_pattern.match(column))}
+        reference = [column for column in columns if (column in _reference_columns)]
+        if (len(states) == 0 or len(reference) == 0):
+            raise ValueError("could not find the state energies in " + self.ene_traj_readers[replicaID].in_path +
+                             " (columns: " + str(columns) + ")")
+        if (self.num_states is None):
+            self.num_states = len(states)
+        return {"state_columns": [states[state] for state in sorted(states)], "reference_column": reference[0],
+                "num_resets": self.ene_traj_readers[replicaID].num_resets, "num_frames": 0,
+                "minV_state": np.zeros(len(states), dtype=np.int64),
+                "max_contributing_state": np.zeros(len(states), dtype=np.int64),
+                "zwanzig": ZwanzigAccumulator(len(states), self.temperature)}
+
+    def _update_energies(self, replicaID: int, reader: TailReader):
+        new_frames = reader.read_new()
+        replica = self._replicas[replicaID]
+        # a restarted output is followed from its beginning again
+        if (replica is not None and replica["num_resets"] != reader.num_resets):
+            replica = self._replicas[replicaID] = None
+        if (len(new_frames) == 0):
+            return
+        if (replica is None):
+            replica = self._replicas[replicaID] = self._init_replica(replicaID, reader.columns)
+
+        state_energies = new_frames[replica["state_columns"]].to_numpy()
+        reference_energies = new_frames[replica["reference_column"]].to_numpy()
+        replica["num_frames"] += len(new_frames)
+        replica["minV_state"] += np.bincount(np.argmin(state_energies, axis=1), minlength=self.num_states)
+        if (self.energy_offsets is not None):
+            contributions = state_energies - self.energy_offsets[replicaID]
+            replica["max_contributing_state"] += np.bincount(np.argmin(contributions, axis=1), minlength=self.num_states)
+        replica["zwanzig"].update(state_energies, reference_energies)
+
+    def _reset_exchanges(self, exchange_scheme: str):
+        # metropolis: counted per neighbouring s value pair, gibbs: counted per position
+        self.exchange_scheme = exchange_scheme
+        num_counters = self.num_replicas if (exchange_scheme == "gibbs") else max(self.num_replicas - 1, 0)
+        self.exchange_attempts = np.zeros(num_counters, dtype=np.int64)
+        self.exchanges = np.zeros(num_counters, dtype=np.int64)
+
+    def _update_exchanges(self):
+        new_exchanges = self.repdat_reader.read_new()
+        if (self.repdat_reader.num_resets != self._repdat_resets):
+            self._repdat_resets = self.repdat_reader.num_resets
+            self._reset_exchanges("metropolis")
+        if (len(new_exchanges) == 0 or self.num_replicas < 2):
+            return
+
+        if ("exchanged" in new_exchanges.columns):
+            # OpenMM metropolis: one row per attempt, pair index partner_i (s index, starting at 0), partner_j = i + 1
+            pairs = new_exchanges["partner_i"].to_numpy(dtype=np.int64)
+            partners = new_exchanges["partner_j"].to_numpy(dtype=np.int64)
+            accepted = new_exchanges["exchanged"].to_numpy()
+            if (self.exchange_scheme != "gibbs" and np.any(partners != pairs + 1)):
+                # Gibbs exchanges: one row per position partner_i, partner_j is the position the replica moves to
+                # (any position, itself if it stays). counted per position from here on, the counts of the rows
+                # read before (only neighbour-like rows) are discarded
+                self._reset_exchanges("gibbs")
+        else:
+            # GROMOS: one row per replica, the pair is counted once (ID < partner), s is the exchange flag
+            attempts = new_exchanges[new_exchanges["ID"] < new_exchanges["partner"]]
+            pairs = attempts["ID"].to_numpy(dtype=np.int64) - 1
+            accepted = attempts["s"].to_numpy()
+        valid = (pairs >= 0) & (pairs < len(self.exchange_attempts))
+        self.exchange_attempts += np.bincount(pairs[valid], minlength=len(self.exchange_attempts))
+        self.exchanges += np.bincount(pairs[valid], weights=accepted[valid], minlength=len(self.exchanges)).astype(np.int64)
+
+    def update(self) -> Dict:
+        """update
+        parses the new frames and exchanges of all files
+
+        Returns
+        -------
+        Dict
+            summary (see summary)
+        """
+        for replicaID, reader in enumerate(self.ene_traj_readers):
+            self._update_energies(replicaID, reader)
+        if (self.repdat_reader is not None):
+            self._update_exchanges()
+        self.num_updates += 1
+        if (self.verbose): print(self.report())
+        return self.summary()
+
+    def num_frames(self) -> List[int]:
+        """number of frames of each s value"""
+        return [0 if (replica is None) else replica["num_frames"] for replica in self._replicas]
+
+    def sampling_fractions(self, definition: str = "minV_state") -> np.ndarray:
+        """sampling_fractions
+
+        Parameters
+        ----------
+        definition : str, optional
+            "minV_state" (state with the lowest energy) or "max_contributing_state" (lowest energy minus
+            offset, needs energy_offsets) (default "minV_state")
+
+        Returns
+        -------
+        np.ndarray
+            fraction of frames sampling each state (s values x states), nan without frames
+        """
+        if (definition == "max_contributing_state" and self.energy_offsets is None):
+            raise ValueError("the max_contributing_state sampling needs the energy_offsets")
+        fractions = np.full((self.num_replicas, self.num_states or 0), np.nan)
+        for replicaID, replica in enumerate(self._replicas):
+            if (replica is not None and replica["num_frames"] > 0):
+                fractions[replicaID] = replica[definition] / replica["num_frames"]
+        return fractions
+
+    def exchange_frequencies(self) -> np.ndarray:
+        """exchange_frequencies
+
+        Returns
+        -------
+        np.ndarray
+            accepted / attempted exchanges of each neighbouring s value pair (s values - 1, metropolis) or fraction
+            of the exchanges in which the replica at each position moved (s values, gibbs), nan without attempts
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.exchange_attempts > 0, self.exchanges / np.maximum(self.exchange_attempts, 1), np.nan)
+
+    def free_energy_differences(self, replicaID: int = 0) -> np.ndarray:
+        """free_energy_differences
+        running Zwanzig free energy differences of the s value with index replicaID (default 0, s = 1)
+
+        Returns
+        -------
+        np.ndarray
+            dF_ij = F_j - F_i (states x states) in kJ/mol
+        """
+        replica = self._replicas[replicaID]
+        if (replica is None):
+            return np.full((self.num_states or 0, self.num_states or 0), np.nan)
+        return replica["zwanzig"].free_energy_differences()
+
+    def check(self, min_exchange_frequency: float = 0.0, min_sampling_fraction: float = 0.0,
+              min_frames: int = 100) -> List[str]:
+        """check
+        finds signs of a bad run, e.g. to stop it early
+
+        Parameters
+        ----------
+        min_exchange_frequency : float, optional
+            minimal exchange frequency of each pair (gibbs: of each position) (default 0.0)
+        min_sampling_fraction : float, optional
+            minimal fraction of frames each state is sampled (minV_state) at s = 1 (default 0.0)
+        min_frames : int, optional
+            number of frames (attempts) needed before a fraction (frequency) is judged (default 100)
+
+        Returns
+        -------
+        List[str]
+            problems found, empty if none
+        """
+        problems = []
+        for pair, (attempts, frequency) in enumerate(zip(self.exchange_attempts, self.exchange_frequencies())):
+            if (attempts >= min_frames and frequency < min_exchange_frequency):
+                if (self.exchange_scheme == "gibbs"):
+                    where = "of s value position " + str(pair + 1)
+                else:
+                    where = "between s values " + str(pair + 1) + " and " + str(pair + 2)
+                problems.append("exchange frequency " + where + " is " + str(round(frequency, 3)) + " after " +
+                                str(attempts) + " attempts")
+        if (self.num_frames()[0] >= min_frames):
+            for state, fraction in enumerate(self.sampling_fractions()[0]):
+                if (fraction < min_sampling_fraction):
+                    problems.append("state " + str(state + 1) + " is sampled in " + str(round(fraction, 3)) +
+                                    " of the frames at s = 1")
+        return problems
+
+    def summary(self) -> Dict:
+        """summary
+
+        Returns
+        -------
+        Dict
+            JSON serializable state of the monitor
+        """
+        def as_list(values: np.ndarray) -> List:
+            return [None if (np.isnan(value)) else float(value) for value in np.ravel(values)]
+
+        summary = {"time": time.time(), "num_updates": self.num_updates, "num_frames": self.num_frames(),
+                   "exchange_scheme": self.exchange_scheme, "exchange_attempts": self.exchange_attempts.tolist(),
+                   "exchange_frequencies": as_list(self.exchange_frequencies()),
+                   "sampling_fractions": {"minV_state": [as_list(row) for row in self.sampling_fractions()]},
+                   "free_energy_differences": {}}
+        if (self.energy_offsets is not None):
+            summary["sampling_fractions"]["max_contributing_state"] = [
+                as_list(row) for row in self.sampling_fractions("max_contributing_state")]
+        if (self._replicas[0] is not None):
+            dF = self.free_energy_differences(0)
+            summary["free_energy_differences"] = {str(i + 1) + "_" + str(j + 1): float(dF[i, j])
+                                                  for i in range(self.num_states) for j in range(i + 1, self.num_states)}
+        return summary
+
+    def report(self) -> str:
+        """report
+
+        Returns
+        -------
+        str
+            human readable summary
+        """
+        report = "update " + str(self.num_updates) + ": frames " + str(self.num_frames()) + "\n"
+        if (len(self.exchange_attempts) > 0):
+            report += "exchange frequencies (" + self.exchange_scheme + "): " + \
+                      str(np.round(self.exchange_frequencies(), 3).tolist()) + "\n"
+        if (self.num_states is not None):
+            report += "sampling fractions (s = 1): " + str(np.round(self.sampling_fractions()[0], 3).tolist()) + "\n"
+            report += "dF_1j (s = 1): " + str(np.round(self.free_energy_differences(0)[0], 2).tolist()) + "\n"
+        return report
+
+    def run(self, interval: float = 5.0, max_updates: int = None, out_path: str = None,
+            callback: Callable[["LiveREEDSMonitor"], bool] = None) -> Dict:
+        """run
+        updates every interval seconds
+
+        Parameters
+        ----------
+        interval : float, optional
+            seconds between the updates (default 5.0)
+        max_updates : int, optional
+            stop after max_updates updates (default None: until callback returns True)
+        out_path : str, optional
+            the summary is written to this JSON file after each update (default None)
+        callback : Callable[[LiveREEDSMonitor], bool], optional
+            called after each update, e.g. with check to stop a bad run, returning True stops the monitor
+
+        Returns
+        -------
+        Dict
+            last summary
+        """
+        while True:
+            start = time.time()
+            summary = self.update()
+            if (out_path is not None):
+                tmp_path = out_path + ".tmp"
+                with open(tmp_path, "w") as out_file:
+                    json.dump(summary, out_file, indent=1)
+                os.replace(tmp_path, out_path)
+            if (callback is not None and callback(self)):
+                return summary
+            if (max_updates is not None and self.num_updates >= max_updates):
+                return summary
+            time.sleep(max(0.0, interval - (time.time() - start)))
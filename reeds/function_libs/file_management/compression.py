@@ -0,0 +1,326 @@
+"""
+    in process, multi threaded compression of trajectories
+
+    A file is split into blocks, which are compressed concurrently in a thread pool (zlib and zstd release
+    the GIL) and written in order. Every block is an independent gzip member (or zstd frame), so the output
+    is a normal .gz (.zst) file, which can be read by gzip, zcat, python and gromos++.
+    At the end of the file, a block index (the compressed offset of each block) is stored in an empty gzip
+    member (zstd skippable frame), which is ignored by the decompressors. With the index, a range of the
+    uncompressed file can be read without decompressing the file from the beginning (read_range).
+"""
+import gzip
+import io
+import os
+import shutil
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Union
+
+codec_suffixes = {"gzip": ".gz", "zstd": ".zst"}
+default_levels = {"gzip": 6, "zstd": 3}
+
+_index_tag = b"REEDSIDX"
+_index_version = 1
+
+# empty gzip member with the offset of the index member in an extra field (FEXTRA), always the last 34 bytes
+_gzip_header = b"\x1f\x8b\x08"
+_gzip_empty_body = b"\x03\x00" + b"\x00" * 8
+_gzip_trailer_size = 34
+# zstd skippable frame with the offset of the index frame, always the last 24 bytes
+_zstd_skippable_magic = 0x184D2A5E
+_zstd_trailer_size = 24
+
+
+def _import_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("the zstd codec needs the python package zstandard (pip install zstandard)")
+    return zstandard
+
+
+def _get_codec(path: str) -> Optional[str]:
+    for codec, suffix in codec_suffixes.items():
+        if (path.endswith(suffix)):
+            return codec
+    return None
+
+
+def _cpu_count() -> int:
+    return len(os.sched_getaffinity(0)) if (hasattr(os, "sched_getaffinity")) else os.cpu_count()
+
+
+def _compress_block(block: bytes, codec: str, level: int) -> bytes:
+    if (codec == "zstd"):
+        return _import_zstandard().ZstdCompressor(level=level).compress(block)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(block) + compressor.flush()
+
+
+def _index_frames(codec: str, block_size: int, size: int, offsets: List[int]) -> bytes:
+    index = " ".join([_index_tag.decode(), str(_index_version), codec, str(block_size), str(size)] +
+                     [str(offset) for offset in offsets]).encode()
+    index_offset = offsets[-1]
+    if (codec == "zstd"):
+        trailer = _index_tag + struct.pack("<Q", index_offset)
+        return (struct.pack("<II", _zstd_skippable_magic, len(index)) + index +
+                struct.pack("<II", _zstd_skippable_magic, len(trailer)) + trailer)
+    # FCOMMENT member with the index and FEXTRA member with the offset of the index member
+    index_member = _gzip_header + b"\x10" + b"\x00" * 4 + b"\x00\xff" + index + b"\x00" + _gzip_empty_body
+    extra = b"RI" + struct.pack("<H", 8) + struct.pack("<Q", index_offset)
+    trailer_member = _gzip_header + b"\x04" + b"\x00" * 4 + b"\x00\xff" + struct.pack("<H", len(extra)) + extra + _gzip_empty_body
+    return index_member + trailer_member
+
+
+class CompressedWriter:
+    """CompressedWriter
+    binary file object writing block wise compressed data (see compress_file), the blocks are compressed
+    in a thread pool while the caller continues writing
+    """
+
+    def __init__(self, out_path: str, codec: str = "gzip", level: int = None, n_threads: int = None,
+                 block_size: int = 4 * 1024 ** 2, write_index: bool = True):
+        """
+        Parameters
+        ----------
+        out_path : str
+            compressed file
+        codec : str, optional
+            "gzip" or "zstd" (default "gzip", zstd needs the package zstandard)
+        level : int, optional
+            compression level (default 6 for gzip, 3 for zstd)
+        n_threads : int, optional
+            number of compression threads (default: number of available cores)
+        block_size : int, optional
+            size of the uncompressed blocks in bytes (default 4 MiB)
+        write_index : bool, optional
+            append the block index when closing (default True)
+        """
+        if (codec not in codec_suffixes):
+            raise ValueError("unknown codec " + str(codec) + " (use " + " or ".join(codec_suffixes) + ")")
+        if (codec == "zstd"):
+            _import_zstandard()
+        self.codec = codec
+        self.level = default_levels[codec] if (level is None) else level
+        self.n_threads = max(1, _cpu_count() if (n_threads is None) else n_threads)
+        self.block_size = block_size
+        self.write_index = write_index
+        self.size = 0
+        self.offsets = []
+        self.closed = False
+
+        self._buffer = bytearray()
+        self._position = 0
+        # at most two blocks per thread are kept in memory
+        self._pending = deque()
+        self._pool = ThreadPoolExecutor(max_workers=self.n_threads)
+        self._out_file = open(out_path, "wb")
+
+    def _submit(self, block: bytes):
+        self._pending.append(self._pool.submit(_compress_block, block, self.codec, self.level))
+        while (len(self._pending) >= 2 * self.n_threads):
+            self._write_next()
+
+    def _write_next(self):
+        compressed = self._pending.popleft().result()
+        self.offsets.append(self._position)
+        self._out_file.write(compressed)
+        self._position += len(compressed)
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data
+        self.size += len(data)
+        while (len(self._buffer) >= self.block_size):
+            self._submit(bytes(self._buffer[:self.block_size]))
+            del self._buffer[:self.block_size]
+        return len(data)
+
+    def writelines(self, lines: Iterable[bytes]):
+        self.write(b"".join(lines))
+
+    def close(self):
+        if (self.closed):
+            return
+        try:
+            if (len(self._buffer) > 0):
+                self._submit(bytes(self._buffer))
+                self._buffer = bytearray()
+            while (len(self._pending) > 0):
+                self._write_next()
+            self.offsets.append(self._position)
+            if (self.write_index):
+                self._out_file.write(_index_frames(self.codec, self.block_size, self.size, self.offsets))
+        finally:
+            self.closed = True
+            self._pool.shutdown()
+            self._out_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def compress_file(in_path: str, out_path: str = None, codec: str = "gzip", level: int = None,
+                  n_threads: int = None, block_size: int = 4 * 1024 ** 2, write_index: bool = True,
+                  remove_in_file: bool = True, verbose: bool = False) -> str:
+    """compress_file
+    compresses a file block wise with multiple threads (pigz like)
+
+    Parameters
+    ----------
+    in_path : str
+        file to compress
+    out_path : str, optional
+        compressed file (default in_path + ".gz" or ".zst")
+    codec : str, optional
+        "gzip" or "zstd" (default "gzip", zstd needs the package zstandard)
+    level : int, optional
+        compression level (default 6 for gzip, 3 for zstd)
+    n_threads : int, optional
+        number of compression threads (default: number of available cores)
+    block_size : int, optional
+        size of the uncompressed blocks in bytes (default 4 MiB)
+    write_index : bool, optional
+        append the block index (default True)
+    remove_in_file : bool, optional
+        remove in_path after the compression, as gzip (default True)
+    verbose : bool, optional
+        verbose output (default False)
+
+    Returns
+    -------
+    str
+        out_path
+    """
+    if (out_path is None):
+        out_path = in_path + codec_suffixes.get(codec, "")
+
+    # written to a temporary file first, a file at out_path is always complete
+    tmp_path = out_path + ".tmp"
+    with open(in_path, "rb") as in_file, CompressedWriter(tmp_path, codec=codec, level=level, n_threads=n_threads,
+                                                          block_size=block_size, write_index=write_index) as out_file:
+        shutil.copyfileobj(in_file, out_file, block_size)
+
+    shutil.copystat(in_path, tmp_path)
+    os.replace(tmp_path, out_path)
+    if (remove_in_file):
+        os.remove(in_path)
+    if (verbose): print("compressed " + in_path + " (" + str(len(out_file.offsets) - 1) + " blocks, " + str(out_file.n_threads) + " threads)")
+    return out_path
+
+
+def read_block_index(in_path: str) -> Optional[Dict[str, Union[str, int, List[int]]]]:
+    """read_block_index
+    reads the block index of a file written by compress_file
+
+    Parameters
+    ----------
+    in_path : str
+        compressed file (.gz or .zst)
+
+    Returns
+    -------
+    Optional[Dict[str, Union[str, int, List[int]]]]
+        codec, block_size, size (uncompressed) and offsets (compressed offset of each block and of the end
+        of the last block), None if the file has no index
+    """
+    codec = _get_codec(in_path)
+    if (codec is None):
+        return None
+    trailer_size = _zstd_trailer_size if (codec == "zstd") else _gzip_trailer_size
+    with open(in_path, "rb") as in_file:
+        in_file.seek(0, os.SEEK_END)
+        file_size = in_file.tell()
+        if (file_size < trailer_size):
+            return None
+        in_file.seek(file_size - trailer_size)
+        trailer = in_file.read(trailer_size)
+        if (codec == "zstd"):
+            if (trailer[:4] != struct.pack("<I", _zstd_skippable_magic) or trailer[8:16] != _index_tag):
+                return None
+            index_offset = struct.unpack("<Q", trailer[16:24])[0]
+            in_file.seek(index_offset)
+            index = in_file.read(struct.unpack("<II", in_file.read(8))[1])
+        else:
+            if (trailer[:4] != _gzip_header + b"\x04" or trailer[12:14] != b"RI"):
+                return None
+            index_offset = struct.unpack("<Q", trailer[16:24])[0]
+            in_file.seek(index_offset + 10)
+            index = in_file.read(file_size - trailer_size - index_offset - 10).split(b"\x00")[0]
+
+    fields = index.decode().split()
+    if (len(fields) < 6 or fields[0] != _index_tag.decode() or int(fields[1]) != _index_version):
+        return None
+    return {"codec": fields[2], "block_size": int(fields[3]), "size": int(fields[4]),
+            "offsets": [int(offset) for offset in fields[5:]]}
+
+
+def read_range(in_path: str, start: int, size: int) -> bytes:
+    """read_range
+    reads a range of the uncompressed content of a file written by compress_file, only the blocks
+    containing the range are decompressed
+
+    Parameters
+    ----------
+    in_path : str
+        compressed file with block index
+    start : int
+        uncompressed offset of the range
+    size : int
+        number of bytes to read
+
+    Returns
+    -------
+    bytes
+        content of the range (shorter at the end of the file)
+    """
+    index = read_block_index(in_path)
+    if (index is None):
+        raise ValueError("no block index found in " + in_path)
+    block_size, offsets = index["block_size"], index["offsets"]
+    first_block = start // block_size
+    last_block = min((start + size - 1) // block_size, len(offsets) - 2)
+    if (size <= 0 or first_block > last_block):
+        return b""
+
+    with open(in_path, "rb") as in_file:
+        in_file.seek(offsets[first_block])
+        compressed = in_file.read(offsets[last_block + 1] - offsets[first_block])
+    content = []
+    for block in range(first_block, last_block + 1):
+        frame = compressed[offsets[block] - offsets[first_block]:offsets[block + 1] - offsets[first_block]]
+        if (index["codec"] == "zstd"):
+            content.append(_import_zstandard().ZstdDecompressor().decompress(frame))
+        else:
+            content.append(zlib.decompress(frame, 31))
+    offset = start - first_block * block_size
+    return b"".join(content)[offset:offset + size]
+
+
+def open_compressed(in_path: str, mode: str = "rb"):
+    """open_compressed
+    opens a plain, gzipped (.gz) or zstd compressed (.zst) file for reading
+
+    Parameters
+    ----------
+    in_path : str
+        path of the file
+    mode : str, optional
+        "rb" or "rt" (default "rb")
+
+    Returns
+    -------
+    file object
+    """
+    codec = _get_codec(in_path)
+    if (codec == "gzip"):
+        return gzip.open(in_path, mode)
+    if (codec == "zstd"):
+        reader = _import_zstandard().ZstdDecompressor().stream_reader(open(in_path, "rb"), read_across_frames=True)
+        stream = io.BufferedReader(reader)
+        return io.TextIOWrapper(stream) if ("t" in mode) else stream
+    return open(in_path, mode)
@@ -0,0 +1,278 @@
+"""
+    streaming concatenation of GROMOS trajectories
+
+    The input files (plain, gzipped or members of tar archives) are read line by line and the blocks are
+    copied straight into the (compressed) output, so only one frame is kept in memory.
+    The time stamps (TIMESTEP blocks) of a continued run are shifted on the fly, the solvent of coordinate
+    trajectories can be removed on the fly. The output is compressed block wise in a thread pool (see compression).
+"""
+import gzip
+import os
+import tarfile
+from typing import BinaryIO, Iterator, List, Tuple
+
+from reeds.function_libs.file_management import compression
+
+
+def open_trajectory_members(in_path: str, suffix: str = ".tre") -> Iterator[BinaryIO]:
+    """open_trajectory_members
+    yields binary streams of the trajectories in in_path, which is a plain, gzip or zstd compressed file, or a tar archive
+    (all members containing suffix are yielded, sorted by name)
+
+    Parameters
+    ----------
+    in_path : str
+        path to the trajectory (.tre, .tre.gz, .tre.tar.gz, ...)
+    suffix : str, optional
+        suffix of the trajectory members of tar archives (default ".tre")
+
+    Yields
+    -------
+    BinaryIO
+        stream of the decompressed trajectory
+    """
+    if (".tar" in os.path.basename(in_path)):
+        with tarfile.open(in_path, "r:*") as tar_file:
+            members = sorted([member for member in tar_file.getmembers() if (member.isfile() and suffix in member.name)],
+                             key=lambda member: member.name)
+            for member in members:
+                stream = tar_file.extractfile(member)
+                if (member.name.endswith(".gz")):
+                    stream = gzip.GzipFile(fileobj=stream)
+                with stream:
+                    yield stream
+    else:
+        with compression.open_compressed(in_path, "rb") as stream:
+            yield stream
+
+
+def _split_frames(stream: BinaryIO, first_block: bytes = b"TIMESTEP") -> Iterator[List[bytes]]:
+    """
+    yields the lines of the header (everything before the first frame) and then the lines of each frame
+    """
+    lines = []
+    for line in stream:
+        if (line.strip() == first_block):
+            yield lines
+            lines = []
+        lines.append(line)
+    yield lines
+
+
+def _open_output(tmp_path: str, out_path: str, level: int = None, n_threads: int = None) -> BinaryIO:
+    """
+    opens tmp_path for writing, compressed with the codec of out_path (.gz, .zst) or plain
+    """
+    codec = compression._get_codec(out_path)
+    if (codec is None):
+        return open(tmp_path, "wb")
+    return compression.CompressedWriter(tmp_path, codec=codec, level=level, n_threads=n_threads)
+
+
+def _read_timestep(frame: List[bytes]) -> Tuple[int, float]:
+    # frame[0] is TIMESTEP, frame[1] the step and time
+    step, time = frame[1].split()
+    return int(step), float(time)
+
+
+def _write_timestep(frame: List[bytes], step: int, time: float):
+    frame[1] = ("{:15d}{:20.9f}\n".format(step, time)).encode()
+
+
+def concatenate_tre(in_paths: List[str], out_path: str, compresslevel: int = 6, verbose: bool = False) -> str:
+    """concatenate_tre
+    concatenates energy trajectories (e.g. the tre files of the runs of one replica) into a single file.
+
+    The title of the first file is kept. A file whose time starts at or before the end of the previous file
+    is a continued run: its time stamps are shifted to continue the previous file and its first frame, which
+    repeats the last frame of the previous file, is skipped.
+
+    Parameters
+    ----------
+    in_paths : List[str]
+        trajectories in the order of the runs (.tre, .tre.gz or tar archives of them)
+    out_path : str
+        output file, compressed if it ends with .gz or .zst
+    compresslevel : int, optional
+        compression level (default 6)
+    verbose : bool, optional
+        verbose output (default False)
+
+    Returns
+    -------
+    str
+        out_path
+    """
+    # written to a temporary file first, a file at out_path is always complete
+    tmp_path = out_path + ".tmp"
+    out_file = _open_output(tmp_path, out_path, level=compresslevel)
+
+    last_step = last_time = None
+    num_frames = 0
+    header_written = False
+    with out_file:
+        for in_path in in_paths:
+            for stream in open_trajectory_members(in_path):
+                if (verbose): print("append " + os.path.basename(in_path))
+                frames = _split_frames(stream)
+                header = next(frames)
+                if (not header_written):
+                    out_file.writelines(header)
+                    header_written = True
+
+                step_offset, time_offset = 0, 0.0
+                first_frame = True
+                for frame in frames:
+                    if (len(frame) < 2):
+                        continue
+                    step, time = _read_timestep(frame)
+                    if (first_frame and last_time is not None and time <= last_time):
+                        # continued run: restart of the step and time counters (or overlap)
+                        step_offset, time_offset = last_step - step, last_time - time
+                        first_frame = False
+                        continue
+                    first_frame = False
+                    if (step_offset or time_offset):
+                        step, time = step + step_offset, time + time_offset
+                        _write_timestep(frame, step, time)
+                    out_file.writelines(frame)
+                    last_step, last_time = step, time
+                    num_frames += 1
+
+    os.replace(tmp_path, out_path)
+    if (verbose): print("wrote " + str(num_frames) + " frames to " + out_path)
+    return out_path
+
+
+def count_solute_atoms(in_topology_path: str) -> int:
+    """count_solute_atoms
+    reads the number of solute atoms (NRP of the SOLUTEATOM block) of a GROMOS topology
+
+    Parameters
+    ----------
+    in_topology_path : str
+        path to the topology (.top)
+
+    Returns
+    -------
+    int
+        number of solute atoms
+    """
+    in_block = False
+    with open(in_topology_path, "r") as topology_file:
+        for line in topology_file:
+            stripped = line.strip()
+            if (stripped == "SOLUTEATOM"):
+                in_block = True
+            elif (in_block and stripped and not stripped.startswith("#")):
+                return int(stripped.split()[0])
+    raise ValueError("could not find the SOLUTEATOM block in " + in_topology_path)
+
+
+def _strip_solvent(frame: List[bytes], num_atoms: int) -> List[bytes]:
+    """
+    removes all but the first num_atoms atoms of the position blocks of a frame
+    """
+    stripped_frame = []
+    block = None
+    count = 0
+    for line in frame:
+        stripped = line.strip()
+        if (block is None):
+            block = stripped
+            count = 0
+        elif (stripped == b"END"):
+            block = None
+        elif (block in (b"POSITIONRED", b"POSITION")):
+            if (count >= num_atoms):
+                continue
+            if (not stripped.startswith(b"#")):
+                count += 1
+        stripped_frame.append(line)
+    return stripped_frame
+
+
+def concatenate_trc(in_paths: List[str], out_path: str, time: float = None, dt: float = None,
+                    num_atoms: int = None, compresslevel: int = 6, n_threads: int = None,
+                    verbose: bool = False) -> str:
+    """concatenate_trc
+    concatenates coordinate trajectories (e.g. the trc files of the runs of one replica) into a single file,
+    as gromos++ frameout (single_file) but without gathering.
+
+    All frames are kept and the title of the first file is kept. With dt, the time of the i-th frame is
+    time + i * dt, otherwise a file whose time starts at or before the end of the previous file is shifted to
+    continue it (the steps are always shifted in this way).
+
+    Parameters
+    ----------
+    in_paths : List[str]
+        trajectories in the order of the runs (.trc, .trc.gz or tar archives of them)
+    out_path : str
+        output file, compressed if it ends with .gz or .zst
+    time : float, optional
+        time of the first frame, if dt is given (default None: time of the first frame)
+    dt : float, optional
+        time between two frames (default None: times of the TIMESTEP blocks)
+    num_atoms : int, optional
+        keep only the first num_atoms atoms, e.g. the solute (see count_solute_atoms) (default None: all atoms)
+    compresslevel : int, optional
+        compression level (default 6)
+    n_threads : int, optional
+        number of compression threads (default: number of available cores)
+    verbose : bool, optional
+        verbose output (default False)
+
+    Returns
+    -------
+    str
+        out_path
+    """
+    # written to a temporary file first, a file at out_path is always complete
+    tmp_path = out_path + ".tmp"
+    out_file = _open_output(tmp_path, out_path, level=compresslevel, n_threads=n_threads)
+
+    last_step = last_time = None
+    step_interval, time_interval = 1, 0.0
+    num_frames = 0
+    header_written = False
+    with out_file:
+        for in_path in in_paths:
+            for stream in open_trajectory_members(in_path, suffix=".trc"):
+                if (verbose): print("append " + os.path.basename(in_path))
+                frames = _split_frames(stream)
+                header = next(frames)
+                if (not header_written):
+                    out_file.writelines(header)
+                    header_written = True
+
+                step_offset, time_offset = 0, 0.0
+                first_frame = True
+                for frame in frames:
+                    if (len(frame) < 2):
+                        continue
+                    step, frame_time = _read_timestep(frame)
+                    if (first_frame and last_step is not None):
+                        # continued run: restart of the step and time counters
+                        if (step <= last_step):
+                            step_offset = last_step + step_interval - step
+                        if (frame_time <= last_time):
+                            time_offset = last_time + time_interval - frame_time
+                    first_frame = False
+                    step, frame_time = step + step_offset, frame_time + time_offset
+                    if (last_step is not None):
+                        step_interval, time_interval = step - last_step, frame_time - last_time
+                    last_step, last_time = step, frame_time
+
+                    if (dt is not None):
+                        if (time is None):
+                            time = frame_time
+                        frame_time = time + num_frames * dt
+                    _write_timestep(frame, step, frame_time)
+                    if (num_atoms is not None):
+                        frame = _strip_solvent(frame, num_atoms)
+                    out_file.writelines(frame)
+                    num_frames += 1
+
+    os.replace(tmp_path, out_path)
+    if (verbose): print("wrote " + str(num_frames) + " frames to " + out_path)
+    return out_path
@@ -0,0 +1,134 @@
+"""
+    typed, column selective reader for energy trajectories (.dat files written by ene_ana or tre_reader)
+
+    The header is detected from the first lines, only the requested columns are parsed with the given dtype
+    (e.g. float32) by the C parser of pandas and the data is read in chunks into preallocated arrays. The
+    equilibration (trim_equil) is skipped while reading, so the memory only depends on the kept data.
+"""
+from typing import List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+
+def read_header(in_path: str, max_lines: int = 1000) -> Tuple[int, List[str], str]:
+    """read_header
+    finds the column names of an energy trajectory. Either the first line, which is not a comment, contains
+    the column names (tre_reader, "time  e1 ...") or the last comment line before the data (ene_ana, "# time  e1 ...").
+
+    Parameters
+    ----------
+    in_path : str
+        path to the energy trajectory
+    max_lines : int, optional
+        maximal number of lines before the data (default 1000)
+
+    Returns
+    -------
+    Tuple[int, List[str], str]
+        number of lines before the data, column names, separator of the columns ("\t" or r"\s+")
+    """
+    header_lines, names = 0, None
+    with open(in_path, "r") as in_file:
+        for line_number, line in enumerate(in_file):
+            if (line_number >= max_lines):
+                break
+            stripped = line.strip()
+            if (not stripped):
+                continue
+            if (stripped.startswith("#")):
+                header_lines, names = line_number + 1, stripped.replace("#", " ").split() or names
+                continue
+            try:
+                float(stripped.split()[0])
+            except ValueError:
+                header_lines, names = line_number + 1, stripped.split()
+                continue
+            if (names is None):
+                raise ValueError("could not find the column names in " + in_path)
+            return header_lines, names, "\t" if ("\t" in stripped and "  " not in stripped) else r"\s+"
+    raise ValueError("could not find the data in the first " + str(max_lines) + " lines of " + in_path)
+
+
+def count_lines(in_path: str, chunk_size: int = 16 * 1024 ** 2) -> int:
+    """count_lines
+    counts the lines of a file without parsing it
+
+    Parameters
+    ----------
+    in_path : str
+        path of the file
+    chunk_size : int, optional
+        bytes read at once (default 16 MiB)
+
+    Returns
+    -------
+    int
+        number of lines (a last line without line break is counted)
+    """
+    num_lines = 0
+    last_chunk = b"\n"
+    with open(in_path, "rb") as in_file:
+        for chunk in iter(lambda: in_file.read(chunk_size), b""):
+            num_lines += chunk.count(b"\n")
+            last_chunk = chunk
+    return num_lines + (0 if (last_chunk.endswith(b"\n")) else 1)
+
+
+def read_energy_trajectory(in_path: str, columns: List[str] = None, dtype: Union[str, type] = np.float64,
+                           trim_equil: float = 0.0, chunk_size: int = 100000, engine: str = "c") -> pd.DataFrame:
+    """read_energy_trajectory
+    reads the columns of an energy trajectory
+
+    Parameters
+    ----------
+    in_path : str
+        path to the energy trajectory (.dat, or .npy written by tre_reader)
+    columns : List[str], optional
+        columns to read, e.g. ["time", "eR", "e1", "e2"] (default None: all columns)
+    dtype : Union[str, type], optional
+        data type of the columns, e.g. np.float32 (default np.float64)
+    trim_equil : float, optional
+        fraction of the frames at the beginning which are skipped (equilibration) (default 0.0)
+    chunk_size : int, optional
+        number of rows parsed at once (default 100000)
+    engine : str, optional
+        pandas parser engine, "c" or "pyarrow" (reads all rows at once) (default "c")
+
+    Returns
+    -------
+    pd.DataFrame
+        energy trajectory
+    """
+    if (in_path.endswith(".npy")):
+        records = np.load(in_path, mmap_mode="r")
+        names = list(records.dtype.names) if (columns is None) else list(columns)
+        first_row = int(len(records) * trim_equil)
+        return pd.DataFrame({name: np.asarray(records[name][first_row:], dtype=dtype) for name in names})
+
+    header_lines, names, separator = read_header(in_path)
+    columns = names if (columns is None) else list(columns)
+    missing = [column for column in columns if (column not in names)]
+    if (len(missing) > 0):
+        raise ValueError("the columns " + str(missing) + " are not in " + in_path + " (found " + str(names) + ")")
+
+    # the equilibration is skipped with the header
+    num_rows = count_lines(in_path) - header_lines
+    first_row = int(num_rows * trim_equil)
+    options = {"sep": separator, "header": None, "names": names, "usecols": columns,
+               "dtype": {column: dtype for column in columns}, "skiprows": header_lines + first_row, "engine": engine}
+
+    if (engine == "pyarrow"):
+        if (separator != "\t"):
+            raise ValueError("the pyarrow engine needs a tab separated file, use engine='c' for " + in_path)
+        return pd.read_csv(in_path, **options)[columns]
+
+    data = {column: np.empty(num_rows - first_row, dtype=dtype) for column in columns}
+    num_read = 0
+    with pd.read_csv(in_path, chunksize=chunk_size, **options) as chunks:
+        for chunk in chunks:
+            for column in columns:
+                data[column][num_read:num_read + len(chunk)] = chunk[column].to_numpy()
+            num_read += len(chunk)
+    # blank lines at the end are not data
+    return pd.DataFrame({column: values[:num_read] for column, values in data.items()})
@@ -0,0 +1,202 @@
+"""
+    indexed file discovery in simulation folders
+
+    A FileIndex lists all directories of a simulation folder once (os.scandir) and caches the listing as JSON
+    in the folder. When the index is loaded again, only the directories whose modification time changed
+    are listed again, all others are taken from the cache (one stat per directory).
+    The replica files are found by parsing the file names (<prefix>_<run>_<replica><suffix>) with a single
+    regular expression.
+"""
+import json
+import os
+import re
+import time
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+index_file_name = ".reeds_file_index.json"
+index_version = 1
+
+# <stem>[_<run>]_<number><suffix>, e.g. PNMT_sopt_2_13.tre.gz -> (13, 2, ".tre.gz")
+_replica_file_pattern = re.compile(r"^(?P<stem>.*?)(?:_(?P<run>\d+))?_(?P<number>\d+)(?P<suffix>\.[^_]+)$")
+
+# directories modified less than this before the scan are listed again next time (modification time resolution)
+_mtime_safety_ns = 2 * 10 ** 9
+
+
+def parse_file_name(file_name: str) -> Optional[Tuple[int, Optional[int], str]]:
+    """parse_file_name
+    parses the name of a replica file
+
+    Parameters
+    ----------
+    file_name : str
+        file name, e.g. "PNMT_2_13.tre.gz"
+
+    Returns
+    -------
+    Optional[Tuple[int, Optional[int], str]]
+        (replica (last number), run (second last number or None), suffix), None if the name does not match
+    """
+    match = _replica_file_pattern.match(file_name)
+    if (match is None):
+        return None
+    run = match.group("run")
+    return int(match.group("number")), (int(run) if (run is not None) else None), match.group("suffix")
+
+
+def _is_eq_dir(dir_path: str) -> bool:
+    # equilibration folders (eq*<number>) are not part of the simulation data
+    return dir_path[-1].isdigit() and os.path.basename(dir_path).startswith("eq")
+
+
+class FileIndex:
+    """FileIndex
+    cached listing of all directories and files of a folder
+    """
+
+    def __init__(self, in_folder: str, use_cache: bool = True, verbose: bool = False):
+        """
+        Parameters
+        ----------
+        in_folder : str
+            root folder of the index
+        use_cache : bool, optional
+            load and store the index in in_folder/.reeds_file_index.json (default True)
+        verbose : bool, optional
+            verbose output (default False)
+        """
+        self.root = in_folder
+        self.use_cache = use_cache
+        self.verbose = verbose
+        self.cache_path = os.path.join(in_folder, index_file_name)
+        # relative directory path -> {"mtime": ns, "dirs": [names], "files": [names]}
+        self.directories: Dict[str, Dict] = {}
+
+        if (use_cache):
+            self._load()
+        if (self.refresh() and use_cache):
+            self._store()
+
+    def _path(self, rel_path: str) -> str:
+        return os.path.join(self.root, rel_path) if (rel_path) else self.root
+
+    def _load(self):
+        try:
+            with open(self.cache_path, "r") as cache_file:
+                cache = json.load(cache_file)
+            if (cache.get("version") == index_version):
+                self.directories = cache["directories"]
+        except (OSError, ValueError):
+            self.directories = {}
+
+    def _store(self):
+        tmp_path = self.cache_path + ".tmp"
+        try:
+            with open(tmp_path, "w") as cache_file:
+                json.dump({"version": index_version, "directories": self.directories}, cache_file)
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            # e.g. read only project folder, the index is only kept in memory
+            if (self.verbose): print("could not write the file index " + self.cache_path)
+
+    def refresh(self) -> bool:
+        """refresh
+        lists the directories, which were modified since the last listing
+
+        Returns
+        -------
+        bool
+            True if the index changed
+        """
+        directories = {}
+        changed = False
+        num_listed = 0
+        pending = [""]
+        while (len(pending) > 0):
+            rel_path = pending.pop()
+            path = self._path(rel_path)
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            entry = self.directories.get(rel_path)
+            if (entry is None or entry["mtime"] != mtime):
+                dirs, files = [], []
+                with os.scandir(path) as entries:
+                    for dir_entry in entries:
+                        if (dir_entry.is_dir()):
+                            if (not dir_entry.is_symlink()):
+                                dirs.append(dir_entry.name)
+                        elif (not dir_entry.name.startswith(index_file_name)):
+                            files.append(dir_entry.name)
+                if (time.time_ns() - mtime < _mtime_safety_ns):
+                    mtime = -1
+                entry = {"mtime": mtime, "dirs": sorted(dirs), "files": sorted(files)}
+                changed = True
+                num_listed += 1
+            directories[rel_path] = entry
+            pending.extend(os.path.join(rel_path, name) for name in reversed(entry["dirs"]))
+
+        changed = changed or len(directories) != len(self.directories)
+        self.directories = directories
+        if (self.verbose): print("file index " + self.root + ": listed " + str(num_listed) + " of " + str(len(directories)) + " directories")
+        return changed
+
+    def walk(self) -> Iterator[Tuple[str, List[str], List[str]]]:
+        """walk
+        top down walk through the indexed folder, as os.walk
+
+        Yields
+        -------
+        Tuple[str, List[str], List[str]]
+            directory path, directory names, file names
+        """
+        pending = [""]
+        while (len(pending) > 0):
+            rel_path = pending.pop()
+            entry = self.directories[rel_path]
+            yield self._path(rel_path), entry["dirs"], entry["files"]
+            pending.extend(os.path.join(rel_path, name) for name in reversed(entry["dirs"]))
+
+    def replica_files(self, replicas: int, filePrefix: str = "", fileSuffixes: Union[str, List[str]] = ".tre",
+                      finalNumberingSort: bool = False) -> Dict[int, List[str]]:
+        """replica_files
+        finds the files of the replicas (<prefix>_<run>_<replica><suffix>), outside of equilibration folders
+
+        Parameters
+        ----------
+        replicas : int
+            number of replicas
+        filePrefix : str, optional
+            str contained in the desired file names (default "")
+        fileSuffixes : Union[str, List[str]], optional
+            suffixes of the desired files, a suffix also matches longer suffixes (.tre matches .tre.gz)
+        finalNumberingSort : bool, optional
+            collect all files as replica 1, sorted by their last number (default False)
+
+        Returns
+        -------
+        Dict[int, List[str]]
+            replica -> file paths, sorted by the run
+        """
+        if (isinstance(fileSuffixes, str)):
+            fileSuffixes = [fileSuffixes]
+        suffixes = tuple(fileSuffixes)
+
+        found = {replica: [] for replica in range(1, replicas + 1)}
+        for dir_path, _, file_names in self.walk():
+            if (_is_eq_dir(dir_path)):
+                continue
+            for file_name in file_names:
+                if (filePrefix not in file_name):
+                    continue
+                parsed = parse_file_name(file_name)
+                if (parsed is None or not parsed[2].startswith(suffixes)):
+                    continue
+                number, run, _ = parsed
+                if (finalNumberingSort):
+                    found[1].append((number, dir_path + "/" + file_name))
+                elif (number in found):
+                    found[number].append((run if (run is not None) else 0, dir_path + "/" + file_name))
+
+        return {replica: [path for _, path in sorted(paths)] for replica, paths in found.items()}
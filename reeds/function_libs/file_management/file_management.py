@@ -12,10 +12,11 @@ import pandas as pd
 
 import reeds
 from pygromos.files import repdat, imd
-from pygromos.files.energy import tre
 from pygromos.gromos import gromosPP
 from pygromos.utils import bash
 
+from reeds.function_libs.file_management import compression, concatenation, energy_trajectory, file_index, manifest, \
+    task_graph, tre_reader
 from reeds.function_libs.utils.structures import adding_Scheme_new_Replicas as add_scheme
 
 """
@@ -34,9 +35,12 @@ def _thread_worker_cat_trc(job: int,
                            verbose: bool = False,
                            boundary_conditions: str = "r cog",
                            include_all: bool = False, 
-                           s1_only = True):
+                           s1_only = True,
+                           use_frameout: bool = False):
     """_thread_worker_cat_trc
         This thread worker_scripts concatenates all .trc files of one replica into one file.
+        The files are streamed into the gzipped output (see concatenation.concatenate_trc), without gathering,
+        use_frameout=True runs gromos++ frameout instead.
 
     Parameters
     ----------
@@ -57,20 +61,22 @@ def _thread_worker_cat_trc(job: int,
     time : float, optional
         start time (default 0)
     boundary_conditions : str, optional
-        boundary conditions (default "r cog")
+        boundary conditions, only for frameout (default "r cog")
     include_all : bool, optional
         include SOLVENT? (default: False)
     s1_only: 
         concatenate data for s = 1 only (it assumes file with prefix_1.trc is s = 1)
     verbose : bool
         verbosity?
+    use_frameout : bool, optional
+        use gromos++ frameout instead of the python concatenation (default False)
     
     Returns
     -------
-    None
+    dict
+        out_trcs, updated with the outputs of replicaID_range
     """
 
-    gromPP = gromosPP.GromosPP()
     start_dir = os.getcwd()
     if (verbose): print("JOB " + str(job) + ": range " + str(list(replicaID_range)))
     for replicaID in replicaID_range:
@@ -81,38 +87,52 @@ def _thread_worker_cat_trc(job: int,
 
         out_trcs.update({replicaID: compress_out_path})
 
-        if (os.path.exists(compress_out_path)):  # found perfect compressed trc file:)
+        parameters = {"topology": os.path.abspath(topology_path), "time": time, "dt": dt,
+                      "boundary_conditions": boundary_conditions if (use_frameout) else None, "include_all": include_all}
+        if (manifest.is_up_to_date(compress_out_path, trc_files[replicaID], parameters)):  # found perfect compressed trc file:)
             warnings.warn("Skipped generating file as I found: " + compress_out_path)
             if (os.path.exists(out_path)):
                 bash.remove_file(out_path)
             continue
-        elif (os.path.exists(out_path)):  # did not find compressed file. will compress
-            warnings.warn("Skipped generating file as I found: " + out_path)
+
+        # concat files, partial outputs of a previous run are replaced
+        manifest.invalidate(compress_out_path)
+        if (not use_frameout):
+            # the frames are streamed into the compressed output, without an uncompressed copy
+            if (verbose): print("JOB " + str(job) + ": " + "write out " + compress_out_path + "\n")
+            num_atoms = None if (include_all) else concatenation.count_solute_atoms(topology_path)
+            compressed_trc = concatenation.concatenate_trc(trc_files[replicaID], compress_out_path, time=time, dt=dt,
+                                                           num_atoms=num_atoms, verbose=verbose)
+            manifest.record(compressed_trc, trc_files[replicaID], parameters)
+            if (verbose): print("JOB " + str(job) + ": " + "write out " + compressed_trc + "\t DONE\n")
             continue
-        else:  # concat files
-            if (verbose): print("JOB " + str(job) + ": " + "write out " + out_path + "\n")
-            out_dir = os.path.dirname(out_path)
-            tmp_dir = bash.make_folder(out_dir + "/TMP_replica_" + str(replicaID), additional_option="-p")
-            os.chdir(tmp_dir)
-            if (include_all):
-                out_path = gromPP.frameout(in_top_path=topology_path, in_coord_path=" ".join(trc_files[replicaID]),
-                                           periodic_boundary_condition=boundary_conditions, single_file=True,
-                                           out_file_format="trc",
-                                           out_file_path=out_path, time=time, dt=dt, include="ALL")
-            else:
-                out_path = gromPP.frameout(in_top_path=topology_path, in_coord_path=" ".join(trc_files[replicaID]),
-                                           periodic_boundary_condition=boundary_conditions, single_file=True,
-                                           out_file_format="trc",
-                                           out_file_path=out_path, time=time, dt=dt)
-            os.chdir(start_dir)
-            bash.wait_for_fileSystem(out_path)
-            bash.remove_folder(tmp_dir)
-            if (verbose): print("JOB " + str(job) + ": " + "write out " + out_path + "\t DONE\n")
+
+        gromPP = gromosPP.GromosPP()
+        if (verbose): print("JOB " + str(job) + ": " + "write out " + out_path + "\n")
+        out_dir = os.path.dirname(out_path)
+        tmp_dir = bash.make_folder(out_dir + "/TMP_replica_" + str(replicaID), additional_option="-p")
+        os.chdir(tmp_dir)
+        if (include_all):
+            out_path = gromPP.frameout(in_top_path=topology_path, in_coord_path=" ".join(trc_files[replicaID]),
+                                       periodic_boundary_condition=boundary_conditions, single_file=True,
+                                       out_file_format="trc",
+                                       out_file_path=out_path, time=time, dt=dt, include="ALL")
+        else:
+            out_path = gromPP.frameout(in_top_path=topology_path, in_coord_path=" ".join(trc_files[replicaID]),
+                                       periodic_boundary_condition=boundary_conditions, single_file=True,
+                                       out_file_format="trc",
+                                       out_file_path=out_path, time=time, dt=dt)
+        os.chdir(start_dir)
+        bash.wait_for_fileSystem(out_path)
+        bash.remove_folder(tmp_dir)
+        if (verbose): print("JOB " + str(job) + ": " + "write out " + out_path + "\t DONE\n")
 
         if (verbose): print("JOB " + str(job) + ": " + "compress " + compress_out_path + "\n")
-        compressed_trc = bash.compress_gzip(out_path, out_path=compress_out_path)
+        compressed_trc = compression.compress_file(out_path, out_path=compress_out_path)
+        manifest.record(compressed_trc, trc_files[replicaID], parameters)
 
         if (verbose): print("JOB " + str(job) + ": " + "compress " + compressed_trc + "\t DONE\n")
+    return out_trcs
 
 
 def _thread_worker_cat_tre(job: int,
@@ -122,7 +142,7 @@ def _thread_worker_cat_tre(job: int,
                            out_tres: dict,
                            verbose: bool = False):
     """_thread_worker_cat_tre
-    This functions concatenates energy trajectories
+    This functions concatenates energy trajectories, streaming them into a gzipped file (see concatenation)
 
     Parameters
     ----------
@@ -140,44 +160,37 @@ def _thread_worker_cat_tre(job: int,
 
     Returns
     -------
-    None
+    dict
+        out_tres, updated with the outputs of replicaID_range
 
     """
     if (verbose): print("JOB " + str(job) + ": range " + str(list(replicaID_range)))
 
     for replicaID in replicaID_range:
-        use_tre_file_paths, unarchived_files = find_and_unarchive_tar_files(tre_files[replicaID], verbose=verbose)
-        if (verbose): print("FILES: ", use_tre_file_paths)
-        if (verbose): print("Archs:", unarchived_files)
+        # in the order of the runs (FileIndex.replica_files)
+        tre_file_paths = tre_files[replicaID]
+        if (verbose): print("FILES: ", tre_file_paths)
 
         out_path = out_prefix + str(replicaID) + ".tre"
         compressed_tre = out_path + ".gz"
-        if (os.path.exists(compressed_tre)):
-            warnings.warn("Skipped generating .tre.gz file as I found: " + out_path)
+        # the inputs are compressed after the concatenation
+        compressed_file_paths = [file_path + ".gz" if (file_path.endswith(".tre")) else file_path for file_path in tre_file_paths]
+        if (manifest.is_up_to_date(compressed_tre, compressed_file_paths)):
+            warnings.warn("Skipped generating .tre.gz file as I found: " + compressed_tre)
         else:
-            if (os.path.exists(out_path)):
-                warnings.warn("Skipped generating .tre file as I found: " + out_path + "\n\t Continue Compressing.")
-            else:
-                tre_file = tre.Tre(use_tre_file_paths[0])
-                if verbose: print("JOB " + str(job) + ": parsing " + os.path.basename(use_tre_file_paths[0]))
-                if (len(use_tre_file_paths) > 1):
-                    for tre_file_path in use_tre_file_paths[1:]:
-                        if verbose: print("JOB " + str(job) + ": append " + os.path.basename(tre_file_path))
-                        tre_file.append_tre(tre.Tre(tre_file_path))
-                if verbose: print("JOB " + str(job) + ": write out " + os.path.basename(out_path))
-                tre_file.write(out_path)
-                bash.wait_for_fileSystem(out_path)
-                if verbose: print("JOB " + str(job) + ": done " + os.path.basename(out_path))
-                del tre_file
-
-                if verbose: print("JOB " + str(job) + ":  compress " + os.path.basename(out_path))
-                compressed_tre = bash.compress_gzip(out_path, out_path=compressed_tre)
-                if (verbose): print("JOB " + str(job) + ": " + "compress " + compressed_tre + "\t DONE\n")
-
-        # file cleaning:
-        for file_path in use_tre_file_paths:
-            bash.compress_gzip(file_path)
+            # the blocks are streamed from the (archived) inputs into the gzipped output
+            manifest.invalidate(compressed_tre)
+            if verbose: print("JOB " + str(job) + ": write out " + os.path.basename(compressed_tre))
+            concatenation.concatenate_tre(tre_file_paths, compressed_tre, verbose=verbose)
+            if (verbose): print("JOB " + str(job) + ": " + "write out " + compressed_tre + "\t DONE\n")
+
+            # file cleaning:
+            for file_path in tre_file_paths:
+                if (file_path.endswith(".tre")):
+                    compression.compress_file(file_path)
+            manifest.record(compressed_tre, compressed_file_paths)
         out_tres.update({replicaID: compressed_tre})
+    return out_tres
 
 
 def thread_worker_concat_repdat(job: int,
@@ -202,16 +215,19 @@ def thread_worker_concat_repdat(job: int,
     -------
     None
     """
-    if (os.path.exists(repdat_file_out_path)):
+    if (isinstance(repdat_file_paths, str)):
+        repdat_file_paths = [repdat_file_paths]
+
+    if (manifest.is_up_to_date(repdat_file_out_path, repdat_file_paths)):
         warnings.warn("Skipped repdat creation as already existed!: " + repdat_file_out_path)
     else:
+        manifest.invalidate(repdat_file_out_path)
         if verbose: print("JOB " + str(job) + ": Found repdats: " + str(repdat_file_paths))  # verbose_repdat
-        if (isinstance(repdat_file_paths, str)):
-            repdat_file_paths = [repdat_file_paths]
+        in_repdat_paths = list(repdat_file_paths)
 
         if verbose: print("JOB " + str(job) + ": Concatenate repdats: \tSTART")  # verbose_repdat
-        repdat_file = repdat.Repdat(repdat_file_paths.pop(0))  # repdat Class
-        for repdat_path in repdat_file_paths:
+        repdat_file = repdat.Repdat(in_repdat_paths.pop(0))  # repdat Class
+        for repdat_path in in_repdat_paths:
             if verbose: print("JOB " + str(job) + ": concat:\t", repdat_path)
             tmp_repdat_file = repdat.Repdat(repdat_path)
             repdat_file.append(tmp_repdat_file)
@@ -219,8 +235,10 @@ def thread_worker_concat_repdat(job: int,
 
         if verbose: print("JOB " + str(job) + ": Concatenate repdats: \tDONE")  # verbose_repdat
         if verbose: print("JOB " + str(job) + ": Write out repdat: " + str(repdat_file_out_path))  # verbose_repdat
-        repdat_file.write(repdat_file_out_path)
+        repdat_file.write(repdat_file_out_path + ".tmp")
+        os.replace(repdat_file_out_path + ".tmp", repdat_file_out_path)
         del repdat_file
+        manifest.record(repdat_file_out_path, repdat_file_paths)
 
 
 def _thread_worker_cnfs(job : int,
@@ -247,12 +265,14 @@ def _thread_worker_cnfs(job : int,
 
     Returns
     -------
-    None
+    dict
+        out_cnfs, updated with the outputs of replica_range
     """
     if (verbose): print("JOB: " + str(job) + " copy to " + out_folder)
     for replicaID in replica_range:
         out_cnfs.update({replicaID: bash.copy_file(in_cnfs[replicaID][-1],
                                                    out_folder + "/" + os.path.basename(in_cnfs[replicaID][-1]))})
+    return out_cnfs
 
 
 def _thread_worker_conv_trc(job: int,
@@ -288,7 +308,8 @@ def _thread_worker_conv_trc(job: int,
 
     Returns
     -------
-    None
+    dict
+        out_traj, updated with the outputs of replica_range
     """
     if (verbose): print("JOB: " + str(job) + " RANGE\t" + str(replica_range))
     gromPP = gromosPP.GromosPP(gromos_path)
@@ -338,6 +359,7 @@ def _thread_worker_conv_trc(job: int,
             bash.remove_file(use_trc)
     bash.remove_folder(temp)
     os.chdir(start_dir)
+    return out_traj
 
 
 def thread_worker_isolate_energies(in_en_file_paths: str,
@@ -350,10 +372,13 @@ def thread_worker_isolate_energies(in_en_file_paths: str,
                                    tre_prefix: str = "",
                                    time=None, dt=None,
                                    job: int = -1,
-                                   verbose=False) -> List[str]:
+                                   verbose=False,
+                                   out_format: str = "dat",
+                                   use_ene_ana: bool = False) -> List[str]:
     """isolate_properties_from_tre
-        This func uses Ene Ana from gromos to isolate potentials from out_tre Files
-        in in_folder generated by reeds.
+        This func isolates potentials from out_tre Files in in_folder generated by reeds.
+        The tre files are parsed in process with the block definitions of the ene_ana lib (see tre_reader),
+        use_ene_ana=True runs gromos++ ene_ana instead.
 
     Parameters
     ----------
@@ -379,6 +404,10 @@ def thread_worker_isolate_energies(in_en_file_paths: str,
         rank of current job
     verbose : bool, optional
         verbose output (default True)
+    out_format : str, optional
+        "dat" (tab separated, as ene_ana) or "npy" (numpy record array), only without ene_ana (default "dat")
+    use_ene_ana : bool, optional
+        use gromos++ ene_ana instead of the python reader (default False)
 
     Returns
     -------
@@ -386,6 +415,21 @@ def thread_worker_isolate_energies(in_en_file_paths: str,
         return list of result Files.
 
     """
+    if (not use_ene_ana):
+        library = tre_reader.EneAnaLibrary(in_ene_ana_lib)
+        parameters = {"ene_ana_lib": os.path.abspath(in_ene_ana_lib), "properties": properties, "time": time, "dt": dt}
+        result_files = []
+        if (verbose): print("JOB" + str(job) + ": working with job: " + str(list(replicas)))
+        for replicaID in replicas:
+            out_path = out_folder + "/" + out_prefix + "_energies_s" + str(replicaID) + "." + out_format
+            if (verbose): print("CHECKING: " + out_path)
+            if (not manifest.is_up_to_date(out_path, in_en_file_paths[replicaID], parameters)):
+                if (verbose): print("JOB" + str(job) + ":", in_en_file_paths[replicaID])
+                result_files.append(tre_reader.isolate_energies(in_en_file_paths[replicaID], out_path, library, properties,
+                                                                time=time, dt=dt, out_format=out_format))
+                manifest.record(out_path, in_en_file_paths[replicaID], parameters)
+        if (verbose): print("JOB" + str(job) + ": DONE")
+        return result_files
 
     gromos = gromosPP.GromosPP(gromosPP_path)
     result_files = []
@@ -401,9 +445,11 @@ def thread_worker_isolate_energies(in_en_file_paths: str,
         out_suffix = "energies_s" + str(replicaID)
         out_path = out_folder + "/" + out_prefix + "_" + out_suffix + ".dat"
 
+        parameters = {"ene_ana_lib": os.path.abspath(in_ene_ana_lib), "properties": properties, "time": time, "dt": dt}
         if (verbose): print("CHECKING: " + out_path)
-        if (not os.path.exists(out_path)):
+        if (not manifest.is_up_to_date(out_path, in_en_file_path, parameters)):
             #verbose = True
+            manifest.invalidate(out_path)
             if verbose: print("JOB" + str(job) + ":\t" + str(replicaID))
             if (verbose): print("JOB" + str(job) + ":", in_en_file_path)
             tmp_out = gromos.ene_ana(in_ene_ana_library_path=in_ene_ana_lib, in_en_file_paths=in_en_file_path,
@@ -412,6 +458,7 @@ def thread_worker_isolate_energies(in_en_file_paths: str,
                                      time=str(time) + " " + str(dt),
                                      in_properties=properties, verbose=verbose, single_file=True, workdir=True)
             result_files.append(tmp_out)
+            manifest.record(out_path, in_en_file_path, parameters)
             bash.remove_file(temp + "/*")  # remove logs if succesfull
 
     os.chdir(start_dir)
@@ -447,7 +494,9 @@ def _thread_worker_delete(job: int,
 
 def _thread_worker_compress(job: int,
                             in_file_paths: List[str], 
-                            verbose: bool = False) -> int:
+                            verbose: bool = False,
+                            n_threads: int = 1,
+                            codec: str = "gzip") -> int:
     """_thread_worker_compress
     compress files in list
 
@@ -456,9 +505,13 @@ def _thread_worker_compress(job: int,
     job : int
         rank of current job
     in_file_paths : List[str]
-        paths to files which should be deleted
+        paths to files which should be compressed
     verbose : bool, optional
         verbose output (default False)
+    n_threads : int, optional
+        number of compression threads per file (default 1)
+    codec : str, optional
+        "gzip" or "zstd" (default "gzip")
 
     Returns
     -------
@@ -466,7 +519,7 @@ def _thread_worker_compress(job: int,
     """
     for file_path in in_file_paths:
         if (verbose): print("JOB" + str(job) + " - gz: " + file_path)
-        bash.compress_gzip(in_path=file_path, verbose=verbose)
+        compression.compress_file(in_path=file_path, codec=codec, n_threads=n_threads, verbose=verbose)
     return 0
 
 
@@ -544,10 +597,12 @@ def gather_simulation_replica_file_paths(in_folder: str,
                                          filePrefix: str = "",
                                          fileSuffixes: Union[str, List[str]] = [".tre", ".tre.tar.gz", ".tre.gz"],
                                          verbose: bool = False,
-                                         finalNumberingSort=False) -> Dict[int, List[str]]:
+                                         finalNumberingSort=False,
+                                         use_cache: bool = True) -> Dict[int, List[str]]:
     """gather_simulation_replica_file_paths
 
     Finds all trajectory paths in a simulation folder and sorts them by replica.
+    The folder is listed once and the listing is cached in the folder (see file_index).
 
 
     Parameters
@@ -564,59 +619,19 @@ def gather_simulation_replica_file_paths(in_folder: str,
         default False
     verbose :   bool
         toggle verbosity
+    use_cache : bool, optional
+        use the cached file index of in_folder (default True)
 
     Returns
     -------
     Dict[int, List[str]]
     """
 
-    if (isinstance(fileSuffixes, str)):
-        fileSuffixes = [fileSuffixes]
-
-    # browse folders
-    ##init statewise dic
-    files = {}
-    for replica in range(1, replicas + 1):
-        files.update({replica: []})
-
     if (verbose): print("SEARCH PATTERN: " + filePrefix + " + * +" + str(fileSuffixes))
 
-    if(finalNumberingSort):
-        files[1]=[]
-        for dirname, dirnames, filenames in os.walk(in_folder):
-            if (str(dirname[-1]).isdigit() and os.path.basename(dirname).startswith("eq")):
-                continue
-
-            # check actual in_dir for fle pattern 
-            tmp_files = [file for file in filenames if (filePrefix in file and any([suffix in file for suffix in fileSuffixes]))]
-            if(len(tmp_files)>0):
-                print(tmp_files)
-                file_paths = sorted([dirname + "/" + filep for filep in tmp_files ])
-                files[1].extend(file_paths)
-
-        # final_cleanup
-        for x in files:
-            files[x].sort(key=lambda x: int(x.split("_")[-1].split(".")[0]))
-
-
-    else:
-       for dirname, dirnames, filenames in os.walk(in_folder):
-            if (str(dirname[-1]).isdigit() and os.path.basename(dirname).startswith("eq")):
-               continue
-            # check actual in_dir for fle pattern
-            tmp_files = [file for file in filenames if
-                        (filePrefix in file and any([suffix in file for suffix in fileSuffixes]))]
-            
-            if len(tmp_files) != 0:
-                for x in range(1, replicas + 1):
-                    grom_file_prefix = sorted([dirname + "/" + file for file in tmp_files if
-                                           (any(["_" + str(x) + suffix in file for suffix in fileSuffixes]))])
-                    files[x] += grom_file_prefix
-            if verbose: print("walking to in_dir: ", os.path.basename(dirname), "found: ", len(tmp_files))
-
-        # final_cleanup
-       for x in files:
-           files[x].sort(key=lambda x: int(x.split("_")[-2]))
+    index = file_index.FileIndex(in_folder, use_cache=use_cache, verbose=verbose)
+    files = index.replica_files(replicas, filePrefix=filePrefix, fileSuffixes=fileSuffixes,
+                                finalNumberingSort=finalNumberingSort)
 
     if (verbose):
         print("\nfoundFiles:\n")
@@ -633,7 +648,8 @@ def gather_simulation_replica_file_paths(in_folder: str,
 def gather_simulation_file_paths(in_folder: str, filePrefix: str = "",
                                  fileSuffixes: Union[str, List[str]] = [".tre", ".tre.tar.gz"],
                                  files_per_folder: int = 1,
-                                 verbose: bool = False) -> List[str]:
+                                 verbose: bool = False,
+                                 use_cache: bool = True) -> List[str]:
     """gather_simulation_file_paths
     find energy trajectory files in a folder
 
@@ -649,6 +665,8 @@ def gather_simulation_file_paths(in_folder: str, filePrefix: str = "",
         number of files per folder (default 1)
     verbose : bool, optional
         verbose output (default False)
+    use_cache : bool, optional
+        use the cached file index of in_folder (default True)
 
     Returns
     -------
@@ -663,7 +681,7 @@ def gather_simulation_file_paths(in_folder: str, filePrefix: str = "",
 
     if (verbose): print("SEARCH PATTERN: " + filePrefix + " + * +" + str(fileSuffixes))
 
-    for dirname, dirnames, filenames in os.walk(in_folder):
+    for dirname, dirnames, filenames in file_index.FileIndex(in_folder, use_cache=use_cache, verbose=verbose).walk():
         if (str(dirname[-1]).isdigit() and os.path.basename(dirname).startswith("eq")):
             continue
         # check actual in_dir for fle pattern
@@ -741,24 +759,28 @@ def extract_eds_energies_from_tre(in_dir: str, out_dir: str,
     # gather potentials
     properties = list(additional_properties) + ["eR"] + ["e" + str(state) for state in range(1, num_states + 1)]
 
+    # find the (concatenated) tre files of the replicas
+    tre_files = gather_simulation_replica_file_paths(in_dir, num_replicas, fileSuffixes=[".tre", ".tre.gz"], verbose=verbose)
+
     # isolate potentials
     if verbose: print("Isolate ene_ana:")
     if (n_processes > 1):
         p = mult.Pool(n_processes)
-        distribute_jobs = [(in_dir, out_dir, properties, range(n, num_replicas, n_processes), in_ene_ana_lib_path,
-                            in_gromosPP_bin_dir, out_file_prefix, "", n, verbose) for n in range(n_processes)]
-        p_ene_ana = p.starmap_async(thread_worker_isolate_energies, distribute_jobs)
+        distribute_jobs = [(tre_files, out_dir, properties, list(tre_files.keys())[n::n_processes], in_ene_ana_lib_path,
+                            in_gromosPP_bin_dir, out_file_prefix, "", None, None, n, verbose) for n in range(n_processes)]
+        out_files = [out_file for job_files in p.starmap(thread_worker_isolate_energies, distribute_jobs) for out_file in job_files]
         p.close()
         p.join()
 
     else:
-        out_files = thread_worker_isolate_energies(in_en_file_paths=in_dir,
+        out_files = thread_worker_isolate_energies(in_en_file_paths=tre_files,
                                                    out_folder=out_dir,
                                                    properties=properties,
                                                    out_prefix=out_file_prefix,
                                                    in_ene_ana_lib=in_ene_ana_lib_path,
                                                    gromosPP_path=in_gromosPP_bin_dir,
-                                                   replicas=[num_replicas])
+                                                   replicas=list(tre_files.keys()),
+                                                   verbose=verbose)
 
     return out_files
 
@@ -780,7 +802,8 @@ def find_header(path: str) -> int:
     """
     comment_lines = -1
     with open(path, "r") as file:
-        for line in file.readlines():
+        # only the header lines are read
+        for line in file:
             if (line.strip().startswith("#")):
                 comment_lines += 1
                 continue
@@ -791,8 +814,12 @@ def find_header(path: str) -> int:
     return comment_lines
 
 
-def parse_csv_energy_trajectory(in_ene_traj_path: str, trim_equil:float = 0.0, verbose: bool = False) -> pd.DataFrame:
+def parse_csv_energy_trajectory(in_ene_traj_path: str, trim_equil:float = 0.0, verbose: bool = False,
+                                columns: List[str] = None, dtype: Union[str, type] = np.float64,
+                                engine: str = "c") -> pd.DataFrame:
     """parse_csv_energy_trajectory
+    only the requested columns are parsed (in chunks) and the equilibration is skipped while reading,
+    see energy_trajectory.read_energy_trajectory
 
     Parameters
     ----------
@@ -802,6 +829,12 @@ def parse_csv_energy_trajectory(in_ene_traj_path: str, trim_equil:float = 0.0, v
         corresponds to the fraction of data to remove for equilibration
     verbose : bool, optional
         verbose output (default False)
+    columns : List[str], optional
+        columns to read, e.g. ["time", "eR", "e1", "e2"] (default None: all columns)
+    dtype : Union[str, type], optional
+        data type of the energies, np.float32 halves the memory (default np.float64)
+    engine : str, optional
+        pandas parser engine, "c" or "pyarrow" (needs pyarrow, tab separated files) (default "c")
 
     Returns
     -------
@@ -809,20 +842,26 @@ def parse_csv_energy_trajectory(in_ene_traj_path: str, trim_equil:float = 0.0, v
         return a pandas data frame containing all energies
     """
     if (verbose): print("deal with: ", in_ene_traj_path)
-    ene_traj = pd.read_csv(in_ene_traj_path, header=find_header(in_ene_traj_path), delim_whitespace=True)
-    ene_traj.columns = [x.replace("#", "").strip() for x in ene_traj.columns]
-    n = int(ene_traj.shape[0] * trim_equil)
-    ene_traj = ene_traj.iloc[n:]
-    ene_traj.reset_index(drop=True, inplace=True)
-    
+    ene_traj = energy_trajectory.read_energy_trajectory(in_ene_traj_path, columns=columns, dtype=dtype,
+                                                        trim_equil=trim_equil, engine=engine)
+
     setattr(ene_traj, "in_path", in_ene_traj_path)
     return ene_traj
 
 
+def _thread_worker_parse_csv_energy_trajectory(in_ene_traj_path: str, trim_equil: float, columns: List[str],
+                                               dtype: Union[str, type], engine: str) -> pd.DataFrame:
+    return parse_csv_energy_trajectory(in_ene_traj_path, trim_equil=trim_equil, columns=columns, dtype=dtype,
+                                       engine=engine)
+
+
 def parse_csv_energy_trajectories(in_folder: str,
                                   ene_trajs_prefix: str,
                                   trim_equil: float = 0.0,
-                                  verbose: bool = False
+                                  verbose: bool = False,
+                                  columns: List[str] = None,
+                                  dtype: Union[str, type] = np.float64,
+                                  n_processes: int = 1
                                  ) -> List[pd.DataFrame]:
     """parse_csv_energy_trajectories
     searches a directory and loads energy eds csvs as pandas dataframes.
@@ -837,6 +876,12 @@ def parse_csv_energy_trajectories(in_folder: str,
         corresponds to the fraction of data to remove for equilibration
     verbose : bool, optional
         verbose output (default False)
+    columns : List[str], optional
+        columns to read, e.g. ["time", "eR", "e1", "e2"] (default None: all columns)
+    dtype : Union[str, type], optional
+        data type of the energies, np.float32 halves the memory (default np.float64)
+    n_processes : int, optional
+        number of files parsed in parallel (default 1)
 
     Returns
     -------
@@ -850,9 +895,17 @@ def parse_csv_energy_trajectories(in_folder: str,
     ene_trajs: List[pd.DataFrame] = []
     if (verbose): print("FOUND: ", "\n".join(in_ene_traj_paths))
 
-    for in_ene_traj_path in in_ene_traj_paths:
-        ene_traj = parse_csv_energy_trajectory(in_ene_traj_path, trim_equil=trim_equil, verbose=verbose)
-        
+    if (n_processes > 1 and len(in_ene_traj_paths) > 1):
+        with mult.Pool(min(n_processes, len(in_ene_traj_paths))) as pool:
+            parsed = pool.starmap(_thread_worker_parse_csv_energy_trajectory,
+                                  [(path, trim_equil, columns, dtype, "c") for path in in_ene_traj_paths])
+    else:
+        parsed = [parse_csv_energy_trajectory(path, trim_equil=trim_equil, verbose=verbose, columns=columns, dtype=dtype)
+                  for path in in_ene_traj_paths]
+
+    for in_ene_traj_path, ene_traj in zip(in_ene_traj_paths, parsed):
+        # attributes are not kept by pickling
+        setattr(ene_traj, "in_path", in_ene_traj_path)
         if (verbose): print("csv columns: \t", ene_traj.columns)
         
         setattr(ene_traj, "s", ((ene_traj.in_path.split("."))[-2]).split("_")[-1])
@@ -871,6 +924,29 @@ def parse_csv_energy_trajectories(in_folder: str,
 """
 
 
+def _merge_task_results(results: dict, stage: str) -> dict:
+    """_merge_task_results
+    merges the output dicts returned by the tasks of a stage
+
+    Parameters
+    ----------
+    results : dict
+        results of a task_graph.TaskGraph, the task names are (stage, replicaID)
+    stage : str
+        name of the stage, e.g. "cat_tre"
+
+    Returns
+    -------
+    dict
+        replicaID -> output
+    """
+    merged = {}
+    for name, result in results.items():
+        if (name[0] == stage):
+            merged.update(result)
+    return merged
+
+
 def project_concatenation(in_folder: str,
                           in_topology_path: str,
                           in_imd: str, num_replicas: int,
@@ -944,35 +1020,25 @@ def project_concatenation(in_folder: str,
         bash.make_folder(tmp_dir)
 
     out_cnfs = out_tres = out_trcs = out_dcd = out_repdat = None
-    p_conv = p_cnf = p_repdat = p_trc = p_tre = p_ene_ana = False
-    submitted_trc_job = submitted_tre_job = False
     
     # Whether to concatenate only the first of the trajectories.
     # This should always be false here.
     s1_only = False
 
-    if (n_processes > 1):
-        p = mult.Pool(n_processes)
-        manager = mult.Manager()
+    # every replica has its own chains of stages (cat_tre -> ene_ana and cat_trc -> convert_trcs),
+    # the stages of all replicas are executed on a single pool of n_processes processes
+    graph = task_graph.TaskGraph(n_processes=n_processes, verbose=verbose)
+    out_prefix = out_folder + "/" + out_file_prefix + "_"
 
     if (control_dict["cp_cnf"]):
         if (verbose): print("\tStart cnfs")
         # find all cnf files in this project
         sim_dir_cnfs = gather_simulation_replica_file_paths(in_folder, num_replicas, filePrefix="", fileSuffixes=".cnf",
                                                             verbose=verbose, finalNumberingSort=nofinal)
-
-        # do parallel
-        if (n_processes > 1):
-            out_cnfs = manager.dict()
-            distribute = [(n, out_cnfs, sim_dir_cnfs, range(n, len(sim_dir_cnfs) + 1, n_processes), out_folder, verbose)
-                          for n in range(1, n_processes + 1)]
-            # _async
-            p_cnf = p.starmap(_thread_worker_cnfs, distribute)
-        else:
-            out_cnfs = {}
-            _thread_worker_cnfs(job=-1, out_cnfs=out_cnfs, in_cnfs=sim_dir_cnfs,
-                                replica_range=list(sim_dir_cnfs.keys()), out_folder=out_folder, verbose=verbose)
-        if (verbose): print("Out cnfs: ", out_cnfs)
+        for replicaID in sim_dir_cnfs:
+            graph.add_task(("cp_cnf", replicaID), _thread_worker_cnfs,
+                           kwargs={"job": replicaID, "out_cnfs": {}, "in_cnfs": sim_dir_cnfs, "replica_range": [replicaID],
+                                   "out_folder": out_folder, "verbose": verbose})
 
     if (control_dict["cat_trc"]):
         print("\tStart Trc Cat")
@@ -982,123 +1048,77 @@ def project_concatenation(in_folder: str,
                                                          verbose=verbose,
                                                          finalNumberingSort=nofinal)
 
-        out_prefix = out_folder + "/" + out_file_prefix + "_"
-
-        # concat all files to a single .trc
-        if (n_processes > 1):  # parallel
-            submitted_trc_job = True
-            if (verbose): print("going parallel: n_processes - " + str(n_processes))
-            out_trcs = manager.dict()
-            distributed_jobs = [
-                (n, range(n, len(trc_files) + 1, n_processes), trc_files, out_prefix, in_topology_path, out_trcs,
-                 dt_trc, starting_time, verbose, include_water_in_trc, s1_only) for n in range(1, n_processes + 1)]
-            # _async
-            p_trc = p.starmap(_thread_worker_cat_trc, distributed_jobs)
-            p.close()
-            p.join()
-
-        else:
-            out_trcs = {}
-            _thread_worker_cat_trc(job=-1, topology_path=in_topology_path, replicaID_range=list(trc_files.keys()),
-                                   trc_files=trc_files, out_prefix=out_prefix, dt=dt_trc, time=starting_time,
-                                   out_trcs=out_trcs,
-                                   verbose=verbose, boundary_conditions=boundary_conditions,
-                                   include_all=include_water_in_trc, s1_only=s1_only)
-
-    if (control_dict["cat_tre"]):
-        print("\tStart Tre Cat")
-
-        # find all trc files in this project
+        # concat all files of a replica to a single .trc
+        for replicaID in trc_files:
+            graph.add_task(("cat_trc", replicaID), _thread_worker_cat_trc,
+                           kwargs={"job": replicaID, "replicaID_range": [replicaID], "trc_files": trc_files,
+                                   "out_prefix": out_prefix, "topology_path": in_topology_path, "out_trcs": {},
+                                   "dt": dt_trc, "time": starting_time, "verbose": verbose,
+                                   "boundary_conditions": boundary_conditions, "include_all": include_water_in_trc,
+                                   "s1_only": s1_only})
+
+    if (control_dict["cat_tre"] or control_dict["ene_ana"]):
+        # find all tre files in this project
         tre_files = gather_simulation_replica_file_paths(in_folder, num_replicas, filePrefix="",
-                                                         fileSuffixes=[".tre", ".tre.tar.gz"], verbose=verbose,
+                                                         fileSuffixes=[".tre", ".tre.gz", ".tre.tar.gz"], verbose=verbose,
                                                          finalNumberingSort=nofinal)
 
-        out_prefix = out_folder + "/" + out_file_prefix + "_"
-        # concat all files to a single .trc
-        if (n_processes > 1):
-            if (verbose): print("going parallel: n_processes - " + str(n_processes), " for ", len(tre_files))
-            submitted_tre_job = True
-            out_tres = manager.dict()
-            distributed_jobs = [(n, range(n, len(tre_files) + 1, n_processes), tre_files, out_prefix, out_tres, verbose)
-                                for n in range(1, n_processes + 1)]
-            p = mult.Pool(n_processes)
-            p_tre = p.starmap(_thread_worker_cat_tre, distributed_jobs)
-            p.close()
-            p.join()
-        else:
-            out_tres = {}
-            _thread_worker_cat_tre(job=-1, replicaID_range=tre_files.keys(), tre_files=tre_files, out_prefix=out_prefix,
-                                   out_tres=out_tres, verbose=verbose)
+    if (control_dict["cat_tre"]):
+        print("\tStart Tre Cat")
+        # concat all files of a replica to a single .tre
+        for replicaID in tre_files:
+            graph.add_task(("cat_tre", replicaID), _thread_worker_cat_tre,
+                           kwargs={"job": replicaID, "replicaID_range": [replicaID], "tre_files": tre_files,
+                                   "out_prefix": out_prefix, "out_tres": {}, "verbose": verbose})
+        # the .tre files are compressed by cat_tre
+        tre_files = {replicaID: [path + ".gz" if (path.endswith(".tre")) else path for path in paths]
+                     for replicaID, paths in tre_files.items()}
 
     if (control_dict["ene_ana"]):
         print("\tStart ene ana")
-
-        # wait for async job creating the trcs.
-        if (submitted_tre_job):
-            p_tre.wait()
-
         # gather potentials
         properties = list(additional_properties)
-        # find all trc files in this project
-        tre_files = gather_simulation_replica_file_paths(in_folder, num_replicas, filePrefix="",
-                                                         fileSuffixes=[".tre", ".tre.gz"], verbose=verbose,
-                                                         finalNumberingSort=nofinal)  # ".tre.tar.gz"
-        # isolate potentials
+
+        # isolate potentials, after the tre files of the replica are concatenated
         if verbose: print("Isolate ene_ana:")
-        if (n_processes > 1):
-            p = mult.Pool(n_processes)
-            distribute_jobs = [
-                (out_folder, out_folder, properties, list(tre_files.keys())[n::n_processes], in_ene_ana_lib_path,
-                 gromosPP_bin_dir, out_file_prefix, "", dt_tre, n, verbose) for n in range(n_processes)]
-            p_ene_ana = p.starmap_async(thread_worker_isolate_energies, distribute_jobs)
-        else:
-            thread_worker_isolate_energies(in_en_file_paths=tre_files, out_folder=out_folder, properties=properties,
-                                           out_prefix=out_file_prefix,
-                                           in_ene_ana_lib=in_ene_ana_lib_path,
-                                           gromosPP_path=gromosPP_bin_dir, dt=dt_tre,
-                                           replicas=list(tre_files.keys()), verbose=verbose)
+        for replicaID in tre_files:
+            graph.add_task(("ene_ana", replicaID), thread_worker_isolate_energies,
+                           kwargs={"in_en_file_paths": tre_files, "out_folder": out_folder, "properties": properties,
+                                   "replicas": [replicaID], "in_ene_ana_lib": in_ene_ana_lib_path,
+                                   "gromosPP_path": gromosPP_bin_dir, "out_prefix": out_file_prefix, "dt": dt_tre,
+                                   "job": replicaID, "verbose": verbose},
+                           dependencies=[("cat_tre", replicaID)] if (control_dict["cat_tre"]) else [])
 
     if (control_dict["convert_trcs"]):
         print("\tStart Trc Conversion")
-        # wait for async job creating the trcs.
-        if (submitted_trc_job):
-            p_trc.wait()
-
-        # get files:
-        final_trc_files = list(
-            sorted(glob.glob(out_folder + "/*.trc*"), key=lambda x: int(x.split("_")[-1].split(".")[0])))
-
-        if (n_processes > 1):
-            out_dcd = manager.dict()
-            distributed_jobs = [
-                (n, range(n, num_replicas, n_processes), final_trc_files, in_topology_path, gromosPP_bin_dir, out_dcd,
-                 fit_traj_to_mol, verbose) for
-                n in range(n_processes)]
-            p_conv = p.starmap_async(_thread_worker_conv_trc, distributed_jobs)
+        # the trajectory of a replica is converted after it is concatenated
+        if (control_dict["cat_trc"]):
+            final_trc_files = {name[1] - 1: out_prefix + str(name[1]) + ".trc.gz" for name in graph.tasks
+                               if (name[0] == "cat_trc")}
         else:
-            out_dcd = {}
-            _thread_worker_conv_trc(job=-1, replica_range=range(num_replicas), trc_files=final_trc_files,
-                                    in_topology_path=in_topology_path,
-                                    gromos_path=gromosPP_bin_dir, out_traj=out_dcd, fit_traj_to_mol=1, verbose=verbose,
-                                    boundary_conditions=boundary_conditions)
-
-    if (n_processes > 1):
-        # wait for the jobs to finish
-        if ((not p_conv or p_conv.wait()) and (not p_cnf or p_cnf.wait()) and
-                (not p_repdat or p_repdat.wait()) and (not p_trc or p_trc.wait()) and
-                (not p_tre or p_tre.wait()) and (not p_ene_ana or p_ene_ana.wait())):
-            raise ChildProcessError("A process failed! ")
-
-        p.close()
-        p.join()
-
-        out_dict = {"out_folder": out_folder, "cnfs": dict(out_cnfs), "repdat": out_repdat, "tres": dict(out_tres),
-                    "trcs": dict(out_trcs), "dcds": dict(out_dcd)}
-        manager.shutdown()
+            final_trc_files = dict(enumerate(
+                sorted(glob.glob(out_folder + "/*.trc*"), key=lambda x: int(x.split("_")[-1].split(".")[0]))))
+
+        for index in sorted(final_trc_files)[:num_replicas]:
+            graph.add_task(("convert_trcs", index + 1), _thread_worker_conv_trc,
+                           kwargs={"job": index, "replica_range": [index], "trc_files": final_trc_files,
+                                   "in_topology_path": in_topology_path, "gromos_path": gromosPP_bin_dir,
+                                   "out_traj": {}, "fit_traj_to_mol": fit_traj_to_mol,
+                                   "boundary_conditions": boundary_conditions, "verbose": verbose},
+                           dependencies=[("cat_trc", index + 1)] if (control_dict["cat_trc"]) else [])
+
+    results = graph.run()
+    if (control_dict["cp_cnf"]):
+        out_cnfs = _merge_task_results(results, "cp_cnf")
+    if (control_dict["cat_trc"]):
+        out_trcs = _merge_task_results(results, "cat_trc")
+    if (control_dict["cat_tre"]):
+        out_tres = _merge_task_results(results, "cat_tre")
+    if (control_dict["convert_trcs"]):
+        out_dcd = _merge_task_results(results, "convert_trcs")
 
-    else:
-        out_dict = {"out_folder": out_folder, "cnfs": out_cnfs, "repdat": out_repdat, "tres": out_tres,
-                    "trcs": out_trcs, "dcds": out_dcd}
+    out_dict = {"out_folder": out_folder, "cnfs": out_cnfs, "repdat": out_repdat, "tres": out_tres,
+                "trcs": out_trcs, "dcds": out_dcd}
     if (verbose): print("all jobs finished")
     return out_dict
 
@@ -1181,34 +1201,21 @@ def reeds_project_concatenation(in_folder: str,
         bash.make_folder(tmp_dir)
 
     out_cnfs = out_tres = out_trcs = out_dcd = out_repdat = None
-    p_conv = p_cnf = p_repdat = p_trc = p_tre = p_ene_ana = False
-    submitted_trc_job = submitted_tre_job = False
 
-    if (n_processes > 1):
-        p = mult.Pool(n_processes)
-        manager = mult.Manager()
+    # every replica has its own chains of stages (cat_tre -> ene_ana and cat_trc -> convert_trcs),
+    # the stages of all replicas are executed on a single pool of n_processes processes
+    graph = task_graph.TaskGraph(n_processes=n_processes, verbose=verbose)
+    out_prefix = out_folder + "/" + out_file_prefix + "_"
 
     if (control_dict["cp_cnf"]):
         if (verbose): print("\tStart cnfs")
         # find all cnf files in this project
         sim_dir_cnfs = gather_simulation_replica_file_paths(in_folder, num_replicas, filePrefix="", fileSuffixes=".cnf",
                                                             verbose=verbose, finalNumberingSort=nofinal)
-
-        # do parallel
-        if (n_processes > 1):
-            out_cnfs = manager.dict()
-            distribute = [(n, out_cnfs, sim_dir_cnfs, range(n, len(sim_dir_cnfs) + 1, n_processes), out_folder, verbose)
-                          for n in range(1, n_processes + 1)]
-            # _async
-            p = mult.Pool(n_processes)
-            p_cnf = p.starmap(_thread_worker_cnfs, distribute)
-            p.close()
-            p.join()
-        else:
-            out_cnfs = {}
-            _thread_worker_cnfs(job=-1, out_cnfs=out_cnfs, in_cnfs=sim_dir_cnfs,
-                                replica_range=list(sim_dir_cnfs.keys()), out_folder=out_folder, verbose=verbose)
-        if (verbose): print("Out cnfs: ", out_cnfs)
+        for replicaID in sim_dir_cnfs:
+            graph.add_task(("cp_cnf", replicaID), _thread_worker_cnfs,
+                           kwargs={"job": replicaID, "out_cnfs": {}, "in_cnfs": sim_dir_cnfs, "replica_range": [replicaID],
+                                   "out_folder": out_folder, "verbose": verbose})
 
     if (control_dict["cat_trc"]):
         print("\tStart Trc Cat")
@@ -1217,57 +1224,33 @@ def reeds_project_concatenation(in_folder: str,
                                                          fileSuffixes=[".trc", ".trc.gz"], verbose=verbose,
                                                          finalNumberingSort=nofinal)  # ,".trc.tar.gz"
 
-        # trc_files=helper_function_change_compression_safe_incomplete_files(trc_files, in_topology_path=in_topology_path, tmp_dir=tmp_dir)
-
-        out_prefix = out_folder + "/" + out_file_prefix + "_"
-
-        # concat all files to a single .trc
-        if (n_processes > 1):  # parallel
-            submitted_trc_job = True
-            if (verbose): print("going parallel: n_processes - " + str(n_processes))
-            out_trcs = manager.dict()
-            distributed_jobs = [(
-                n, range(n, len(trc_files) + 1, n_processes), trc_files, out_prefix, in_topology_path, out_trcs,
-                dt_trc, starting_time, verbose, boundary_conditions, include_water_in_trc, s1_only) for n in
-                range(1, n_processes + 1)]
-            p = mult.Pool(n_processes)
-            p_trc = p.starmap(_thread_worker_cat_trc, distributed_jobs)
-            p.close()
-            p.join()
-        else:
-            out_trcs = {}
-            _thread_worker_cat_trc(job=-1, topology_path=in_topology_path, replicaID_range=list(trc_files.keys()),
-                                   trc_files=trc_files, out_prefix=out_prefix, dt=dt_trc, time=starting_time,
-                                   out_trcs=out_trcs,
-                                   verbose=verbose, boundary_conditions=boundary_conditions,
-                                   include_all=include_water_in_trc, s1_only=s1_only)
-
-    if (control_dict["cat_tre"]):
-        print("\tStart Tre Cat")
-
-        # find all trc files in this project
+        # concat all files of a replica to a single .trc
+        for replicaID in trc_files:
+            if s1_only and replicaID != 1:
+                continue
+            graph.add_task(("cat_trc", replicaID), _thread_worker_cat_trc,
+                           kwargs={"job": replicaID, "replicaID_range": [replicaID], "trc_files": trc_files,
+                                   "out_prefix": out_prefix, "topology_path": in_topology_path, "out_trcs": {},
+                                   "dt": dt_trc, "time": starting_time, "verbose": verbose,
+                                   "boundary_conditions": boundary_conditions, "include_all": include_water_in_trc,
+                                   "s1_only": s1_only})
+
+    if (control_dict["cat_tre"] or control_dict["ene_ana"]):
+        # find all tre files in this project
         tre_files = gather_simulation_replica_file_paths(in_folder, num_replicas, filePrefix="",
                                                          fileSuffixes=[".tre", ".tre.gz"], verbose=verbose,
                                                          finalNumberingSort=nofinal)  # ".tre.tar.gz"
 
-        # tre_files=helper_function_change_compression_safe_incomplete_files(tre_files, in_topology_path=in_topology_path, tmp_dir=tmp_dir)
-
-        out_prefix = out_folder + "/" + out_file_prefix + "_"
-        # concat all files to a single .trc
-        if (n_processes > 1):
-            if (verbose): print("going parallel: n_processes - " + str(n_processes), " for ", len(tre_files))
-            submitted_tre_job = True
-            out_tres = manager.dict()
-            distributed_jobs = [(n, range(n, len(tre_files) + 1, n_processes), tre_files, out_prefix, out_tres, verbose)
-                                for n in range(1, n_processes + 1)]
-            p = mult.Pool(n_processes)
-            p_tre = p.starmap(_thread_worker_cat_tre, distributed_jobs)
-            p.close()
-            p.join()
-        else:
-            out_tres = {}
-            _thread_worker_cat_tre(job=-1, replicaID_range=tre_files.keys(), tre_files=tre_files, out_prefix=out_prefix,
-                                   out_tres=out_tres, verbose=verbose)
+    if (control_dict["cat_tre"]):
+        print("\tStart Tre Cat")
+        # concat all files of a replica to a single .tre
+        for replicaID in tre_files:
+            graph.add_task(("cat_tre", replicaID), _thread_worker_cat_tre,
+                           kwargs={"job": replicaID, "replicaID_range": [replicaID], "tre_files": tre_files,
+                                   "out_prefix": out_prefix, "out_tres": {}, "verbose": verbose})
+        # the .tre files are compressed by cat_tre
+        tre_files = {replicaID: [path + ".gz" if (path.endswith(".tre")) else path for path in paths]
+                     for replicaID, paths in tre_files.items()}
 
     if (control_dict["cat_repdat"]):
         print("\tStart Cat_repdat")
@@ -1275,96 +1258,52 @@ def reeds_project_concatenation(in_folder: str,
         # browse folders
         repdat_file_paths = gather_simulation_file_paths(in_folder, filePrefix="", fileSuffixes=["repdat.dat"],
                                                          verbose=verbose)
-        if (n_processes > 1 and False):  # submit to pool for async execution
-            distributed_jobs = [(0, repdat_file_out_path, repdat_file_paths, verbose)]
-            p = mult.Pool(n_processes)
-            p_repdat = p.apply(thread_worker_concat_repdat, distributed_jobs)
-            p.close()
-            p.join()
-        else:
-            thread_worker_concat_repdat(job=-1, repdat_file_out_path=repdat_file_out_path,
-                                        repdat_file_paths=repdat_file_paths, verbose=verbose)
+        graph.add_task(("cat_repdat",), thread_worker_concat_repdat,
+                       kwargs={"job": -1, "repdat_file_out_path": repdat_file_out_path,
+                               "repdat_file_paths": repdat_file_paths, "verbose": verbose})
         out_repdat = repdat_file_out_path
 
     if (control_dict["ene_ana"]):
         print("\tStart ene ana")
-
-        # wait for async job creating the trcs.
-        # if (submitted_tre_job):
-        # p_tre.wait()
-
-        # gather potentials
-        # find all trc files in this project
-        tre_files = gather_simulation_replica_file_paths(in_folder, num_replicas, filePrefix="",
-                                                         fileSuffixes=[".tre", ".tre.gz"], verbose=verbose,
-                                                         finalNumberingSort=nofinal)  # ".tre.tar.gz"
-
         if (verbose): print(tre_files)
         properties = list(additional_properties) + ["eR"] + ["e" + str(state) for state in range(1, num_states + 1)]
 
-        # isolate potentials
+        # isolate potentials, after the tre files of the replica are concatenated
         if verbose: print("Isolate ene_ana:")
-        if (n_processes > 1):
-            p = mult.Pool(n_processes)
-            distribute_jobs = [
-                (tre_files, out_folder, properties, list(tre_files.keys())[n::n_processes], in_ene_ana_lib_path,
-                 gromosPP_bin_dir, out_file_prefix, "", 0, dt_tre, n, verbose) for n in range(n_processes)]
-            p_ene_ana = p.starmap(thread_worker_isolate_energies, distribute_jobs)
-            p.close()
-            p.join()
-        else:
-            out_files = thread_worker_isolate_energies(in_en_file_paths=tre_files, out_folder=out_folder,
-                                                       properties=properties,
-                                                       out_prefix=out_file_prefix,
-                                                       in_ene_ana_lib=in_ene_ana_lib_path,
-                                                       gromosPP_path=gromosPP_bin_dir, time=0, dt=dt_tre,
-                                                       replicas=list(tre_files.keys()),
-                                                       verbose=verbose)
+        for replicaID in tre_files:
+            graph.add_task(("ene_ana", replicaID), thread_worker_isolate_energies,
+                           kwargs={"in_en_file_paths": tre_files, "out_folder": out_folder, "properties": properties,
+                                   "replicas": [replicaID], "in_ene_ana_lib": in_ene_ana_lib_path,
+                                   "gromosPP_path": gromosPP_bin_dir, "out_prefix": out_file_prefix, "time": 0,
+                                   "dt": dt_tre, "job": replicaID, "verbose": verbose},
+                           dependencies=[("cat_tre", replicaID)] if (control_dict["cat_tre"]) else [])
 
     if (control_dict["convert_trcs"]):
         print("\tStart Trc Conversion")
-        # wait for async job creating the trcs.
-        # if (submitted_trc_job):
-        #    p_trc.wait()
-
-        # get files:
-        final_trc_files = list(
-            sorted(glob.glob(out_folder + "/*.trc*"), key=lambda x: int(x.split("_")[-1].split(".")[0])))
-
-        if (n_processes > 1):
-            out_dcd = manager.dict()
-            p = mult.Pool(n_processes)
-
-            distributed_jobs = [
-                (n, range(n, num_replicas, n_processes), final_trc_files, in_topology_path, gromosPP_bin_dir, out_dcd,
-                 fit_traj_to_mol, verbose) for
-                n in range(n_processes)]
-            p_conv = p.starmap(_thread_worker_conv_trc, distributed_jobs)
-            p.close()
-            p.join()
+        # the trajectory of a replica is converted after it is concatenated
+        if (control_dict["cat_trc"]):
+            final_trc_files = {name[1] - 1: out_prefix + str(name[1]) + ".trc.gz" for name in graph.tasks
+                               if (name[0] == "cat_trc")}
         else:
-            out_dcd = {}
-            _thread_worker_conv_trc(job=-1, replica_range=range(num_replicas), trc_files=final_trc_files,
-                                    in_topology_path=in_topology_path,
-                                    gromos_path=gromosPP_bin_dir, out_traj=out_dcd, fit_traj_to_mol=1, verbose=verbose)
+            final_trc_files = dict(enumerate(
+                sorted(glob.glob(out_folder + "/*.trc*"), key=lambda x: int(x.split("_")[-1].split(".")[0]))))
 
-    if (n_processes > 1):
-        """
-        #wait for the jobs to finish
-        if ((not p_conv or p_conv.wait()) and (not p_cnf or p_cnf.wait()) and
-                (not p_repdat or p_repdat.wait()) and (not p_trc or p_trc.wait()) and
-                (not p_tre or p_tre.wait()) and (not p_ene_ana or p_ene_ana.wait())):
-            raise ChildProcessError("A process failed! ")
+        for index in sorted(final_trc_files)[:num_replicas]:
+            graph.add_task(("convert_trcs", index + 1), _thread_worker_conv_trc,
+                           kwargs={"job": index, "replica_range": [index], "trc_files": final_trc_files,
+                                   "in_topology_path": in_topology_path, "gromos_path": gromosPP_bin_dir,
+                                   "out_traj": {}, "fit_traj_to_mol": fit_traj_to_mol, "verbose": verbose},
+                           dependencies=[("cat_trc", index + 1)] if (control_dict["cat_trc"]) else [])
 
-        p.close()
-        p.join()
-        """
-        out_cnfs = None if (isinstance(out_cnfs, type(None))) else dict(out_cnfs)
-        out_tres = None if (isinstance(out_tres, type(None))) else dict(out_tres)
-        out_trcs = None if (isinstance(out_trcs, type(None))) else dict(out_trcs)
-        out_dcd = None if (isinstance(out_dcd, type(None))) else dict(out_dcd)
-
-        manager.shutdown()
+    results = graph.run()
+    if (control_dict["cp_cnf"]):
+        out_cnfs = _merge_task_results(results, "cp_cnf")
+    if (control_dict["cat_trc"]):
+        out_trcs = _merge_task_results(results, "cat_trc")
+    if (control_dict["cat_tre"]):
+        out_tres = _merge_task_results(results, "cat_tre")
+    if (control_dict["convert_trcs"]):
+        out_dcd = _merge_task_results(results, "convert_trcs")
 
     out_dict = {"out_folder": out_folder, "cnfs": out_cnfs, "repdat": out_repdat, "tres": out_tres,
                 "trcs": out_trcs, "dcds": out_dcd}
@@ -1411,7 +1350,7 @@ def clean_up_dirs(root_dirs: List[str],
     if (type(root_dirs) == str):
         root_dirs = [root_dirs]
     for root_dir in root_dirs:
-        for path, dirs, files in os.walk(root_dir):
+        for path, dirs, files in file_index.FileIndex(root_dir, verbose=verbose).walk():
             trx_files = [path + "/" + file for file in files if (file.endswith(".trc") or file.endswith(".tre"))]
             delete_files = [path + "/" + file for file in files if
                             (file == "simulation.tar.gz" or file.endswith(".log") or
@@ -1438,20 +1377,16 @@ def clean_up_dirs(root_dirs: List[str],
                 if verbose: print("Do rm: \n")
                 distribute = [(job, tasks["rm"][job::n_processors], True) for job in range(n_processors)]
                 p.starmap(_thread_worker_delete, distribute)
-            if verbose: print("Do Tar: \n")
-            distribute = [(job, tasks["tar"][job::n_processors], True, True) for job in range(n_processors)]
-            p.starmap(_thread_worker_compress, distribute)
             p.close()
             p.join()
-        else:
-            if (delete_stuff):
-                if verbose: print("Do rm: \n")
-                for remove_file in tasks["rm"]:
-                    bash.remove_file(remove_file)
-
-            if verbose: print("Do Tar: \n")
-            for tar_file in tasks["tar"]:
-                bash.compress_gzip(in_path=tar_file)
+        elif (delete_stuff):
+            if verbose: print("Do rm: \n")
+            for remove_file in tasks["rm"]:
+                bash.remove_file(remove_file)
+
+        # the trajectories are compressed block wise with n_processors threads each
+        if verbose: print("Do Tar: \n")
+        compress_files(tasks["tar"], n_processes=n_processors)
         if verbose: print("DONE!")
     else:
         if verbose: print("This was a dry run! so I did not do a thing. :)")
@@ -1491,7 +1426,7 @@ def clean_up_euler_dirs(root_dirs: List[str],
     if (type(root_dirs) == str):
         root_dirs = [root_dirs]
     for root_dir in root_dirs:
-        for path, dirs, files in os.walk(root_dir):
+        for path, dirs, files in file_index.FileIndex(root_dir, verbose=verbose).walk():
             if ("scratch" in path):
                 continue
             elif ("simulation" in path):
@@ -1521,7 +1456,7 @@ def clean_up_euler_dirs(root_dirs: List[str],
                 distribute = [(job, tasks["rm"][job::n_processors], True) for job in range(n_processors)]
                 p.starmap(_thread_worker_delete, distribute)
             if verbose: print("Do Tar: \n")
-            distribute = [(job, tasks["tar"][job::n_processors], True, True) for job in range(n_processors)]
+            distribute = [(job, tasks["tar"][job::n_processors], True) for job in range(n_processors)]
             p.starmap(_thread_worker_compress, distribute)
             p.close()
             p.join()
@@ -1569,16 +1504,19 @@ def compress_folder(in_paths: list) -> str:
 
 
 def compress_files(in_paths: List[str],
-                   n_processes: int = 1) -> List[str]:
+                   n_processes: int = 1,
+                   codec: str = "gzip") -> List[str]:
     """compress_files
-    compress a list of files
+    compress a list of files, one after the other, each with n_processes threads (see compression.compress_file)
 
     Parameters
     ----------
     in_paths : List[str]
         input file paths
     n_processes: int, optional
-        number of parallel processes to use (default 1)
+        number of compression threads to use (default 1)
+    codec : str, optional
+        "gzip" (.gz) or "zstd" (.zst, needs the package zstandard) (default "gzip")
         
     Returns
     -------
@@ -1591,24 +1529,17 @@ def compress_files(in_paths: List[str],
     out_paths = []
 
     # check:
+    existing_paths = []
     for path in in_paths:
         if (os.path.exists(path)):
-            archive_path = path + ".gz"
-            out_paths.append(archive_path)
+            existing_paths.append(path)
         else:
             warnings.warn("File Path: " + path + " was not found!")
 
     # do:
     print("Gen Gzips:")
-    if (n_processes == 1):
-        for path in in_paths:
-            bash.compress_gzip(in_path=path, out_path=path + ".gz")
-    else:  # do parallel
-        p = mult.Pool(n_processes)
-        distribute = [(job, in_paths[job::n_processes], True) for job in range(n_processes)]
-        p.starmap(_thread_worker_compress, distribute)
-        p.close()
-        p.join()
+    for path in existing_paths:
+        out_paths.append(compression.compress_file(in_path=path, codec=codec, n_threads=n_processes))
     return out_paths
 
 
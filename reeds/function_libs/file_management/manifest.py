@@ -0,0 +1,147 @@
+"""
+    content manifest of the concatenation outputs
+
+    For every output of the concatenation (trc, tre, repdat, energy files), a manifest entry with the size,
+    modification time and checksum of the output and its inputs, and the parameters used to create it, is
+    written once the output is complete. A rerun only skips the outputs whose entry is still valid, i.e. a file
+    left over by a crashed job (no entry) or an output of changed inputs is created again.
+
+    The entries are stored in the hidden folder .reeds_manifest next to the outputs, one JSON file per output,
+    so that parallel workers never write to the same file.
+    The checksums are only calculated if the size is equal, but the modification time of a file changed.
+"""
+import hashlib
+import json
+import os
+from typing import Dict, List, Union
+
+manifest_dir_name = ".reeds_manifest"
+manifest_version = 1
+
+
+def file_checksum(in_path: str, chunk_size: int = 4 * 1024 ** 2) -> str:
+    """file_checksum
+    blake2b checksum of a file
+
+    Parameters
+    ----------
+    in_path : str
+        path of the file
+    chunk_size : int, optional
+        bytes read at once (default 4 MiB)
+
+    Returns
+    -------
+    str
+        hex digest
+    """
+    checksum = hashlib.blake2b(digest_size=16)
+    with open(in_path, "rb") as in_file:
+        for chunk in iter(lambda: in_file.read(chunk_size), b""):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def _entry_path(out_path: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(out_path)), manifest_dir_name, os.path.basename(out_path) + ".json")
+
+
+def _file_state(path: str) -> Dict[str, Union[str, int]]:
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+            "checksum": file_checksum(path)}
+
+
+def _file_unchanged(state: Dict[str, Union[str, int]], path: str) -> bool:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    if (stat.st_size != state["size"]):
+        return False
+    # e.g. touched or copied files keep their content
+    return stat.st_mtime_ns == state["mtime_ns"] or file_checksum(path) == state["checksum"]
+
+
+def _as_list(in_paths: Union[str, List[str]]) -> List[str]:
+    return [in_paths] if (isinstance(in_paths, str)) else list(in_paths)
+
+
+def is_up_to_date(out_path: str, in_paths: Union[str, List[str]], parameters: Dict = None) -> bool:
+    """is_up_to_date
+    checks if out_path was completely created from the unchanged in_paths with the same parameters
+
+    Parameters
+    ----------
+    out_path : str
+        output file
+    in_paths : Union[str, List[str]]
+        input files, in the order they were used
+    parameters : Dict, optional
+        JSON serializable parameters of the creation (default None)
+
+    Returns
+    -------
+    bool
+        True if the output can be kept
+    """
+    try:
+        with open(_entry_path(out_path), "r") as entry_file:
+            entry = json.load(entry_file)
+    except (OSError, ValueError):
+        return False
+
+    in_paths = [os.path.abspath(path) for path in _as_list(in_paths)]
+    if (entry.get("version") != manifest_version or
+            entry["parameters"] != json.loads(json.dumps(parameters)) or
+            [state["path"] for state in entry["inputs"]] != in_paths):
+        return False
+    return _file_unchanged(entry["output"], out_path) and all(
+        _file_unchanged(state, path) for state, path in zip(entry["inputs"], in_paths))
+
+
+def record(out_path: str, in_paths: Union[str, List[str]], parameters: Dict = None) -> str:
+    """record
+    writes the manifest entry of a completed output
+
+    Parameters
+    ----------
+    out_path : str
+        output file
+    in_paths : Union[str, List[str]]
+        input files, in the order they were used
+    parameters : Dict, optional
+        JSON serializable parameters of the creation (default None)
+
+    Returns
+    -------
+    str
+        path of the manifest entry
+    """
+    entry_path = _entry_path(out_path)
+    os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+    entry = {"version": manifest_version, "output": _file_state(out_path),
+             "inputs": [_file_state(path) for path in _as_list(in_paths)], "parameters": parameters}
+
+    # written to a temporary file first, an entry is always complete
+    tmp_path = entry_path + ".tmp"
+    with open(tmp_path, "w") as entry_file:
+        json.dump(entry, entry_file, indent=1)
+    os.replace(tmp_path, entry_path)
+    return entry_path
+
+
+def invalidate(out_path: str, remove_output: bool = True):
+    """invalidate
+    removes the manifest entry of out_path (and the output), before it is created again
+
+    Parameters
+    ----------
+    out_path : str
+        output file
+    remove_output : bool, optional
+        also remove out_path, e.g. a partial file of a crashed job (default True)
+    """
+    for path in [_entry_path(out_path)] + ([out_path] if (remove_output) else []):
+        if (os.path.exists(path)):
+            os.remove(path)
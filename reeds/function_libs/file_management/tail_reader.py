@@ -0,0 +1,178 @@
+"""
+    incremental (tail following) readers of growing output files
+
+    A reader remembers the byte offset up to which a file was parsed. Every call of read_new only parses the
+    complete lines (records) appended since the last call, so following a running simulation costs O(new data).
+    Supported are whitespace separated tables with a header line (OpenMM ene_traj_<name>_<i> and repdat_<name>,
+    GROMOS .dat and repdat files; comment lines starting with "#" are skipped) and the binary columnar output of
+    the OpenMM AsyncOutputWriter (<name>.bin).
+    If a file gets shorter than the offset (e.g. a restarted run), it is read again from the beginning.
+"""
+import json
+import os
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+
+def _is_number(field: bytes) -> bool:
+    try:
+        float(field)
+    except ValueError:
+        return False
+    return True
+
+
+class TailReader:
+    """TailReader
+    incremental reader of a whitespace separated table
+    """
+
+    def __init__(self, in_path: str, keep_data: bool = False):
+        """
+        Parameters
+        ----------
+        in_path : str
+            path of the table, does not have to exist yet
+        keep_data : bool, optional
+            keep all parsed rows in memory (see data) (default False)
+        """
+        self.in_path = in_path
+        self.keep_data = keep_data
+        self.offset = 0
+        self.num_rows = 0
+        self.num_resets = 0
+        self.columns: List[str] = None
+        self._chunks: List[pd.DataFrame] = []
+
+    def _reset(self):
+        self.offset = 0
+        self.num_rows = 0
+        self.num_resets += 1
+        self.columns = None
+        self._chunks = []
+
+    def _read_bytes(self) -> bytes:
+        try:
+            size = os.path.getsize(self.in_path)
+        except OSError:
+            return b""
+        if (size < self.offset):
+            self._reset()
+        if (size == self.offset):
+            return b""
+        with open(self.in_path, "rb") as in_file:
+            in_file.seek(self.offset)
+            content = in_file.read(size - self.offset)
+        # an incomplete last line is read with the next call
+        end = content.rfind(b"\n") + 1
+        self.offset += end
+        return content[:end]
+
+    def _parse(self, content: bytes) -> np.ndarray:
+        rows = []
+        for line in content.splitlines():
+            fields = line.replace(b"#", b" ").split()
+            if (len(fields) == 0):
+                continue
+            if (line.lstrip().startswith(b"#") or not _is_number(fields[0])):
+                # the last comment or non numeric line before the data is the header ("time e1 ..." or "# time e1 ...")
+                if (self.num_rows == 0 and len(rows) == 0):
+                    self.columns = [field.decode() for field in fields]
+                continue
+            if (self.columns is not None and len(fields) == len(self.columns)):
+                rows.append(fields)
+        return np.array(rows, dtype=np.float64).reshape(len(rows), len(self.columns or []))
+
+    def read_new(self) -> pd.DataFrame:
+        """read_new
+        parses the complete rows appended since the last call
+
+        Returns
+        -------
+        pd.DataFrame
+            new rows (empty if there are none)
+        """
+        new_rows = self._parse(self._read_bytes())
+        new_data = pd.DataFrame(new_rows, columns=self.columns or [])
+        self.num_rows += len(new_data)
+        if (self.keep_data and len(new_data) > 0):
+            self._chunks.append(new_data)
+        return new_data
+
+    @property
+    def data(self) -> pd.DataFrame:
+        """all rows parsed so far (needs keep_data)"""
+        if (len(self._chunks) == 0):
+            return pd.DataFrame(columns=self.columns or [])
+        if (len(self._chunks) > 1):
+            self._chunks = [pd.concat(self._chunks, ignore_index=True)]
+        return self._chunks[0]
+
+
+class BinaryTailReader(TailReader):
+    """BinaryTailReader
+    incremental reader of the binary output of the OpenMM AsyncOutputWriter (see read_binary_output)
+    """
+
+    def _read_bytes(self) -> bytes:
+        try:
+            size = os.path.getsize(self.in_path)
+        except OSError:
+            return b""
+        if (size < self.offset):
+            self._reset()
+        if (size == self.offset):
+            return b""
+        with open(self.in_path, "rb") as in_file:
+            in_file.seek(self.offset)
+            if (self.columns is None):
+                header = in_file.readline()
+                if (not header.endswith(b"\n")):
+                    return b""
+                self.columns = json.loads(header.decode())["columns"]
+                self.offset += len(header)
+            content = in_file.read(size - self.offset)
+
+        # only complete chunks: number of records followed by each column contiguously
+        end = 0
+        while (end + 8 <= len(content)):
+            num_records = int(np.frombuffer(content[end:end + 8], dtype=np.int64)[0])
+            chunk_end = end + 8 + 8 * num_records * len(self.columns)
+            if (chunk_end > len(content)):
+                break
+            end = chunk_end
+        self.offset += end
+        return content[:end]
+
+    def _parse(self, content: bytes) -> np.ndarray:
+        chunks = []
+        start = 0
+        while (start < len(content)):
+            num_records = int(np.frombuffer(content[start:start + 8], dtype=np.int64)[0])
+            values = np.frombuffer(content[start + 8:start + 8 + 8 * num_records * len(self.columns)], dtype=np.float64)
+            chunks.append(values.reshape(len(self.columns), num_records).T)
+            start += 8 + 8 * num_records * len(self.columns)
+        return np.concatenate(chunks) if (len(chunks) > 0) else np.zeros((0, len(self.columns or [])))
+
+
+def open_tail_reader(in_path: str, keep_data: bool = False) -> TailReader:
+    """open_tail_reader
+    incremental reader for a text table or a binary OpenMM output (.bin)
+
+    Parameters
+    ----------
+    in_path : str
+        path of the file
+    keep_data : bool, optional
+        keep all parsed rows in memory (default False)
+
+    Returns
+    -------
+    TailReader
+        reader, read_new returns the new rows
+    """
+    if (in_path.endswith(".bin")):
+        return BinaryTailReader(in_path, keep_data=keep_data)
+    return TailReader(in_path, keep_data=keep_data)
@@ -0,0 +1,116 @@
+"""
+    dependency aware execution of the concatenation stages
+
+    A TaskGraph runs functions (tasks) on a single pool of processes. A task is started as soon as all tasks
+    it depends on are finished, so the stages of different replicas overlap (e.g. the energies of replica 1 are
+    extracted while the trajectory of replica 2 is concatenated). Ready tasks are started in the order they were
+    added, therefore adding the stages replica by replica finishes the chains of the first replicas first.
+"""
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Callable, Dict, Hashable, Iterable, Tuple
+
+
+class TaskGraph:
+    """TaskGraph
+    functions with dependencies, executed on a pool of n_processes processes
+    """
+
+    def __init__(self, n_processes: int = 1, verbose: bool = False):
+        """
+        Parameters
+        ----------
+        n_processes : int, optional
+            number of processes, 1 runs the tasks one after the other in this process (default 1)
+        verbose : bool, optional
+            print the progress (default False)
+        """
+        self.n_processes = n_processes
+        self.verbose = verbose
+        # name -> (function, args, kwargs, dependencies)
+        self.tasks: Dict[Hashable, Tuple[Callable, tuple, dict, Tuple[Hashable]]] = {}
+
+    def add_task(self, name: Hashable, function: Callable, args: Iterable = (), kwargs: Dict = None,
+                 dependencies: Iterable[Hashable] = ()) -> Hashable:
+        """add_task
+        adds a task, its dependencies have to be added before
+
+        Parameters
+        ----------
+        name : Hashable
+            unique name of the task, e.g. ("cat_tre", 3)
+        function : Callable
+            function to execute (has to be picklable, i.e. defined on module level)
+        args : Iterable, optional
+            positional arguments
+        kwargs : Dict, optional
+            keyword arguments
+        dependencies : Iterable[Hashable], optional
+            names of the tasks which have to finish before this task starts
+
+        Returns
+        -------
+        Hashable
+            name
+        """
+        if (name in self.tasks):
+            raise ValueError("The task " + str(name) + " was already added.")
+        dependencies = tuple(dependencies)
+        unknown = [dependency for dependency in dependencies if (dependency not in self.tasks)]
+        if (len(unknown) > 0):
+            raise ValueError("The dependencies " + str(unknown) + " of task " + str(name) + " were not added.")
+        self.tasks[name] = (function, tuple(args), dict(kwargs or {}), dependencies)
+        return name
+
+    def _report(self, name: Hashable, num_done: int, duration: float):
+        if (self.verbose): print("[" + str(num_done) + "/" + str(len(self.tasks)) + "] " + str(name) +
+                                 " done (" + str(round(duration, 1)) + " s)")
+
+    def run(self) -> Dict[Hashable, Any]:
+        """run
+        executes all tasks
+
+        Returns
+        -------
+        Dict[Hashable, Any]
+            return value of each task
+
+        Raises
+        ------
+        ChildProcessError
+            if a task failed (the running tasks are finished, no new task is started)
+        """
+        results = {}
+        if (self.n_processes <= 1):
+            # insertion order is a valid order, the dependencies are added before
+            for name, (function, args, kwargs, _) in self.tasks.items():
+                start = time.time()
+                try:
+                    results[name] = function(*args, **kwargs)
+                except Exception as err:
+                    raise ChildProcessError("The task " + str(name) + " failed: " + str(err)) from err
+                self._report(name, len(results), time.time() - start)
+            return results
+
+        waiting = dict(self.tasks)
+        running = {}
+        with ProcessPoolExecutor(max_workers=self.n_processes) as pool:
+            while (len(waiting) > 0 or len(running) > 0):
+                # at most n_processes tasks are submitted, so the next ready task can be chosen in order
+                for name in list(waiting):
+                    if (len(running) >= self.n_processes):
+                        break
+                    function, args, kwargs, dependencies = waiting[name]
+                    if (all(dependency in results for dependency in dependencies)):
+                        running[pool.submit(function, *args, **kwargs)] = (name, time.time())
+                        del waiting[name]
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, start = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as err:
+                        raise ChildProcessError("The task " + str(name) + " failed: " + str(err)) from err
+                    self._report(name, len(results), time.time() - start)
+        return results
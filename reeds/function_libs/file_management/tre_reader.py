@@ -0,0 +1,331 @@
+"""
+    streaming reader for GROMOS energy trajectories (.tre, .tre.gz, .tre.zst)
+
+    The layout of the blocks and the definition of the properties are taken from an ene_ana library
+    (see reeds/data/ene_ana_libs), i.e. the properties are calculated in the same way as by gromos++ ene_ana,
+    but in process and without temporary files. Only the values needed for the requested properties are
+    kept and the trajectory is processed in chunks of frames, so the memory does not grow with the length
+    of the trajectory.
+"""
+import os
+import re
+import shutil
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from reeds.function_libs.file_management import compression
+
+# constants and functions which can be used in the variables of an ene_ana library
+ene_ana_constants = {"BOLTZ": "0.00831441"}
+ene_ana_functions = {"exp": np.exp, "ln": np.log, "log": np.log10, "sqrt": np.sqrt, "abs": np.abs}
+
+_token_pattern = re.compile(r"(\d+\.?\d*(?:[eE][+-]?\d+)?)|([A-Za-z_]\w*)((?:\[\s*\d+\s*\])*)")
+
+
+class EneAnaLibrary:
+    """EneAnaLibrary
+    block definitions (ENERTRJ) and variables (VARIABLES) of an ene_ana library file
+    """
+
+    def __init__(self, in_ene_ana_lib_path: str):
+        """
+        Parameters
+        ----------
+        in_ene_ana_lib_path : str
+            path to the ene_ana library
+        """
+        self.path = in_ene_ana_lib_path
+        # block name -> list of ("size", name) or ("subblock", name, rows, columns)
+        self.blocks: Dict[str, List[Tuple]] = {}
+        # variable name -> expression
+        self.variables: Dict[str, str] = {}
+
+        section = None
+        block = None
+        variable = None
+        with open(in_ene_ana_lib_path, "r") as lib_file:
+            for line in lib_file:
+                line = line.split("#")[0].strip()
+                if (not line):
+                    continue
+                if (section is None):
+                    section = line
+                    continue
+                if (line == "END"):
+                    section = variable = None
+                    continue
+
+                if (section == "ENERTRJ"):
+                    fields = line.split()
+                    if (fields[0] == "block"):
+                        block = fields[1]
+                        self.blocks[block] = []
+                    elif (fields[0] == "size"):
+                        self.blocks[block].append(("size", fields[1]))
+                    elif (fields[0] == "subblock"):
+                        self.blocks[block].append(("subblock", fields[1], fields[2], int(fields[3])))
+                elif (section == "VARIABLES"):
+                    if ("=" in line):
+                        variable, expression = [x.strip() for x in line.split("=", 1)]
+                        self.variables[variable] = expression
+                    elif (variable is not None):
+                        # multi line expression
+                        self.variables[variable] += " " + line
+
+        self.subblocks = {entry[1]: (block, entry[3]) for block, entries in self.blocks.items()
+                          for entry in entries if (entry[0] == "subblock")}
+
+    def compile(self, properties: Iterable[str]) -> Tuple[Dict[str, List[int]], Dict[str, str]]:
+        """compile
+        translates the properties into numpy expressions of the columns of a value matrix
+
+        Parameters
+        ----------
+        properties : Iterable[str]
+            properties (variables of the library or direct references like ENER[35])
+
+        Returns
+        -------
+        Tuple[Dict[str, List[int]], Dict[str, str]]
+            the (0-based) flat indices needed per subblock, and the expression per property,
+            in which _v[:, k] is the k-th of the needed values (in the order of the subblocks and indices)
+        """
+        references = []
+        translated = {prop: self._translate(self.variables.get(prop, prop), references, [prop]) for prop in properties}
+
+        needed: Dict[str, List[int]] = {}
+        for subblock, index in references:
+            if (index not in needed.setdefault(subblock, [])):
+                needed[subblock].append(index)
+        columns = {}
+        for subblock in needed:
+            needed[subblock] = sorted(needed[subblock])
+            for index in needed[subblock]:
+                columns[(subblock, index)] = len(columns)
+
+        expressions = {prop: re.sub(r"\{(\w+):(\d+)\}", lambda m: "_v[:, " + str(columns[(m.group(1), int(m.group(2)))]) + "]",
+                                    expression) for prop, expression in translated.items()}
+        return needed, expressions
+
+    def _translate(self, expression: str, references: List[Tuple[str, int]], stack: List[str]) -> str:
+        def replace(match):
+            number, name, indices = match.groups()
+            if (number is not None):
+                return number
+            if (indices):
+                if (name not in self.subblocks):
+                    raise ValueError("unknown block " + name + " in " + self.path)
+                idx = [int(i) - 1 for i in re.findall(r"\d+", indices)]
+                columns = self.subblocks[name][1]
+                flat_index = idx[0] if (len(idx) == 1) else idx[0] * columns + idx[1]
+                references.append((name, flat_index))
+                return "{" + name + ":" + str(flat_index) + "}"
+            if (name in self.variables):
+                if (name in stack):
+                    raise ValueError("recursive definition of " + name + " in " + self.path)
+                return "(" + self._translate(self.variables[name], references, stack + [name]) + ")"
+            if (name in ene_ana_constants):
+                return ene_ana_constants[name]
+            if (name in ene_ana_functions):
+                return name
+            raise ValueError("unknown property " + name + " (not defined in " + self.path + ")")
+
+        return _token_pattern.sub(replace, expression)
+
+
+def _resolve_size(dimension: str, sizes: Dict[str, int]) -> int:
+    if (dimension.isdigit()):
+        return int(dimension)
+    if (dimension.startswith("matrix_")):
+        n = sizes[dimension[len("matrix_"):]]
+        return n * (n + 1) // 2
+    return sizes[dimension]
+
+
+def open_tre(in_tre_path: str):
+    """open_tre
+    opens a (gzip or zstd compressed) energy trajectory for reading as text
+    """
+    return compression.open_compressed(in_tre_path, "rt")
+
+
+def read_tre_chunks(in_tre_path: str, ene_ana_lib: Union[str, EneAnaLibrary], properties: List[str],
+                    chunk_size: int = 10000, time: float = None, dt: float = None) -> Iterator[pd.DataFrame]:
+    """read_tre_chunks
+    reads the properties of an energy trajectory chunk by chunk
+
+    Parameters
+    ----------
+    in_tre_path : str
+        path to the .tre or .tre.gz file
+    ene_ana_lib : Union[str, EneAnaLibrary]
+        ene_ana library (or its path) defining the blocks of the file and the properties
+    properties : List[str]
+        properties to read, e.g. ["eR", "e1", "e2"]
+    chunk_size : int, optional
+        number of frames per chunk (default 10000)
+    time : float, optional
+        time of the first frame if dt is given (default None: time of the first TIMESTEP block)
+    dt : float, optional
+        time step between two frames (default None: times of the TIMESTEP blocks)
+
+    Yields
+    -------
+    pd.DataFrame
+        frames of the chunk, with the columns time and properties
+    """
+    library = ene_ana_lib if (isinstance(ene_ana_lib, EneAnaLibrary)) else EneAnaLibrary(ene_ana_lib)
+    needed, expressions = library.compile(["TIME[2]"] + [prop for prop in properties if (prop != "time")])
+    time_expression = expressions.pop("TIME[2]")
+    compiled = {prop: compile(expression, prop, "eval") for prop, expression in expressions.items()}
+
+    # position of the needed values of each block in the row of a frame
+    offsets = {}
+    num_values = 0
+    for subblock, indices in needed.items():
+        offsets[subblock] = num_values
+        num_values += len(indices)
+    needed_blocks = {block for block, entries in library.blocks.items()
+                     if (any(entry[0] == "subblock" and entry[1] in needed for entry in entries))}
+
+    start_time = time
+
+    def to_frame(rows: List[List[float]], first_frame: int) -> pd.DataFrame:
+        nonlocal start_time
+        values = np.array(rows, dtype=float).reshape(len(rows), num_values)
+        namespace = {"_v": values, **ene_ana_functions}
+        frame_times = eval(time_expression, namespace)
+        if (dt is not None):
+            if (start_time is None):
+                start_time = frame_times[0]
+            frame_times = start_time + dt * np.arange(first_frame, first_frame + len(rows))
+        data = {"time": frame_times}
+        for prop in properties:
+            if (prop != "time"):
+                data[prop] = np.broadcast_to(eval(compiled[prop], namespace), (len(rows),))
+        return pd.DataFrame(data)
+
+    rows = []
+    row = None
+    num_frames = 0
+    with open_tre(in_tre_path) as tre_file:
+        for line in tre_file:
+            block = line.strip()
+            if (not block or block.startswith("#")):
+                continue
+            if (block == "TIMESTEP"):
+                if (row is not None):
+                    rows.append(row)
+                    if (len(rows) == chunk_size):
+                        yield to_frame(rows, num_frames)
+                        num_frames += len(rows)
+                        rows = []
+                row = [np.nan] * num_values
+
+            if (block not in needed_blocks or row is None):
+                # skip the block (TITLE, ENEVERSION, ... or not needed for the properties)
+                for line in tre_file:
+                    if (line.strip() == "END"):
+                        break
+                continue
+
+            content = []
+            for line in tre_file:
+                stripped = line.strip()
+                if (stripped == "END"):
+                    break
+                if (stripped and not stripped.startswith("#")):
+                    content.append(stripped)
+            tokens = " ".join(content).split()
+
+            position = 0
+            sizes = {}
+            for entry in library.blocks[block]:
+                if (entry[0] == "size"):
+                    sizes[entry[1]] = int(float(tokens[position]))
+                    position += 1
+                    continue
+                _, subblock, rows_dimension, num_columns = entry
+                if (subblock in needed):
+                    offset = offsets[subblock]
+                    for k, index in enumerate(needed[subblock]):
+                        row[offset + k] = float(tokens[position + index])
+                position += _resolve_size(rows_dimension, sizes) * num_columns
+
+    if (row is not None):
+        rows.append(row)
+    if (len(rows) > 0):
+        yield to_frame(rows, num_frames)
+
+
+def isolate_energies(in_tre_path: Union[str, List[str]], out_path: str, ene_ana_lib: Union[str, EneAnaLibrary],
+                     properties: List[str], chunk_size: int = 10000, time: float = None, dt: float = None,
+                     out_format: str = "dat") -> str:
+    """isolate_energies
+    writes the properties of one or more energy trajectories to a single file, as gromos++ ene_ana (single_file)
+
+    Parameters
+    ----------
+    in_tre_path : Union[str, List[str]]
+        path(s) to the .tre or .tre.gz files (read one after the other)
+    out_path : str
+        output file, a tab separated table ("dat") or a numpy record array ("npy")
+    ene_ana_lib : Union[str, EneAnaLibrary]
+        ene_ana library (or its path)
+    properties : List[str]
+        properties to write
+    chunk_size : int, optional
+        number of frames per chunk (default 10000)
+    time : float, optional
+        time of the first frame if dt is given (default None: time of the first TIMESTEP block)
+    dt : float, optional
+        time step between two frames, continued over all files (default None: times of the TIMESTEP blocks)
+    out_format : str, optional
+        "dat" or "npy" (default "dat")
+
+    Returns
+    -------
+    str
+        out_path
+    """
+    if (out_format not in ["dat", "npy"]):
+        raise ValueError("unknown output format " + str(out_format) + " (use 'dat' or 'npy')")
+    library = ene_ana_lib if (isinstance(ene_ana_lib, EneAnaLibrary)) else EneAnaLibrary(ene_ana_lib)
+    in_tre_paths = [in_tre_path] if (isinstance(in_tre_path, str)) else list(in_tre_path)
+
+    # written to a temporary file first, a file at out_path is always complete
+    tmp_path = out_path + ".tmp"
+    # the npy records are streamed to a raw file, the header needs the number of frames
+    records_path = out_path + ".records.tmp"
+    dtype = None
+    num_frames = 0
+    start_time = time
+    with open(records_path if (out_format == "npy") else tmp_path, "wb" if (out_format == "npy") else "w") as out_file:
+        for path in in_tre_paths:
+            file_time = None if (start_time is None or dt is None) else start_time + dt * num_frames
+            for chunk in read_tre_chunks(path, library, properties, chunk_size=chunk_size, time=file_time, dt=dt):
+                if (start_time is None):
+                    start_time = chunk["time"].iloc[0]
+                first_chunk = num_frames == 0
+                num_frames += len(chunk)
+                if (out_format == "npy"):
+                    records = chunk.to_records(index=False)
+                    dtype = records.dtype
+                    out_file.write(records.tobytes())
+                else:
+                    chunk.to_csv(out_file, sep="\t", index=False, header=first_chunk)
+
+    if (out_format == "npy"):
+        with open(tmp_path, "wb") as npy_file:
+            if (dtype is None):
+                np.save(npy_file, np.array([]))
+            else:
+                header = {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False, "shape": (num_frames,)}
+                np.lib.format.write_array_header_1_0(npy_file, header)
+                with open(records_path, "rb") as records_file:
+                    shutil.copyfileobj(records_file, npy_file)
+        os.remove(records_path)
+    os.replace(tmp_path, out_path)
+    return out_path
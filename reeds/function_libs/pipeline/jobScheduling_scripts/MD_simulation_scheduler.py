@@ -12,7 +12,7 @@ import traceback
 from pygromos.euler_submissions import FileManager as fM
 from pygromos.euler_submissions.Submission_Systems import LSF
 from pygromos.utils import bash
-from reeds.function_libs.pipeline.jobScheduling_scripts.scheduler_functions import do_skip_job
+from reeds.function_libs.pipeline.jobScheduling_scripts.scheduler_functions import do_skip_job, QueueSnapshot
 from reeds.function_libs.pipeline.worker_scripts.simulation_workers import MD_simulation_run_worker as workerScript
 from reeds.function_libs.utils.structures import spacer
 
@@ -144,6 +144,7 @@ def do(in_simSystem: fM.System, in_imd_path: str,
         if (write_out_free_energy_traj):
             add_options += " -out_trg"
         lsf = LSF()
+        queue_snapshot = QueueSnapshot(job_submission_system=lsf, out_dir_path=out_dir_path, verbose=verbose)
 
         for i in range(1, equilibration_num + simulation_num + 1):
             # Equil or normal run?
@@ -162,7 +163,8 @@ def do(in_simSystem: fM.System, in_imd_path: str,
 
             skip_job, previous_job_ID = do_skip_job(tmp_out_cnf=tmp_out_cnf, simSystem=in_simSystem,
                                                     tmp_jobname=tmp_jobname, job_submission_system=lsf,
-                                                    previous_job=previous_job_ID, verbose=verbose)
+                                                    previous_job=previous_job_ID, queue_snapshot=queue_snapshot,
+                                                    verbose=verbose)
             if (not skip_job):
                 prefix_command += "sleep 2s && cp " + in_imd_path + " " + tmp_in_imd  # initial
                 bash.make_folder(tmp_outdir)
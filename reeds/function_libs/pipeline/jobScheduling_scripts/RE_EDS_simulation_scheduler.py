@@ -14,7 +14,7 @@ from pygromos.euler_submissions.Submission_Systems import _SubmissionSystem, LSF
 from pygromos.files.coord import cnf
 from pygromos.files.imd import Imd
 from pygromos.utils import bash
-from reeds.function_libs.pipeline.jobScheduling_scripts.scheduler_functions import chain_submission
+from reeds.function_libs.pipeline.jobScheduling_scripts.scheduler_functions import chain_submission, QueueSnapshot
 from reeds.function_libs.pipeline.worker_scripts.simulation_workers import RE_EDS_simulation_run_worker as workerScript
 from reeds.function_libs.utils.structures import spacer, additional_argparse_argument
 
@@ -197,6 +197,10 @@ int
 
     # Submitting part
     try:
+        # the queue is queried once for the equilibration, the production and the analysis jobs
+        queue_snapshot = QueueSnapshot(job_submission_system=job_submission_system, out_dir_path=out_dir_path,
+                                       verbose=verbose)
+
         # System Equilibration runs
         if (num_equilibration_runs > 0):
             eq_num = num_equilibration_runs
@@ -232,6 +236,7 @@ int
                                                                        initialize_first_run=initialize_first_run,
                                                                        reinitialize=reinitialize,
                                                                        memory = memory,
+                                                                       queue_snapshot=queue_snapshot,
                                                                        verbose=verbose)
             prefix_command = ""
 
@@ -256,6 +261,7 @@ int
                                                                    initialize_first_run=initialize_first_run,
                                                                    reinitialize=reinitialize,
                                                                    memory = memory,
+                                                                   queue_snapshot=queue_snapshot,
                                                                    verbose=verbose)
 
         # schedule - final analysis
@@ -264,7 +270,7 @@ int
             tmp_ana_jobname = jobname + "_final_ana"
 
             ## check if already submitted
-            queued_job_ids = job_submission_system.get_jobs_from_queue(job_name=tmp_ana_jobname)
+            queued_job_ids = queue_snapshot.get_jobs_from_queue(job_name=tmp_ana_jobname)
             if (do_not_doubly_submit_to_queue and len(queued_job_ids) > 0):  # check if job is already submitted:
                 if (verbose): print(
                     "\t\t\tSKIP submission of final Analysis: " + tmp_jobname + " was already submitted to the queue! \n\t\t\t\tSKIP\n"
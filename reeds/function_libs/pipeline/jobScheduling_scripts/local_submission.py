@@ -0,0 +1,477 @@
+"""
+    local multi process submission system
+
+    The LocalProcessPoolSubmission has the interface of the pygromos submission systems (submit_to_queue,
+    get_jobs_from_queue, dependencies with queue_after_jobID), but runs the jobs on the local machine. This allows
+    to run the pipeline on a single workstation and to test the scheduling offline.
+
+    The jobs and their states (PEND, RUN, DONE, EXIT, CANCELLED) are stored in a small SQLite file, which is shared
+    by all submitting processes. A dispatcher process (started on the first submission, running as long as jobs are
+    queued) starts the jobs, whose dependencies are done, as long as their cores (nmpi * nomp) and memory
+    (maxStorage per core, MB) fit into the free slots of the machine. Jobs are started in the submission order, but
+    smaller jobs are packed onto free cores, if the next job does not fit.
+"""
+import argparse
+import fcntl
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import time
+from contextlib import closing
+from typing import Dict, List, Union
+
+import pandas as pd
+
+default_db_path = os.path.join(os.path.expanduser("~"), ".reeds_local_queue.sqlite")
+
+queued_states = ("PEND", "RUN")
+finished_states = ("DONE", "EXIT", "CANCELLED")
+
+_schema = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    command TEXT NOT NULL,
+    work_dir TEXT NOT NULL,
+    out_log TEXT,
+    err_log TEXT,
+    cores INTEGER NOT NULL,
+    nomp INTEGER NOT NULL,
+    memory REAL NOT NULL,
+    duration REAL,
+    dependency INTEGER,
+    after_ended INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    pid INTEGER,
+    return_code INTEGER,
+    submit_time REAL NOT NULL,
+    start_time REAL,
+    end_time REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state);
+CREATE INDEX IF NOT EXISTS jobs_name ON jobs (name);
+CREATE TABLE IF NOT EXISTS limits (key TEXT PRIMARY KEY, value REAL NOT NULL);
+"""
+
+
+def _connect(db_path: str) -> closing:
+    # autocommit, transactions are started explicitly
+    connection = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+    connection.row_factory = sqlite3.Row
+    connection.executescript(_schema)
+    return closing(connection)
+
+
+def _total_memory() -> float:
+    # MB
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1024 ** 2
+    except (ValueError, OSError, AttributeError):
+        return float("inf")
+
+
+def _parse_duration(duration: Union[str, int, None]) -> Union[float, None]:
+    # "HH:MM" (LSF) or "HH:MM:SS" -> seconds
+    if (duration is None or duration == ""):
+        return None
+    if (isinstance(duration, (int, float))):
+        return float(duration)
+    seconds = 0.0
+    for field in str(duration).split(":"):
+        seconds = seconds * 60 + float(field)
+    return seconds * (60 if (str(duration).count(":") == 1) else 1)
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class LocalProcessPoolSubmission:
+    """LocalProcessPoolSubmission
+    submission system running the jobs in a pool of local processes
+    """
+
+    def __init__(self, db_path: str = None, n_cpus: int = None, memory: float = None, poll_interval: float = 1.0,
+                 autostart: bool = True, submission: bool = True, verbose: bool = False):
+        """
+        Parameters
+        ----------
+        db_path : str, optional
+            SQLite file with the jobs (default: $REEDS_LOCAL_QUEUE or ~/.reeds_local_queue.sqlite)
+        n_cpus : int, optional
+            number of cores the jobs may use (default: all available cores)
+        memory : float, optional
+            memory in MB the jobs may use (default: physical memory)
+        poll_interval : float, optional
+            seconds between two checks of the dispatcher (default 1.0)
+        autostart : bool, optional
+            start a dispatcher process, if none is running, when a job is submitted (default True).
+            Without, the jobs are only started by dispatch (e.g. for tests).
+        submission : bool, optional
+            if False, the jobs are only printed, as in the pygromos submission systems (default True)
+        verbose : bool, optional
+            verbose output (default False)
+        """
+        self.db_path = os.path.abspath(db_path or os.environ.get("REEDS_LOCAL_QUEUE", default_db_path))
+        self.poll_interval = poll_interval
+        self.autostart = autostart
+        self.submission = submission
+        self.verbose = verbose
+
+        self._processes: Dict[int, subprocess.Popen] = {}
+        self._lock_file = None
+        # the limits are shared with the dispatcher, given limits replace the stored ones
+        with self._connection() as connection:
+            for key, value in (("n_cpus", n_cpus), ("memory", memory)):
+                if (value is not None):
+                    connection.execute("INSERT OR REPLACE INTO limits VALUES (?, ?)", (key, value))
+
+    def _connection(self) -> closing:
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        return _connect(self.db_path)
+
+    def _limits(self, connection: sqlite3.Connection) -> Dict[str, float]:
+        limits = {"n_cpus": len(os.sched_getaffinity(0)) if (hasattr(os, "sched_getaffinity")) else os.cpu_count(),
+                  "memory": _total_memory()}
+        limits.update({row["key"]: row["value"] for row in connection.execute("SELECT * FROM limits")})
+        return limits
+
+    @property
+    def n_cpus(self) -> int:
+        """number of cores the jobs may use"""
+        with self._connection() as connection:
+            return int(self._limits(connection)["n_cpus"])
+
+    @property
+    def memory(self) -> float:
+        """memory in MB the jobs may use"""
+        with self._connection() as connection:
+            return self._limits(connection)["memory"]
+
+    def submit_to_queue(self, command: str, jobName: str, outLog: str = None, errLog: str = None, nmpi: int = 1,
+                        nomp: int = 1, maxStorage: float = None, queue_after_jobID: int = None,
+                        force_queue_start_after: bool = False, submit_from_dir: str = None, duration: str = None,
+                        verbose: bool = False, **kwargs) -> int:
+        """submit_to_queue
+        queues a job
+
+        Parameters
+        ----------
+        command : str
+            bash command (or script) to execute
+        jobName : str
+            name of the job
+        outLog : str, optional
+            file for the standard output (default: <jobName>.out in submit_from_dir)
+        errLog : str, optional
+            file for the standard error (default: outLog)
+        nmpi : int, optional
+            number of mpi processes (default 1)
+        nomp : int, optional
+            number of openmp threads per process (default 1)
+        maxStorage : float, optional
+            memory per core in MB (default None: not limited)
+        queue_after_jobID : int, optional
+            the job starts after this job is done (default None)
+        force_queue_start_after : bool, optional
+            start the job also if queue_after_jobID failed (default False)
+        submit_from_dir : str, optional
+            working directory of the job (default: current directory)
+        duration : str, optional
+            maximal run time "HH:MM", the job is killed afterwards (default None: not limited)
+        verbose : bool, optional
+            verbose output (default False)
+        kwargs
+            further options of the other submission systems, e.g. end_mail, are ignored
+
+        Returns
+        -------
+        int
+            job ID
+        """
+        cores = max(1, int(nmpi)) * max(1, int(nomp))
+        memory = cores * float(maxStorage or 0)
+        if (cores > self.n_cpus or memory > self.memory):
+            raise ValueError("The job " + jobName + " needs " + str(cores) + " cores and " + str(memory) +
+                             " MB, but only " + str(self.n_cpus) + " cores and " + str(self.memory) + " MB can be used.")
+        work_dir = os.path.abspath(submit_from_dir or os.getcwd())
+        out_log = outLog or os.path.join(work_dir, jobName + ".out")
+        if (not self.submission):
+            print("\nSKIP submission of " + jobName + ":\n" + command + "\n")
+            return -1
+
+        with self._connection() as connection:
+            if (queue_after_jobID is not None and
+                    connection.execute("SELECT id FROM jobs WHERE id = ?", (int(queue_after_jobID),)).fetchone() is None):
+                raise ValueError("The job " + jobName + " depends on the unknown job " + str(queue_after_jobID) + ".")
+            job_id = connection.execute(
+                "INSERT INTO jobs (name, command, work_dir, out_log, err_log, cores, nomp, memory, duration, dependency, "
+                "after_ended, state, submit_time) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'PEND', ?)",
+                (jobName, command, work_dir, out_log, errLog or out_log, cores, max(1, int(nomp)), memory,
+                 _parse_duration(duration), None if (queue_after_jobID is None) else int(queue_after_jobID),
+                 int(bool(force_queue_start_after)), time.time())).lastrowid
+        if (verbose or self.verbose): print("submitted " + jobName + " as local job " + str(job_id))
+
+        if (self.autostart):
+            self.start_dispatcher()
+        return job_id
+
+    def get_jobs_from_queue(self, job_name: str, **kwargs) -> List[int]:
+        """get_jobs_from_queue
+        finds the pending and running jobs with the given name
+
+        Parameters
+        ----------
+        job_name : str
+            name of the job
+
+        Returns
+        -------
+        List[int]
+            job IDs
+        """
+        with self._connection() as connection:
+            rows = connection.execute("SELECT id FROM jobs WHERE name = ? AND state IN (?, ?) ORDER BY id",
+                                      (job_name,) + queued_states).fetchall()
+        return [row["id"] for row in rows]
+
+    def get_queued_jobs(self) -> pd.DataFrame:
+        """get_queued_jobs
+        lists the whole queue with one query, as the pygromos submission systems
+
+        Returns
+        -------
+        pd.DataFrame
+            pending and running jobs with the columns JOBID, JOB_NAME and STAT
+        """
+        with self._connection() as connection:
+            rows = connection.execute("SELECT id, name, state FROM jobs WHERE state IN (?, ?) ORDER BY id",
+                                      queued_states).fetchall()
+        return pd.DataFrame([tuple(row) for row in rows], columns=["JOBID", "JOB_NAME", "STAT"])
+
+    def job_state(self, job_id: int) -> str:
+        """job_state
+
+        Parameters
+        ----------
+        job_id : int
+            job ID
+
+        Returns
+        -------
+        str
+            PEND, RUN, DONE, EXIT or CANCELLED
+        """
+        with self._connection() as connection:
+            row = connection.execute("SELECT state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if (row is None):
+            raise ValueError("unknown job " + str(job_id))
+        return row["state"]
+
+    def jobs(self) -> List[Dict]:
+        """jobs
+
+        Returns
+        -------
+        List[Dict]
+            all jobs of the queue file with their state
+        """
+        with self._connection() as connection:
+            return [dict(row) for row in connection.execute("SELECT * FROM jobs ORDER BY id").fetchall()]
+
+    def kill_jobs(self, job_ids: List[int]):
+        """kill_jobs
+        cancels pending jobs and terminates running jobs
+
+        Parameters
+        ----------
+        job_ids : List[int]
+            job IDs
+        """
+        with self._connection() as connection:
+            for job_id in job_ids:
+                connection.execute("UPDATE jobs SET state = 'CANCELLED', end_time = ? WHERE id = ? AND state = 'PEND'",
+                                   (time.time(), job_id))
+                row = connection.execute("SELECT pid FROM jobs WHERE id = ? AND state = 'RUN'", (job_id,)).fetchone()
+                if (row is not None and row["pid"] is not None):
+                    try:
+                        os.killpg(row["pid"], signal.SIGTERM)
+                    except ProcessLookupError:
+                        pass
+
+    def wait(self, job_ids: List[int] = None, timeout: float = None) -> Dict[int, str]:
+        """wait
+        waits until the jobs are finished (without autostart, the jobs are dispatched by this process)
+
+        Parameters
+        ----------
+        job_ids : List[int], optional
+            jobs to wait for (default None: all jobs)
+        timeout : float, optional
+            maximal seconds to wait (default None)
+
+        Returns
+        -------
+        Dict[int, str]
+            state of each job
+        """
+        start = time.time()
+        while True:
+            states = {job["id"]: job["state"] for job in self.jobs() if (job_ids is None or job["id"] in job_ids)}
+            if (all(state in finished_states for state in states.values())):
+                return states
+            if (timeout is not None and time.time() - start > timeout):
+                return states
+            if (not self.autostart):
+                self.dispatch()
+            time.sleep(self.poll_interval)
+
+    def _dispatcher_running(self) -> bool:
+        # the dispatcher holds an exclusive lock on the lock file
+        if (self._lock_file is not None):
+            return False
+        with open(self.db_path + ".lock", "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return False
+
+    def start_dispatcher(self):
+        """start_dispatcher
+        starts a dispatcher process in the background, if none is running
+        """
+        if (self._dispatcher_running()):
+            return
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), "-db_path", self.db_path,
+                          "-poll_interval", str(self.poll_interval)],
+                         stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                         start_new_session=True)
+
+    def _start(self, connection: sqlite3.Connection, job: sqlite3.Row) -> bool:
+        script_path = os.path.join(os.path.dirname(self.db_path), ".reeds_local_jobs", str(job["id"]) + ".sh")
+        environment = dict(os.environ, OMP_NUM_THREADS=str(job["nomp"]), REEDS_LOCAL_JOB_ID=str(job["id"]))
+        try:
+            os.makedirs(os.path.dirname(script_path), exist_ok=True)
+            with open(script_path, "w") as script:
+                script.write("#!/bin/bash\n" + job["command"] + "\n")
+            with open(job["out_log"], "a") as out_log, open(job["err_log"], "a") as err_log:
+                process = subprocess.Popen(["bash", script_path], cwd=job["work_dir"], stdout=out_log, stderr=err_log,
+                                           stdin=subprocess.DEVNULL, env=environment, start_new_session=True)
+        except OSError as err:
+            # e.g. the working directory was removed, as a job failing at the start
+            connection.execute("UPDATE jobs SET state = 'EXIT', return_code = -1, end_time = ? WHERE id = ?",
+                               (time.time(), job["id"]))
+            if (self.verbose): print("could not start local job " + str(job["id"]) + ": " + str(err))
+            return False
+        self._processes[job["id"]] = process
+        connection.execute("UPDATE jobs SET state = 'RUN', pid = ?, start_time = ? WHERE id = ?",
+                           (process.pid, time.time(), job["id"]))
+        if (self.verbose): print("started local job " + str(job["id"]) + " (" + job["name"] + ")")
+        return True
+
+    def dispatch(self) -> List[int]:
+        """dispatch
+        one step of the dispatcher: collects the finished jobs and starts the jobs which can run now
+
+        Returns
+        -------
+        List[int]
+            started job IDs
+        """
+        started = []
+        with self._connection() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                limits = self._limits(connection)
+                now = time.time()
+
+                # finished jobs
+                for job_id, process in list(self._processes.items()):
+                    return_code = process.poll()
+                    if (return_code is None):
+                        job = connection.execute("SELECT duration, start_time FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                        if (job["duration"] is not None and now - job["start_time"] > job["duration"]):
+                            try:
+                                os.killpg(process.pid, signal.SIGTERM)
+                            except ProcessLookupError:
+                                pass
+                        continue
+                    del self._processes[job_id]
+                    connection.execute("UPDATE jobs SET state = ?, return_code = ?, end_time = ? WHERE id = ?",
+                                       ("DONE" if (return_code == 0) else "EXIT", return_code, now, job_id))
+                # running jobs of a lost dispatcher
+                for job in connection.execute("SELECT id, pid FROM jobs WHERE state = 'RUN'").fetchall():
+                    if (job["id"] not in self._processes and not _is_alive(job["pid"])):
+                        connection.execute("UPDATE jobs SET state = 'EXIT', end_time = ? WHERE id = ?", (now, job["id"]))
+
+                # jobs, whose dependency can never be fulfilled (along the whole chain)
+                while (connection.execute(
+                        "UPDATE jobs SET state = 'CANCELLED', end_time = ? WHERE state = 'PEND' AND after_ended = 0 AND "
+                        "dependency IN (SELECT id FROM jobs WHERE state IN ('EXIT', 'CANCELLED'))", (now,)).rowcount > 0):
+                    pass
+
+                running = connection.execute("SELECT COALESCE(SUM(cores), 0) AS cores, COALESCE(SUM(memory), 0) AS memory "
+                                             "FROM jobs WHERE state = 'RUN'").fetchone()
+                free_cores = limits["n_cpus"] - running["cores"]
+                free_memory = limits["memory"] - running["memory"]
+                # the dependency is done, or ended for force_queue_start_after (after_ended)
+                ready = connection.execute(
+                    "SELECT job.* FROM jobs AS job LEFT JOIN jobs AS dependency ON job.dependency = dependency.id "
+                    "WHERE job.state = 'PEND' AND (job.dependency IS NULL OR dependency.state = 'DONE' OR "
+                    "(job.after_ended = 1 AND dependency.state IN ('EXIT', 'CANCELLED'))) ORDER BY job.id").fetchall()
+                for job in ready:
+                    if (job["cores"] <= free_cores and job["memory"] <= free_memory and self._start(connection, job)):
+                        free_cores -= job["cores"]
+                        free_memory -= job["memory"]
+                        started.append(job["id"])
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        return started
+
+    def run_dispatcher(self):
+        """run_dispatcher
+        dispatches the jobs until no job is queued anymore, only one dispatcher runs per queue file
+        """
+        self._lock_file = open(self.db_path + ".lock", "a")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            while True:
+                self.dispatch()
+                if (self._num_queued() == 0 and len(self._processes) == 0):
+                    # a job submitted after the unlock starts a new dispatcher, one submitted before is seen here
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+                    if (self._num_queued() == 0):
+                        return
+                    fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                time.sleep(self.poll_interval)
+        except BlockingIOError:
+            # another dispatcher is running
+            return
+        finally:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _num_queued(self) -> int:
+        with self._connection() as connection:
+            return connection.execute("SELECT COUNT(*) FROM jobs WHERE state IN (?, ?)", queued_states).fetchone()[0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="dispatcher of the LocalProcessPoolSubmission")
+    parser.add_argument("-db_path", type=str, required=True, help="SQLite file of the queue")
+    parser.add_argument("-poll_interval", type=float, default=1.0, help="seconds between two checks")
+    args = parser.parse_args()
+
+    LocalProcessPoolSubmission(db_path=args.db_path, poll_interval=args.poll_interval).run_dispatcher()
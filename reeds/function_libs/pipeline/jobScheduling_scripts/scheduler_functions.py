@@ -1,5 +1,7 @@
+import fnmatch
 import glob
 import os
+from typing import Dict, List, Union
 
 from pygromos.euler_submissions.FileManager import Simulation_System
 from pygromos.euler_submissions.Submission_Systems import _SubmissionSystem
@@ -11,9 +13,113 @@ from reeds.function_libs.pipeline.worker_scripts.simulation_workers import prepa
 from reeds.function_libs.utils.structures import spacer
 
 
+class QueueSnapshot:
+    """QueueSnapshot
+    snapshot of the job queue and of the finished runs for one submission pass.
+
+    The queue is queried once (get_queued_jobs of the submission system) and indexed by the job names, the output
+    directory is globbed once for the coordinate files. All skip decisions of do_skip_job are answered from this
+    snapshot, instead of querying the queue (e.g. bjobs) and the file system for each run.
+    """
+
+    def __init__(self, job_submission_system: _SubmissionSystem, out_dir_path: str = None, verbose: bool = False):
+        """
+        Parameters
+        ----------
+        job_submission_system : _SubmissionSystem
+            the submission system of choice
+        out_dir_path : str, optional
+            directory containing the run directories with the output coordinate files (default None: no index)
+        verbose : bool, optional
+            verbose output (default False)
+        """
+        self.job_submission_system = job_submission_system
+        self.verbose = verbose
+
+        # without a listing of the whole queue, the queue is searched by name and the answers are cached
+        job_ids = self._index_queue()
+        self.queue_listed = job_ids is not None
+        self.job_ids: Dict[str, List[int]] = job_ids if (self.queue_listed) else {}
+        self.out_dir_path = None if (out_dir_path is None) else os.path.abspath(out_dir_path)
+        self.out_cnfs: Dict[str, List[str]] = {}
+        if (self.out_dir_path is not None):
+            for cnf_path in glob.glob(self.out_dir_path + "/*/*.cnf"):
+                self.out_cnfs.setdefault(os.path.dirname(cnf_path), []).append(os.path.basename(cnf_path))
+            if (verbose): print("Found " + str(sum(map(len, self.out_cnfs.values()))) + " coordinate files in " +
+                                self.out_dir_path)
+
+    def _index_queue(self) -> Union[Dict[str, List[int]], None]:
+        # name -> job ids of the whole queue, None if the submission system can only be searched by name
+        if (not hasattr(self.job_submission_system, "get_queued_jobs")):
+            return None
+        queued_jobs = self.job_submission_system.get_queued_jobs()
+        if (queued_jobs is None or not hasattr(queued_jobs, "columns")):
+            return None
+        name_columns = [column for column in ("JOB_NAME", "NAME") if (column in queued_jobs.columns)]
+        if ("JOBID" not in queued_jobs.columns or len(name_columns) == 0):
+            return None
+
+        job_ids = {}
+        for job_id, job_name in zip(queued_jobs["JOBID"], queued_jobs[name_columns[0]]):
+            job_ids.setdefault(str(job_name).strip(), []).append(int(job_id))
+        if (self.verbose): print("Found " + str(len(queued_jobs)) + " jobs in the queue")
+        return job_ids
+
+    def get_jobs_from_queue(self, job_name: str) -> List[int]:
+        """get_jobs_from_queue
+
+        Parameters
+        ----------
+        job_name : str
+            name of the job
+
+        Returns
+        -------
+        List[int]
+            ids of the queued jobs with this name
+        """
+        if (not self.queue_listed and job_name not in self.job_ids):
+            self.job_ids[job_name] = list(self.job_submission_system.get_jobs_from_queue(job_name=job_name))
+        return self.job_ids.get(job_name, [])
+
+    def add_job(self, job_name: str, job_id: int):
+        """add_job
+        registers a job submitted during this pass, such that it is not submitted twice
+
+        Parameters
+        ----------
+        job_name : str
+            name of the job
+        job_id : int
+            job ID
+        """
+        self.job_ids.setdefault(job_name, []).append(job_id)
+
+    def glob_out_cnfs(self, out_cnfs_regex: str) -> List[str]:
+        """glob_out_cnfs
+        finds the coordinate files matching the glob pattern, directories outside of out_dir_path are globbed
+
+        Parameters
+        ----------
+        out_cnfs_regex : str
+            glob pattern of the coordinate files
+
+        Returns
+        -------
+        List[str]
+            matching coordinate files
+        """
+        run_dir = os.path.dirname(os.path.abspath(out_cnfs_regex))
+        if (self.out_dir_path is None or os.path.dirname(run_dir) != self.out_dir_path):
+            return glob.glob(out_cnfs_regex)
+        file_pattern = os.path.basename(out_cnfs_regex)
+        return [os.path.join(run_dir, cnf_name) for cnf_name in self.out_cnfs.get(run_dir, [])
+                if (fnmatch.fnmatchcase(cnf_name, file_pattern))]
+
+
 def do_skip_job(tmp_out_cnf: str, simSystem: Simulation_System, tmp_jobname: str,
                 job_submission_system: _SubmissionSystem, previous_job: int, do_not_doubly_submit_to_queue: bool = True,
-                verbose: bool = True):
+                queue_snapshot: QueueSnapshot = None, verbose: bool = True):
     """
         This function is detecting if a simulation was already carried out or if the simulation is already queued in the submission system.
 
@@ -31,6 +137,8 @@ def do_skip_job(tmp_out_cnf: str, simSystem: Simulation_System, tmp_jobname: str
         the id of the previous job.
     do_not_doubly_submit_to_queue : bool, optional
         if a job already exists in the submission queue, shall this job not be submitted?
+    queue_snapshot : QueueSnapshot, optional
+        answer from this snapshot of the queue and of the output files, instead of querying them (default None)
     verbose: bool, optional
         Monster noise!
 
@@ -43,7 +151,10 @@ def do_skip_job(tmp_out_cnf: str, simSystem: Simulation_System, tmp_jobname: str
     # Check if job with same name is already in the queue!
     if (do_not_doubly_submit_to_queue):  # can we find an job with this name in the queue?
         if (verbose): print("Checking for jobs with name: " + tmp_jobname)
-        queued_job_ids = job_submission_system.get_jobs_from_queue(job_name=tmp_jobname)
+        if (queue_snapshot is None):
+            queued_job_ids = job_submission_system.get_jobs_from_queue(job_name=tmp_jobname)
+        else:
+            queued_job_ids = queue_snapshot.get_jobs_from_queue(job_name=tmp_jobname)
 
         ## check if already submitted
         if (len(queued_job_ids) > 0):  # check if job is already submitted:
@@ -57,14 +168,18 @@ def do_skip_job(tmp_out_cnf: str, simSystem: Simulation_System, tmp_jobname: str
                 previous_job = queued_job_ids[0]
                 if (verbose): print("\nTRY to attach next job to ", previous_job, "\n")
             else:
-                raise ValueError("\nthere are multiple jobs, that could be the precessor. " + " ".join(queued_job_ids))
+                raise ValueError("\nthere are multiple jobs, that could be the precessor. " + " ".join(map(str, queued_job_ids)))
             return True, previous_job
 
     # Check if run was already finished:
     tmp_out_cnfs_regex = "_".join(tmp_out_cnf.split("_")[:-1]) + "*.cnf"
     if (verbose): print("Checking for resulting files: " + tmp_out_cnfs_regex)
 
-    if (len(glob.glob(tmp_out_cnfs_regex)) > 0):  # was this job already run and finished?
+    if (queue_snapshot is None):
+        out_cnfs = glob.glob(tmp_out_cnfs_regex)
+    else:
+        out_cnfs = queue_snapshot.glob_out_cnfs(tmp_out_cnfs_regex)
+    if (len(out_cnfs) > 0):  # was this job already run and finished?
         if (verbose): print(
             "\t\t NOT SUBMITTED!(inScript) as these Files were found: \n\t" + tmp_out_cnfs_regex)
         setattr(simSystem, "coord_seeds", tmp_out_cnf)  # set next coord Files
@@ -85,7 +200,7 @@ def chain_submission(gromosXX_bin_dir: str, in_imd_path: str, simSystem:Simulati
                      prefix_command: str = "", previous_job_ID: int = None, work_dir: str = None,
                      write_free_energy_traj: bool = False, 
                      initialize_first_run: bool = True, reinitialize: bool = False,
-                     memory: int = None, 
+                     memory: int = None, queue_snapshot: QueueSnapshot = None,
                      verbose: bool = False)->(int, str, Simulation_System):
     """
         This function takes care of submiting a given chain of jobs to the job queue.
@@ -137,6 +252,8 @@ def chain_submission(gromosXX_bin_dir: str, in_imd_path: str, simSystem:Simulati
         shall all runs, be initialized with gromos parameters (@Warning: not recommended)
     memory : int, optional
         how much memory to reserve for submission
+    queue_snapshot : QueueSnapshot, optional
+        snapshot of the queue and of the output files, shared by several chains (default None: taken once for this chain)
     verbose : bool
         verbosity level
 
@@ -149,6 +266,11 @@ def chain_submission(gromosXX_bin_dir: str, in_imd_path: str, simSystem:Simulati
     print("start_run_index " + str(start_run_index))
     print("job rep " + str(chain_job_repetitions))
 
+    # one query of the queue and one glob of the output files for all runs of the chain
+    if (queue_snapshot is None):
+        queue_snapshot = QueueSnapshot(job_submission_system=job_submission_system, out_dir_path=out_dir_path,
+                                       verbose=verbose)
+
     for run in range(start_run_index, chain_job_repetitions + 1):
 
         if (verbose): print(spacer + "\n submit  " + jobname + "_" + str(run) + "\n")
@@ -164,7 +286,7 @@ def chain_submission(gromosXX_bin_dir: str, in_imd_path: str, simSystem:Simulati
                                                job_submission_system=job_submission_system,
                                                previous_job=previous_job_ID,
                                                do_not_doubly_submit_to_queue=do_not_doubly_submit_to_queue,
-                                               verbose=verbose)
+                                               queue_snapshot=queue_snapshot, verbose=verbose)
             
         # Note: Prefix command sometimes contains important previous commands to run
         #       in the sopt for example. 
@@ -250,6 +372,7 @@ def chain_submission(gromosXX_bin_dir: str, in_imd_path: str, simSystem:Simulati
                                                                         end_mail=False,
                                                                         maxStorage = memory,
                                                                         verbose=verbose)
+                queue_snapshot.add_job(tmp_jobname, previous_job_ID)
 
                 # OPTIONAL schedule - analysis inbetween.
                 if (run > 1 and run_analysis_script_every_x_runs != 0 and
@@ -264,6 +387,7 @@ def chain_submission(gromosXX_bin_dir: str, in_imd_path: str, simSystem:Simulati
                                                                    outLog=outLog, errLog=errLog,
                                                                    maxStorage=20000, queue_after_jobID=previous_job_ID, nmpi=5,
                                                                    verbose=verbose)
+                    queue_snapshot.add_job(tmp_ana_jobname, ana_id)
                 if (verbose): print("\n")
             except ValueError as err:  # job already in the queue
                 print("ERROR during submission:\n")
@@ -36,17 +36,13 @@ def do(in_simulation_dir: str, n_processes: int = 1, verbose: bool = True) -> No
     
     if (len(tre_files + trc_files) == 0):
         raise IOError("Could not find any file in : " + in_simulation_dir)
-    
-    # Adjust to distribute properly (1 cpu per compression max).
-    # as this part of the code is now often called with more cpus 
-    # than files to compress
-    elif len(tre_files + trc_files) <  n_processes:
-        n_processes = len(tre_files + trc_files) 
 
     if (verbose): print("Found trcs: ", trc_files, "\n")
     if (verbose): print("Found tres: ", tre_files, "\n")
 
     if (verbose): print("COMPRESS START\n")
+    # the files are compressed one after the other, each block wise with n_processes threads,
+    # so all cpus are used even for a single large trajectory
     fM.compress_files(tre_files + trc_files, n_processes=n_processes)
 
     if (verbose): print("COMPRESS DONE\n")
@@ -0,0 +1,142 @@
+"""
+checkpointing of the OpenMM RE-EDS simulations
+
+the CheckpointPolicy decides when a checkpoint is due (every n steps, every t seconds of wall-clock time
+and/or at the end of the simulation). the AsyncCheckpointWriter writes the checkpoint data in a background
+thread, so that the replicas only wait for the (fast) download of the binary checkpoint from the device.
+files are written to a temporary name and renamed atomically, the last keep_last checkpoints are kept.
+"""
+
+import os
+import queue
+import threading
+import time
+
+class CheckpointPolicy:
+  """
+  defines when a RE-EDS simulation writes checkpoints
+
+  Parameters
+  ----------
+  every_n_steps: int
+    write a checkpoint every n MD steps (None to disable)
+  every_seconds: float
+    write a checkpoint every t seconds of wall-clock time (None to disable)
+  at_end: bool
+    write a checkpoint at the end of the simulation
+  keep_last: int
+    number of checkpoints per replica which are kept on disk
+  """
+  def __init__(self, every_n_steps = 10000, every_seconds = None, at_end = True, keep_last = 2):
+    if keep_last < 1:
+      raise ValueError(f"keep_last has to be at least 1 (got {keep_last})")
+    self.every_n_steps = every_n_steps
+    self.every_seconds = every_seconds
+    self.at_end = at_end
+    self.keep_last = keep_last
+    self.last_step = 0
+    self.last_time = time.time()
+
+  def is_due(self, step, now = None):
+    """
+    returns True if a checkpoint should be written at the given MD step
+    """
+    if now is None:
+      now = time.time()
+    if self.every_n_steps is not None and step // self.every_n_steps > self.last_step // self.every_n_steps:
+      return True
+    if self.every_seconds is not None and now - self.last_time >= self.every_seconds:
+      return True
+    return False
+
+  def is_due_at_end(self, step):
+    """
+    returns True if a checkpoint should be written at the end of a simulation of the given number of MD steps,
+    i.e. unless the last checkpoint during the simulation was already written at this step
+    """
+    return self.at_end and not (step > 0 and step == self.last_step)
+
+  def mark(self, step, now = None):
+    """
+    registers that a checkpoint was written at the given MD step
+    """
+    self.last_step = step
+    self.last_time = time.time() if now is None else now
+
+def rotate_files(filename, keep_last):
+  """
+  shifts filename -> filename.1 -> filename.2 ... (before the extension), keeping keep_last files in total
+  """
+  root, ext = os.path.splitext(filename)
+  names = [filename] + [f"{root}.{i}{ext}" for i in range(1, keep_last)]
+  if os.path.exists(f"{root}.{keep_last}{ext}"):
+    os.remove(f"{root}.{keep_last}{ext}")
+  for src, dst in reversed(list(zip(names[:-1], names[1:]))):
+    if os.path.exists(src):
+      os.replace(src, dst)
+
+def write_atomic(filename, data):
+  """
+  writes data (bytes or str) to a temporary file and renames it to filename
+  """
+  tmp_filename = f"{filename}.tmp"
+  with open(tmp_filename, "wb" if isinstance(data, bytes) else "w") as file:
+    file.write(data)
+    file.flush()
+    os.fsync(file.fileno())
+  os.replace(tmp_filename, filename)
+
+class AsyncCheckpointWriter:
+  """
+  writes checkpoint files in a background thread
+
+  Parameters
+  ----------
+  keep_last: int
+    number of rotated checkpoints kept per file name (1 -> the file is simply replaced)
+  """
+  def __init__(self, keep_last = 1):
+    self.keep_last = keep_last
+    self.queue = queue.Queue()
+    self.error = None
+    self.thread = threading.Thread(target = self._writer, daemon = True)
+    self.thread.start()
+
+  def submit(self, filename, data, rotate = True):
+    """
+    queue data (bytes or str) to be written to filename
+    """
+    if self.error is not None:
+      raise self.error
+    self.queue.put((filename, data, rotate))
+
+  def _writer(self):
+    while True:
+      item = self.queue.get()
+      try:
+        if item is None:
+          return
+        filename, data, rotate = item
+        if rotate and self.keep_last > 1:
+          write_atomic(f"{filename}.tmp_rotate", data)
+          rotate_files(filename, self.keep_last)
+          os.replace(f"{filename}.tmp_rotate", filename)
+        else:
+          write_atomic(filename, data)
+      except Exception as err:
+        self.error = err
+      finally:
+        self.queue.task_done()
+
+  def wait(self):
+    """
+    blocks until all queued checkpoints are written
+    """
+    self.queue.join()
+    if self.error is not None:
+      raise self.error
+
+  def close(self):
+    self.wait()
+    self.queue.put(None)
+    self.thread.join()
@@ -0,0 +1,159 @@
+"""
+assignment of the OpenMM platform and device to the ranks of a parallel RE-EDS simulation
+
+the DevicePolicy picks the platform explicitly (CUDA or OpenCL if devices are found, otherwise CPU) instead of
+relying on the default platform of OpenMM. the ranks of a node are spread evenly over the devices using the
+node-local rank of the MPI launcher (e.g. OMPI_COMM_WORLD_LOCAL_RANK, SLURM_LOCALID). on the CPU platform,
+the cores available to the ranks of a node are divided between them: every rank uses as many threads as it
+gets cores and is pinned to them, so that the OpenMM threads of the replicas do not oversubscribe the node.
+
+the assignment itself (assign_device) is a pure function of the node layout and can be tested without GPUs.
+"""
+
+import os
+
+# environment variables of the MPI launchers / resource managers with the node-local rank
+LOCAL_RANK_VARIABLES = ["OMPI_COMM_WORLD_LOCAL_RANK", "MV2_COMM_WORLD_LOCAL_RANK", "MPI_LOCALRANKID", "PMI_LOCAL_RANK", "SLURM_LOCALID"]
+
+class DeviceAssignment:
+  """
+  platform and platform properties of a rank, and the cores its threads are pinned to (None: no pinning)
+  """
+  def __init__(self, platform, properties, cpu_set = None):
+    self.platform = platform
+    self.properties = properties
+    self.cpu_set = cpu_set
+
+  def __repr__(self):
+    return f"DeviceAssignment(platform = {self.platform}, properties = {self.properties}, cpu_set = {self.cpu_set})"
+
+def get_local_rank(node_rank, environ = os.environ):
+  """
+  returns the node-local rank set by the MPI launcher, or node_rank if none is set
+  """
+  for variable in LOCAL_RANK_VARIABLES:
+    if variable in environ:
+      return int(environ[variable])
+  return node_rank
+
+def count_devices(platform, environ = os.environ):
+  """
+  returns the number of devices of the CUDA or OpenCL platform (0 if they cannot be determined)
+  """
+  if platform == "CUDA":
+    visible_devices = environ.get("CUDA_VISIBLE_DEVICES")
+    if visible_devices is not None:
+      return len([device for device in visible_devices.split(",") if device.strip()])
+    try:
+      from pycuda import driver
+      driver.init()
+      return driver.Device.count()
+    except Exception:
+      return 0
+  if platform == "OpenCL":
+    try:
+      import pyopencl
+      return sum(len(opencl_platform.get_devices()) for opencl_platform in pyopencl.get_platforms())
+    except Exception:
+      return 0
+  return 0
+
+def assign_device(local_rank, cores, core_rank, core_size, available_platforms, num_devices, platform = None, threads = None, pin_threads = True):
+  """
+  assigns a platform and device to a rank
+
+  Parameters
+  ----------
+  local_rank: int
+    node-local rank, used to spread the ranks over the devices of the node
+  cores: List[int]
+    cores available to the rank
+  core_rank, core_size: int
+    index of the rank among the ranks sharing the same cores, and their number
+  available_platforms: List[str]
+    names of the OpenMM platforms which can be used
+  num_devices: Dict[str, int]
+    number of devices per GPU platform ("CUDA", "OpenCL")
+  platform: str
+    platform to use (None: CUDA or OpenCL if devices are available, otherwise CPU)
+  threads: int
+    number of CPU threads (None: the shared cores are divided evenly between the ranks)
+  pin_threads: bool
+    pin the rank to its share of the cores (CPU platform)
+
+  Returns
+  -------
+  DeviceAssignment
+  """
+  if platform is None:
+    platform = next((name for name in ["CUDA", "OpenCL"] if name in available_platforms and num_devices.get(name, 0) > 0),
+                    "CPU" if "CPU" in available_platforms else "Reference")
+  elif platform not in available_platforms:
+    raise ValueError(f"platform {platform} is not available (available platforms: {', '.join(available_platforms)})")
+
+  if platform in ["CUDA", "OpenCL"]:
+    # more ranks than devices -> every device gets the same number of ranks (+- 1)
+    device_index = local_rank % max(num_devices.get(platform, 0), 1)
+    return DeviceAssignment(platform, {"DeviceIndex": str(device_index)})
+  if platform == "CPU":
+    cores = sorted(cores)
+    if threads is None:
+      threads = max(1, len(cores) // core_size)
+    cpu_set = None
+    if pin_threads and threads * core_size <= len(cores):
+      cpu_set = cores[core_rank * threads : (core_rank + 1) * threads]
+    return DeviceAssignment(platform, {"Threads": str(threads)}, cpu_set)
+  return DeviceAssignment(platform, {})
+
+class DevicePolicy:
+  """
+  defines how the ranks of a parallel RE-EDS simulation are assigned to platforms and devices
+
+  Parameters
+  ----------
+  platform: str
+    OpenMM platform ("CUDA", "OpenCL", "CPU", "Reference"), None: OPENMM_DEFAULT_PLATFORM or automatic choice
+  num_devices: int
+    number of devices of the GPU platform per node (None: determined with CUDA_VISIBLE_DEVICES, pycuda or pyopencl)
+  threads: int
+    number of CPU threads per rank (None: OPENMM_CPU_THREADS or the cores of the node divided by the ranks)
+  pin_threads: bool
+    pin every rank to its share of the cores (CPU platform)
+  """
+  def __init__(self, platform = None, num_devices = None, threads = None, pin_threads = True):
+    self.platform = platform
+    self.num_devices = num_devices
+    self.threads = threads
+    self.pin_threads = pin_threads
+
+  def assign(self, comm = None):
+    """
+    returns the DeviceAssignment of the current rank and pins it to its cores (collective call)
+    """
+    import openmm as mm
+
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count()))
+    node_rank, core_rank, core_size = 0, 0, 1
+    if comm is not None:
+      from mpi4py import MPI
+      node_comm = comm.Split_type(MPI.COMM_TYPE_SHARED)
+      node_rank = node_comm.Get_rank()
+      # ranks which were not bound to cores by the launcher share the cores of the node
+      node_cores = node_comm.allgather(cores)
+      node_comm.Free()
+      sharing_ranks = [rank for rank, other_cores in enumerate(node_cores) if other_cores == cores]
+      core_rank, core_size = sharing_ranks.index(node_rank), len(sharing_ranks)
+
+    available_platforms = [mm.Platform.getPlatform(i).getName() for i in range(mm.Platform.getNumPlatforms())]
+    platform = self.platform if self.platform is not None else os.environ.get("OPENMM_DEFAULT_PLATFORM")
+    threads = self.threads
+    if threads is None and "OPENMM_CPU_THREADS" in os.environ:
+      threads = int(os.environ["OPENMM_CPU_THREADS"])
+    num_devices = {name: self.num_devices if self.num_devices is not None else count_devices(name) for name in ["CUDA", "OpenCL"] if name in available_platforms}
+
+    assignment = assign_device(get_local_rank(node_rank), cores, core_rank, core_size, available_platforms, num_devices, platform, threads, self.pin_threads)
+    if assignment.cpu_set is not None and hasattr(os, "sched_setaffinity"):
+      os.sched_setaffinity(0, assignment.cpu_set)
+    if assignment.platform == "CUDA":
+      os.environ['CUDA_LAUNCH_BLOCKING'] = '0'
+    return assignment
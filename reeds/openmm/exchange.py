@@ -0,0 +1,164 @@
+"""
+replica exchange criteria for RE-EDS
+
+the functions in this file only work on the gathered end-state energies (Vi) of all replicas,
+they do not need OpenMM or MPI and can be tested and benchmarked on their own.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+from scipy.special import logsumexp
+
+exchange_result = namedtuple("exchange_result", ["pairs", "probabilities", "accepted", "replica_positions", "V_orig", "V_exch"])
+gibbs_result = namedtuple("gibbs_result", ["targets", "probabilities", "replica_positions", "V_orig", "V_exch"])
+
+def reference_energies(Vi, s_values, energy_offsets, beta):
+  """
+  calculates the reference state energy V_R of every configuration for every parameter set (s-value and energy offsets)
+
+  Parameters
+  ----------
+  Vi: np.array
+    end-state energies, shape (..., num_endstates)
+  s_values: np.array
+    s-values, shape (...,)
+  energy_offsets: np.array
+    energy offsets, shape (..., num_endstates)
+  beta: float
+    1/kT in mol/kJ
+
+  Returns
+  -------
+  np.array
+    V_R = -1/(beta*s) * log(sum_i exp(-beta*s*(V_i - E_i^R))), broadcast over the leading dimensions
+  """
+  Vi = np.asarray(Vi, dtype = float)
+  s_values = np.asarray(s_values, dtype = float)
+  energy_offsets = np.asarray(energy_offsets, dtype = float)
+  return -1/(beta * s_values) * logsumexp(-beta * s_values[..., None] * (Vi - energy_offsets), axis = -1)
+
+def metropolis_exchange(Vi, s_values, energy_offsets, replica_positions, begin, beta, rng = np.random):
+  """
+  evaluates the Metropolis criterion for all neighbouring pairs (begin, begin+1), (begin+2, begin+3), ... at once
+
+  Parameters
+  ----------
+  Vi: np.array
+    end-state energies of the replicas at every position (s-value index), shape (num_replicas, num_endstates)
+  s_values: np.array
+    current s-value of every replica, shape (num_replicas,)
+  energy_offsets: np.array
+    current energy offsets of every replica, shape (num_replicas, num_endstates)
+  replica_positions: List[int]
+    index of the replica at every position
+  begin: int
+    0 for the even pairs (0-1, 2-3, ...), 1 for the odd pairs (1-2, 3-4, ...)
+  beta: float
+    1/kT in mol/kJ
+  rng: np.random.Generator or np.random
+    random number generator
+
+  Returns
+  -------
+  exchange_result
+    pairs: first position of every pair, probabilities: exchange probabilities, accepted: accept mask,
+    replica_positions: new replica positions, V_orig/V_exch: reference energies of the two partners
+    with their own/exchanged parameters, shape (num_pairs, 2)
+  """
+  Vi = np.asarray(Vi, dtype = float)
+  s_values = np.asarray(s_values, dtype = float)
+  energy_offsets = np.asarray(energy_offsets, dtype = float)
+  replica_positions = np.asarray(replica_positions)
+
+  pairs = np.arange(begin, len(replica_positions) - 1, 2)
+  partners = np.stack([replica_positions[pairs], replica_positions[pairs + 1]], axis = 1) # (pairs, 2)
+
+  # V_R[k, a, b]: configuration of partner a of pair k with the parameters of partner b
+  V_pairs = np.stack([Vi[pairs], Vi[pairs + 1]], axis = 1)[:, :, None, :]
+  V_R = reference_energies(V_pairs, s_values[partners][:, None, :], energy_offsets[partners][:, None, :, :], beta)
+
+  V_orig = np.stack([V_R[:, 0, 0], V_R[:, 1, 1]], axis = 1)
+  V_exch = np.stack([V_R[:, 0, 1], V_R[:, 1, 0]], axis = 1)
+  delta = np.sum(V_exch, axis = 1) - np.sum(V_orig, axis = 1)
+  probabilities = np.exp(-beta * np.maximum(delta, 0))
+
+  accepted = probabilities > rng.uniform(0, 1, len(pairs))
+
+  new_positions = replica_positions.copy()
+  new_positions[pairs[accepted]] = partners[accepted, 1]
+  new_positions[pairs[accepted] + 1] = partners[accepted, 0]
+
+  return exchange_result(pairs.tolist(), probabilities, accepted, new_positions.tolist(), V_orig, V_exch)
+
+def gibbs_exchange(Vi, s_values, energy_offsets, replica_positions, beta, num_attempts = None, rng = np.random):
+  """
+  Gibbs sampling of the replica permutation by repeated Metropolis exchange attempts between random pairs of positions
+  (not only neighbours, see Chodera & Shirts, J. Chem. Phys. 135, 194110 (2011)).
+  for a large number of attempts this approaches independence sampling over all permutations.
+  the reference energies of every configuration with every parameter set are calculated once from Vi,
+  so the attempts do not need any additional energy evaluations.
+
+  Parameters
+  ----------
+  Vi: np.array
+    end-state energies of the replicas at every position (s-value index), shape (num_replicas, num_endstates)
+  s_values: np.array
+    current s-value of every replica, shape (num_replicas,)
+  energy_offsets: np.array
+    current energy offsets of every replica, shape (num_replicas, num_endstates)
+  replica_positions: List[int]
+    index of the replica at every position
+  beta: float
+    1/kT in mol/kJ
+  num_attempts: int
+    number of pair exchange attempts (default: num_replicas**2). the attempts are a scalar loop on rank 0 while the
+    other ranks wait, about 0.5 us each (num_replicas**3 attempts of 64 replicas take ~0.1 s per exchange)
+  rng: np.random.Generator or np.random
+    random number generator
+
+  Returns
+  -------
+  gibbs_result
+    targets: new position of the configuration at every position, probabilities: acceptance rate of the attempts
+    involving every position, replica_positions: new replica positions, V_orig/V_exch: reference energy of the
+    configuration at every position with its old/new parameters
+  """
+  Vi = np.asarray(Vi, dtype = float)
+  s_values = np.asarray(s_values, dtype = float)
+  energy_offsets = np.asarray(energy_offsets, dtype = float)
+  replica_positions = np.asarray(replica_positions)
+  num_replicas = len(replica_positions)
+  if num_attempts is None:
+    num_attempts = num_replicas**2
+
+  # V_R[a, m]: configuration at position a with the parameters at position m
+  V_R = reference_energies(Vi[:, None, :], s_values[replica_positions][None, :], energy_offsets[replica_positions][None, :, :], beta)
+
+  # draw all random numbers at once; a != b is ensured by shifting b
+  a_all = np.floor(rng.uniform(0, 1, num_attempts) * num_replicas).astype(int)
+  b_all = np.floor(rng.uniform(0, 1, num_attempts) * (num_replicas - 1)).astype(int)
+  b_all += b_all >= a_all
+  log_u_all = np.log(rng.uniform(0, 1, num_attempts))
+
+  # the attempts depend on each other -> scalar loop over python lists
+  U = (-beta * V_R).tolist()
+  targets = list(range(num_replicas))
+  num_tried = [0] * num_replicas
+  num_accepted = [0] * num_replicas
+  for a, b, log_u in zip(a_all.tolist(), b_all.tolist(), log_u_all.tolist()):
+    ta, tb = targets[a], targets[b]
+    num_tried[a] += 1
+    num_tried[b] += 1
+    if log_u < U[a][tb] + U[b][ta] - U[a][ta] - U[b][tb]:
+      targets[a], targets[b] = tb, ta
+      num_accepted[a] += 1
+      num_accepted[b] += 1
+
+  targets = np.array(targets, dtype = int)
+  new_positions = replica_positions.copy()
+  new_positions[targets] = replica_positions
+  probabilities = np.divide(num_accepted, num_tried, out = np.zeros(num_replicas), where = np.array(num_tried) > 0)
+  positions = np.arange(num_replicas)
+
+  return gibbs_result(targets.tolist(), probabilities, new_positions.tolist(), V_R[positions, positions], V_R[positions, targets])
@@ -0,0 +1,95 @@
+"""
+online free energy differences of the parallel OpenMM RE-EDS simulations
+
+rank 0 accumulates log(sum(exp(-beta * (V_i - V_R)))) of all end states at every s value with the energies
+gathered for the energy trajectories. the Zwanzig free energy differences
+dF_ij = -1/beta * ln(<exp(-beta * (V_j - V_R))>_R / <exp(-beta * (V_i - V_R))>_R) are therefore available at any
+time in O(states^2), without reading the energy trajectories and without overflow of the exponentials.
+the current free energy differences and their convergence are written as JSON file.
+"""
+
+import json
+import os
+
+import numpy as np
+
+class FreeEnergyAccumulator:
+  """
+  streaming log-sum-exp accumulators of all s values
+
+  Parameters
+  ----------
+  num_replicas: int
+    number of s values
+  num_endstates: int
+    number of end states
+  beta: float
+    1/kT in mol/kJ
+  filename: str
+    JSON file written by dump
+  every_n_steps: int
+    dump every n MD steps (None: only at the end of the simulation)
+  """
+  def __init__(self, num_replicas, num_endstates, beta, filename = None, every_n_steps = None):
+    self.num_endstates = num_endstates
+    self.beta = beta
+    self.filename = filename
+    self.every_n_steps = every_n_steps
+    self.log_sum_exp = np.full((num_replicas, num_endstates), -np.inf)
+    self.num_frames = np.zeros(num_replicas, dtype = np.int64)
+    self.convergence = []
+    self.last_step = 0
+
+  def update(self, s_index, Vi, V_R):
+    """
+    add the energies of one frame of the s value with index s_index
+    """
+    self.log_sum_exp[s_index] = np.logaddexp(self.log_sum_exp[s_index], -self.beta * (np.asarray(Vi, dtype = np.float64) - V_R))
+    self.num_frames[s_index] += 1
+
+  def free_energy_differences(self, s_index):
+    """
+    returns the matrix dF_ij = F_j - F_i (kJ/mol) of the s value with index s_index (nan without frames)
+    """
+    if self.num_frames[s_index] == 0:
+      return np.full((self.num_endstates, self.num_endstates), np.nan)
+    lse = self.log_sum_exp[s_index]
+    return -1/self.beta * (lse[None, :] - lse[:, None])
+
+  def pair_differences(self, s_index):
+    """
+    returns dF_ij of all end-state pairs i < j, in the order (1,2), (1,3), ..., (2,3), ...
+    """
+    dF = self.free_energy_differences(s_index)
+    return [dF[i, j] for i in range(self.num_endstates) for j in range(i+1, self.num_endstates)]
+
+  def is_due(self, step):
+    """
+    returns True if the free energies should be dumped at the given MD step
+    """
+    return self.every_n_steps is not None and step // self.every_n_steps > self.last_step // self.every_n_steps
+
+  def dump(self, step, sim_time):
+    """
+    adds the current free energy differences to the convergence and writes the JSON file
+    """
+    self.last_step = step
+    pairs = [f"{i+1}_{j+1}" for i in range(self.num_endstates) for j in range(i+1, self.num_endstates)]
+    current = [[None if np.isnan(dF) else float(dF) for dF in self.pair_differences(s_index)] for s_index in range(len(self.num_frames))]
+    self.convergence.append({"step": step, "time": sim_time, "num_frames": self.num_frames.tolist(), "dF": current})
+    if self.filename is None:
+      return
+
+    record = {
+      "step": step,
+      "time": sim_time,
+      "beta": self.beta,
+      "pairs": pairs,
+      "num_frames": self.num_frames.tolist(),
+      "dF": current,
+      "convergence": self.convergence,
+    }
+    # atomic replace, a reader never sees a partial file
+    with open(self.filename + ".tmp", "w") as file:
+      json.dump(record, file)
+    os.replace(self.filename + ".tmp", self.filename)
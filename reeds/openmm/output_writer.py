@@ -0,0 +1,183 @@
+"""
+buffered, asynchronous output of the RE-EDS energy trajectories and repdat files
+
+records are appended into preallocated numpy buffers on the calling (MPI rank 0) thread.
+full buffers are handed to a background thread which does all the string formatting and file I/O,
+so that the exchange step, which all other ranks wait on, only copies a few floats.
+"""
+
+import json
+import queue
+import threading
+
+import numpy as np
+import pandas as pd
+
+class OutputStream:
+  """
+  a single output file (e.g. one energy trajectory) with its own pool of preallocated record buffers
+  """
+  def __init__(self, filename, columns, row_format, header = None, output_format = "text", buffer_size = 1000, num_buffers = 4):
+    self.columns = list(columns)
+    self.row_format = row_format
+    self.output_format = output_format
+    self.buffer_size = buffer_size
+
+    if output_format == "text":
+      self.filename = filename
+      self.file = open(self.filename, "w")
+      if header is not None:
+        self.file.write(header)
+    elif output_format == "binary":
+      self.filename = filename + ".bin"
+      self.file = open(self.filename, "wb")
+      self.file.write((json.dumps({"columns": self.columns, "dtype": "float64"}) + "\n").encode())
+    else:
+      raise ValueError(f"unknown output format {output_format} (use 'text' or 'binary')")
+
+    # ring of preallocated buffers, recycled by the writer thread once written
+    self.free_buffers = queue.Queue()
+    for _ in range(num_buffers):
+      self.free_buffers.put(np.zeros((buffer_size, len(self.columns))))
+    self.buffer = self.free_buffers.get()
+    self.num_records = 0
+
+  def write_records(self, records):
+    """
+    write a block of records to the file (called from the writer thread)
+    """
+    if self.output_format == "text":
+      self.file.write("".join([self.row_format.format(*row) for row in records]))
+    else:
+      # columnar chunk: number of records followed by each column contiguously
+      self.file.write(np.array([len(records)], dtype = np.int64).tobytes())
+      self.file.write(np.ascontiguousarray(records.T).tobytes())
+
+class AsyncOutputWriter:
+  """
+  collects records of several output streams and writes them in a background thread
+
+  Parameters
+  ----------
+  output_format: str
+    'text' writes the usual whitespace separated layout, 'binary' writes a columnar float64 format
+    which can be read with read_binary_output
+  buffer_size: int
+    number of records per buffer, i.e. per write of the background thread
+  num_buffers: int
+    number of preallocated buffers per stream. if all of them are waiting to be written, append blocks.
+  """
+  def __init__(self, output_format = "text", buffer_size = 1000, num_buffers = 4):
+    self.output_format = output_format
+    self.buffer_size = buffer_size
+    self.num_buffers = num_buffers
+    self.streams = {}
+
+    self.queue = queue.Queue()
+    self.error = None
+    self.thread = threading.Thread(target = self._writer, daemon = True)
+    self.thread.start()
+
+  def add_stream(self, key, filename, columns, row_format, header = None):
+    """
+    register a new output file
+
+    Parameters
+    ----------
+    key: hashable
+      key used in append to address this stream
+    filename: str
+      name of the output file ('.bin' is appended for binary output)
+    columns: List[str]
+      column names
+    row_format: str
+      format string of one text line, e.g. "{:<14.4f} {:<15.10f}\\n"
+    header: str
+      header written at the top of text files
+    """
+    self.streams[key] = OutputStream(filename, columns, row_format, header, self.output_format, self.buffer_size, self.num_buffers)
+    return self.streams[key].filename
+
+  def append(self, key, record):
+    """
+    append one record (sequence of numbers) to the stream with the given key
+    """
+    stream = self.streams[key]
+    stream.buffer[stream.num_records] = record
+    stream.num_records += 1
+    if stream.num_records == stream.buffer_size:
+      self._submit(stream)
+
+  def _submit(self, stream):
+    if self.error is not None:
+      raise self.error
+    if stream.num_records:
+      self.queue.put((stream, stream.buffer, stream.num_records))
+      stream.buffer = stream.free_buffers.get()
+      stream.num_records = 0
+
+  def _writer(self):
+    while True:
+      item = self.queue.get()
+      try:
+        if item is None:
+          return
+        stream, buffer, num_records = item
+        if num_records is None:
+          stream.file.flush()
+        else:
+          try:
+            stream.write_records(buffer[:num_records])
+          finally:
+            stream.free_buffers.put(buffer)
+      except Exception as err:
+        self.error = err
+      finally:
+        self.queue.task_done()
+
+  def flush(self):
+    """
+    hand all partially filled buffers to the writer thread and wait until everything is on disk
+    """
+    for stream in self.streams.values():
+      self._submit(stream)
+      self.queue.put((stream, None, None))
+    self.queue.join()
+    if self.error is not None:
+      raise self.error
+
+  def close(self):
+    self.flush()
+    self.queue.put(None)
+    self.thread.join()
+    for stream in self.streams.values():
+      stream.file.close()
+
+def read_binary_output(filename):
+  """
+  reads a file written by AsyncOutputWriter with output_format = 'binary'
+
+  Parameters
+  ----------
+  filename: str
+    path to the binary output file
+
+  Returns
+  -------
+  pd.DataFrame
+    one column per recorded quantity
+  """
+  with open(filename, "rb") as file:
+    header = json.loads(file.readline().decode())
+    num_columns = len(header["columns"])
+    chunks = []
+    while True:
+      num_records = file.read(8)
+      if len(num_records) < 8:
+        break
+      num_records = int(np.frombuffer(num_records, dtype = np.int64)[0])
+      chunk = np.frombuffer(file.read(8 * num_records * num_columns), dtype = np.float64)
+      chunks.append(chunk.reshape(num_columns, num_records).T)
+
+  data = np.concatenate(chunks) if len(chunks) else np.zeros((0, num_columns))
+  return pd.DataFrame(data, columns = header["columns"])
@@ -0,0 +1,199 @@
+"""
+bulk construction of the custom reaction field forces of the OpenMM RE-EDS engines
+
+the particle and exception parameters of the original NonbondedForce are read once into numpy arrays
+and shared by all end states and the environment. the pair lists and per-pair parameters of the
+third neighbor, excluded neighbor and self terms are then selected with boolean masks, instead of
+looking up every exception and particle again for every end state.
+the per end-state parameters of hybrid topologies (ptp files) are tabulated the same way in PerturbedParameters.
+"""
+
+import numpy as np
+from openmm import unit as u
+
+class NonbondedParameters:
+  """
+  particle and exception parameters of a NonbondedForce (charges in e, sigmas in nm, epsilons in kJ/mol)
+
+  Parameters
+  ----------
+  nonbonded_force: mm.NonbondedForce
+    original nonbonded force of the system
+  """
+  def __init__(self, nonbonded_force):
+    num_particles = nonbonded_force.getNumParticles()
+    self.charges = np.zeros(num_particles)
+    self.sigmas = np.zeros(num_particles)
+    self.epsilons = np.zeros(num_particles)
+    for index in range(num_particles):
+      charge, sigma, epsilon = nonbonded_force.getParticleParameters(index)
+      self.charges[index] = charge.value_in_unit(u.elementary_charge)
+      self.sigmas[index] = sigma.value_in_unit(u.nanometer)
+      self.epsilons[index] = epsilon.value_in_unit(u.kilojoule_per_mole)
+
+    num_exceptions = nonbonded_force.getNumExceptions()
+    self.exception_pairs = np.zeros((num_exceptions, 2), dtype = int)
+    self.exception_chargeprods = np.zeros(num_exceptions)
+    self.exception_sigmas = np.zeros(num_exceptions)
+    self.exception_epsilons = np.zeros(num_exceptions)
+    for index in range(num_exceptions):
+      j, k, chargeprod, sigma, epsilon = nonbonded_force.getExceptionParameters(index)
+      self.exception_pairs[index] = j, k
+      self.exception_chargeprods[index] = chargeprod.value_in_unit(u.elementary_charge**2)
+      self.exception_sigmas[index] = sigma.value_in_unit(u.nanometer)
+      self.exception_epsilons[index] = epsilon.value_in_unit(u.kilojoule_per_mole)
+
+    # plain python lists, as they are passed to OpenMM for every end state
+    self.particle_parameters = np.stack([self.charges, self.sigmas, self.epsilons], axis = 1).tolist()
+    self.exclusions = self.exception_pairs.tolist()
+
+  def exception_mask(self, particles):
+    """
+    returns a mask of all exceptions with both particles in particles
+    """
+    is_active = np.zeros(len(self.charges), dtype = bool)
+    is_active[np.asarray(particles, dtype = int)] = True
+    return is_active[self.exception_pairs[:, 0]] & is_active[self.exception_pairs[:, 1]]
+
+  def one_four_bonds(self, particles):
+    """
+    returns the third neighbor pairs within particles and their parameters [chargeprod, sigma, epsilon, charge1*charge2]
+    """
+    mask = self.exception_mask(particles) & ((self.exception_chargeprods != 0) | (self.exception_epsilons != 0))
+    pairs = self.exception_pairs[mask]
+    parameters = np.stack([self.exception_chargeprods[mask],
+                           self.exception_sigmas[mask],
+                           self.exception_epsilons[mask],
+                           self.charges[pairs[:, 0]] * self.charges[pairs[:, 1]]], axis = 1)
+    return pairs.tolist(), parameters.tolist()
+
+  def excluded_bonds(self, particles):
+    """
+    returns the excluded neighbor pairs within particles and their parameters [charge1*charge2]
+    """
+    mask = self.exception_mask(particles) & (self.exception_chargeprods == 0)
+    pairs = self.exception_pairs[mask]
+    parameters = (self.charges[pairs[:, 0]] * self.charges[pairs[:, 1]])[:, None]
+    return pairs.tolist(), parameters.tolist()
+
+  def self_term_bonds(self, particles):
+    """
+    returns the self interaction pairs (i, i) of particles and their parameters [charge*charge]
+    """
+    particles = np.asarray(particles, dtype = int)
+    pairs = np.stack([particles, particles], axis = 1)
+    parameters = (self.charges[particles]**2)[:, None]
+    return pairs.tolist(), parameters.tolist()
+
+def add_particles(force, parameters):
+  """
+  adds particles with the given per particle parameters to a CustomNonbondedForce
+  """
+  for particle_parameters in parameters:
+    force.addParticle(particle_parameters)
+
+def add_exclusions(force, pairs):
+  """
+  adds exclusions for all pairs to a CustomNonbondedForce
+  """
+  for j, k in pairs:
+    force.addExclusion(j, k)
+
+def add_bonds(force, pairs, parameters):
+  """
+  adds bonds for all pairs with the given per bond parameters to a CustomBondForce
+  """
+  for (j, k), bond_parameters in zip(pairs, parameters):
+    force.addBond(j, k, bond_parameters)
+
+def amber_parameters(parameters):
+  """
+  converts [charge, A, B] in amber units (charge*18.2223, Lennard-Jones coefficients A = 4*epsilon*sigma^12 and B = 4*epsilon*sigma^6)
+  to charges in e, sigmas in nm and epsilons in kJ/mol. particles without Lennard-Jones interaction get sigma = epsilon = 0
+
+  Parameters
+  ----------
+  parameters: np.array
+    shape (..., 3)
+
+  Returns
+  -------
+  charges, sigmas, epsilons: np.array
+    shape (...)
+  """
+  parameters = np.asarray(parameters, dtype = float)
+  charges = parameters[..., 0] / 18.2223
+  a = parameters[..., 1]
+  b = parameters[..., 2]
+  has_lj = (a != 0) & (b != 0)
+  sigmas = np.zeros(a.shape)
+  epsilons = np.zeros(a.shape)
+  sigmas[has_lj] = (a[has_lj] / b[has_lj])**(1/6) * 0.1
+  epsilons[has_lj] = b[has_lj]**2 / (4 * a[has_lj]) * 4.184
+  return charges, sigmas, epsilons
+
+class PerturbedParameters:
+  """
+  per end-state particle parameters of a hybrid topology (ptp file), shape (num_particles, num_endstates).
+  particles which are not perturbed keep the parameters of the original NonbondedForce in all end states.
+
+  Parameters
+  ----------
+  nonbonded_parameters: NonbondedParameters
+    parameters of the original nonbonded force
+  perturbed_particles: dict
+    {particle index: [[charge, A, B] of every end state]} in amber units
+  num_endstates: int
+    number of end states
+  """
+  def __init__(self, nonbonded_parameters, perturbed_particles, num_endstates):
+    self.nonbonded_parameters = nonbonded_parameters
+    self.num_endstates = num_endstates
+    self.perturbed_particles = np.array(sorted(perturbed_particles), dtype = int)
+
+    self.charges = np.repeat(nonbonded_parameters.charges[:, None], num_endstates, axis = 1)
+    self.sigmas = np.repeat(nonbonded_parameters.sigmas[:, None], num_endstates, axis = 1)
+    self.epsilons = np.repeat(nonbonded_parameters.epsilons[:, None], num_endstates, axis = 1)
+    if len(self.perturbed_particles):
+      state_parameters = np.array([np.asarray(perturbed_particles[p], dtype = float)[:num_endstates] for p in self.perturbed_particles])
+      charges, sigmas, epsilons = amber_parameters(state_parameters)
+      self.charges[self.perturbed_particles] = charges
+      self.sigmas[self.perturbed_particles] = sigmas
+      self.epsilons[self.perturbed_particles] = epsilons
+
+  def particle_parameters(self):
+    """
+    returns the per particle parameters [charge_0, sigma_0, epsilon_0, charge_1, ...] of all particles
+    """
+    return np.stack([self.charges, self.sigmas, self.epsilons], axis = 2).reshape(len(self.charges), -1).tolist()
+
+  def one_four_bonds(self):
+    """
+    returns the third neighbor pairs within the perturbed particles and their parameters
+    [chargeprod_0, sigma_0, epsilon_0, charge1*charge2_0, chargeprod_1, ...] (chargeprod and epsilon scaled with 1/1.2 and 1/2)
+    """
+    nonbonded_parameters = self.nonbonded_parameters
+    mask = nonbonded_parameters.exception_mask(self.perturbed_particles) & ((nonbonded_parameters.exception_chargeprods != 0) | (nonbonded_parameters.exception_epsilons != 0))
+    j, k = nonbonded_parameters.exception_pairs[mask].T
+    chargeprods = self.charges[j] * self.charges[k]
+    parameters = np.stack([chargeprods / 1.2,
+                           0.5 * (self.sigmas[j] + self.sigmas[k]),
+                           np.sqrt(self.epsilons[j] * self.epsilons[k]) * 0.5,
+                           chargeprods], axis = 2)
+    return np.stack([j, k], axis = 1).tolist(), parameters.reshape(len(j), -1).tolist()
+
+  def excluded_bonds(self):
+    """
+    returns the excluded neighbor pairs within the perturbed particles and their parameters [charge1*charge2_0, charge1*charge2_1, ...]
+    """
+    nonbonded_parameters = self.nonbonded_parameters
+    mask = nonbonded_parameters.exception_mask(self.perturbed_particles) & (nonbonded_parameters.exception_chargeprods == 0)
+    j, k = nonbonded_parameters.exception_pairs[mask].T
+    return np.stack([j, k], axis = 1).tolist(), (self.charges[j] * self.charges[k]).tolist()
+
+  def self_term_bonds(self):
+    """
+    returns the self interaction pairs (i, i) of the perturbed particles and their parameters [charge_0*charge_0, charge_1*charge_1, ...]
+    """
+    particles = self.perturbed_particles
+    return np.stack([particles, particles], axis = 1).tolist(), (self.charges[particles]**2).tolist()
@@ -12,6 +12,8 @@ import pandas as pd
 
 from scipy.special import logsumexp
 
+from reeds.openmm.reaction_field import NonbondedParameters, add_particles, add_exclusions, add_bonds
+
 class ReedsSimulationVariables:
   """
   define the simulation variables for a RE-EDS simulation such as temperature, pressure etc.
@@ -27,7 +29,8 @@ class ReedsSimulationVariables:
                      distance_restraints_start_at_1 = True,
                      num_steps_between_exchanges = 20, 
                      total_steps = 250000,
-                     initial_time = 0):
+                     initial_time = 0,
+                     context_per_replica = True):
                      
     self.kb = (u.BOLTZMANN_CONSTANT_kB*u.AVOGADRO_CONSTANT_NA)
     self.temperature = temperature
@@ -42,6 +45,7 @@ class ReedsSimulationVariables:
     self.num_steps_between_exchanges = num_steps_between_exchanges
     self.total_steps = total_steps
     self.initial_time = initial_time
+    self.context_per_replica = context_per_replica
     
 class ReedsInputFiles:
   """
@@ -126,6 +130,9 @@ class Reeds:
     default_nonbonded_force.setReactionFieldDielectric(reeds_simulation_variables.eps_reaction_field)
     default_nonbonded_force.setCutoffDistance(reeds_simulation_variables.cutoff)
 
+    # read the nonbonded parameters once, they are shared by all end states and the environment
+    nonbonded_parameters = NonbondedParameters(default_nonbonded_force)
+
     # assumption: end-state molecules are listed consecutively at beginning of the topology, all non end-state particles are environment
     environment_particles = []
     for mol in self.simulations.context.getMolecules()[self.num_endstates:]:
@@ -136,7 +143,7 @@ class Reeds:
     # custom forces for energy
     for i, active_particles in enumerate(active_particles_):
 
-        a, b, c, d = (self.custom_reaction_field(i, default_nonbonded_force, active_particles, environment_particles, False))
+        a, b, c, d = (self.custom_reaction_field(i, default_nonbonded_force, active_particles, environment_particles, False, nonbonded_parameters = nonbonded_parameters))
 
         a.setName("lj_rf_endstate_" + str(i+1))
         b.setName("lj_rf_endstate_" + str(i+1) + "_one_four")
@@ -164,7 +171,7 @@ class Reeds:
     for i, active_particles in enumerate(active_particles_):
 
         if(active_particles != environment_particles):
-          a, b, c, d = (self.custom_reaction_field(i, default_nonbonded_force, active_particles, environment_particles, True))
+          a, b, c, d = (self.custom_reaction_field(i, default_nonbonded_force, active_particles, environment_particles, True, nonbonded_parameters = nonbonded_parameters))
           a.setName("lj_rf_endstate_" + str(i+1))
           b.setName("lj_rf_endstate_" + str(i+1) + "_one_four")
           c.setName("rf_endstate_" + str(i+1) + "_excluded")
@@ -174,7 +181,7 @@ class Reeds:
           c.setForceGroup(i+1+self.num_endstates)
           d.setForceGroup(i+1+self.num_endstates)
         else:
-          a, b, c, d = (self.custom_reaction_field(i, default_nonbonded_force, active_particles, environment_particles, False))
+          a, b, c, d = (self.custom_reaction_field(i, default_nonbonded_force, active_particles, environment_particles, False, nonbonded_parameters = nonbonded_parameters))
           a.setName("lj_rf_environment_environment")
           b.setName("lj_rf_environment_environment_one_four")
           c.setName("rf_environment_environment_excluded")
@@ -223,6 +230,29 @@ class Reeds:
             self.simulations.loadState(reeds_input_files.state_files[i])
             self.states[i] = self.simulations.context.getState(getPositions=True, getVelocities=True)
 
+    # replica contexts: by default every replica is propagated in its own context, so that no states are transferred
+    # between the replicas. with context_per_replica = False, all replicas share one context (less memory) and only
+    # the positions, velocities and box vectors of the inactive replicas are cached as numpy arrays
+    self.context_per_replica = reeds_simulation_variables.context_per_replica
+    if self.context_per_replica:
+      platform = self.simulations.context.getPlatform()
+      self.contexts = [self.simulations.context]
+      self.replica_integrators = [self.integrators]
+      for i in range(1, self.num_replicas):
+        self.replica_integrators.append(deepcopy(self.integrators))
+        self.contexts.append(mm.Context(self.simulations.system, self.replica_integrators[-1], platform))
+      for context, state in zip(self.contexts, self.states):
+        context.setState(state)
+    else:
+      self.contexts = [self.simulations.context] * self.num_replicas
+      self.replica_integrators = [self.integrators] * self.num_replicas
+      self.states = [(state.getPositions(asNumpy=True), state.getVelocities(asNumpy=True), state.getPeriodicBoxVectors()) for state in self.states]
+    self.active_replica = None
+
+    # end-state energies of the current configuration of every replica, keyed by replica.
+    # an entry is removed as soon as the positions of the replica change
+    self.energy_cache = {}
+
     #self.simulations.reporters.append(app.PDBReporter("out_" + self.system_name + ".pdb", 10000, enforcePeriodicBox = True))
     #self.simulations.reporters.append(app.StateDataReporter(sys.stdout, 1000, step=True,
     #        potentialEnergy=True, temperature=True, kineticEnergy = True))
@@ -262,7 +292,7 @@ class Reeds:
       self.repdat_gromos.write("Vr" + str(i+1) + "\t")
     self.repdat_gromos.write("\n")
 
-  def custom_reaction_field(self, end_state, original_nonbonded_force, active_particles, environment_particles, use_scaling_factor):
+  def custom_reaction_field(self, end_state, original_nonbonded_force, active_particles, environment_particles, use_scaling_factor, nonbonded_parameters = None):
     """
     defines a reaction field with a shifting function (see A. Kubincova et al, Phys. Chem. Chem. Phys. 2020, 22)
 
@@ -276,6 +306,8 @@ class Reeds:
       list of particle indices of current particles (either all particles of current end-state or all environment particles)
     environment_particles: List
       list of environment particles
+    nonbonded_parameters: NonbondedParameters
+      parameters of the original nonbonded force (read from original_nonbonded_force if None)
 
     Returns
     -------
@@ -288,6 +320,9 @@ class Reeds:
     force_self_term: mm.CustomBondForce
       reaction field force for self term
     """
+    if nonbonded_parameters is None:
+      nonbonded_parameters = NonbondedParameters(original_nonbonded_force)
+
     # define parameters
     scal = 'scaling_' + str(end_state)
     cutoff = original_nonbonded_force.getCutoffDistance()
@@ -339,14 +374,10 @@ class Reeds:
     force_lj_crf.setUseLongRangeCorrection(False)
 
     # copy per particle parameters from original nonbonded force
-    for index in range(original_nonbonded_force.getNumParticles()):
-      charge, sigma, epsilon = original_nonbonded_force.getParticleParameters(index)
-      force_lj_crf.addParticle([charge, sigma, epsilon])
+    add_particles(force_lj_crf, nonbonded_parameters.particle_parameters)
         
     # copy exceptions from original nonbonded force
-    for index in range(original_nonbonded_force.getNumExceptions()):
-      j, k, chargeprod, sigma, epsilon = original_nonbonded_force.getExceptionParameters(index)
-      force_lj_crf.addExclusion(j, k)
+    add_exclusions(force_lj_crf, nonbonded_parameters.exclusions)
 
     # set interaction groups -> end-state with itself and end-state with environment (or only environment with environment)
     force_lj_crf.addInteractionGroup(active_particles, environment_particles)
@@ -382,13 +413,7 @@ class Reeds:
     #force_lj_crf_one_four.setUsesPeriodicBoundaryConditions(True)
 
     # copy third neighbors from original nonbonded force
-    for index in range(original_nonbonded_force.getNumExceptions()):
-      j, k, chargeprod, sigma, epsilon = original_nonbonded_force.getExceptionParameters(index)
-  
-      if j in active_particles and k in active_particles and (chargeprod._value != 0 or epsilon._value != 0 ):
-        ch1, _, _ = original_nonbonded_force.getParticleParameters(j)
-        ch2, _, _ = original_nonbonded_force.getParticleParameters(k)
-        force_lj_crf_one_four.addBond(j, k, [chargeprod, sigma, epsilon, ch1*ch2])
+    add_bonds(force_lj_crf_one_four, *nonbonded_parameters.one_four_bonds(active_particles))
 
     #
     # excluded neighbors reaction field
@@ -412,12 +437,7 @@ class Reeds:
     #force_crf_excluded.setUsesPeriodicBoundaryConditions(True)
 
     # copy excluded neighbors from reaction field
-    for index in range(original_nonbonded_force.getNumExceptions()):
-      j, k, chargeprod, sigma, epsilon = original_nonbonded_force.getExceptionParameters(index)
-      if j in active_particles and k in active_particles and (chargeprod._value == 0):
-        ch1, _, _ = original_nonbonded_force.getParticleParameters(j)
-        ch2, _, _ = original_nonbonded_force.getParticleParameters(k)
-        force_crf_excluded.addBond(j, k, [ch1*ch2])
+    add_bonds(force_crf_excluded, *nonbonded_parameters.excluded_bonds(active_particles))
 
     #
     # self term
@@ -435,9 +455,7 @@ class Reeds:
     #force_crf_self_term.setUsesPeriodicBoundaryConditions(True)
 
     # add self interaction of all current end-state/environment particles
-    for i in active_particles:
-      ch1, _, _ = original_nonbonded_force.getParticleParameters(i)
-      force_crf_self_term.addBond(i, i, [ch1*ch1])
+    add_bonds(force_crf_self_term, *nonbonded_parameters.self_term_bonds(active_particles))
 
     return force_lj_crf, force_lj_crf_one_four, force_crf_excluded, force_crf_self_term
 
@@ -460,21 +478,58 @@ class Reeds:
 
     return sum_prefactors, prefactors
 
+  def replica_context(self, replica):
+    """
+    returns the context of replica. if all replicas share one context, the positions, velocities and box vectors
+    of the previously active replica are cached and the ones of replica are set
+    """
+    context = self.contexts[replica]
+    if self.context_per_replica or self.active_replica == replica:
+      return context
+
+    if self.active_replica is not None:
+      state = context.getState(getPositions=True, getVelocities=True)
+      self.states[self.active_replica] = (state.getPositions(asNumpy=True), state.getVelocities(asNumpy=True), state.getPeriodicBoxVectors())
+    positions, velocities, box_vectors = self.states[replica]
+    context.setPeriodicBoxVectors(*box_vectors)
+    context.setPositions(positions)
+    context.setVelocities(velocities)
+    self.active_replica = replica
+    return context
+
+  def save_state(self, replica, filename):
+    """
+    writes the state of replica to filename (same format as app.Simulation.saveState)
+    """
+    state = self.replica_context(replica).getState(getPositions=True, getVelocities=True, getParameters=True)
+    with open(filename, "w") as file:
+      file.write(mm.XmlSerializer.serialize(state))
+
+  def end_state_energies(self, replica):
+    """
+    returns the end-state energies (force groups 1, ..., num_endstates) of the current configuration of replica.
+    they are only evaluated if the positions of the replica changed since the last call
+    """
+    if replica not in self.energy_cache:
+      context = self.replica_context(replica)
+      self.energy_cache[replica] = np.array([context.getState(getEnergy=True, groups=1<<i+1).getPotentialEnergy().value_in_unit(u.kilojoules_per_mole) for i in range(self.num_endstates)])
+    return self.energy_cache[replica]
+
   def reference_state(self, pos):
     """
     calculates V_R of replica at with s-value at index pos
     """
-    Vi = np.array([self.simulations.context.getState(getEnergy=True, groups=1<<i+1).getPotentialEnergy().value_in_unit(u.kilojoules_per_mole) for i in range(self.num_endstates)])
     s = self.s_values[pos]
-    V_R = - 1/(self.beta * s) * logsumexp(-self.beta * s * (Vi - self.energy_offsets))
+    V_R = - 1/(self.beta * s) * logsumexp(-self.beta * s * (self.end_state_energies(pos) - self.energy_offsets))
           
     return V_R 
 
-  def get_scaling(self, s):
+  def get_scaling(self, replica):
     """
-    calculates scaling factors for the end-state energies/forces
+    calculates scaling factors for the end-state energies/forces of replica
     """
-    Vi = [self.simulations.context.getState(getEnergy=True, groups=1<<i+1).getPotentialEnergy().value_in_unit(u.kilojoules_per_mole) for i in range(self.num_endstates)]
+    s = self.s_values[replica]
+    Vi = self.end_state_energies(replica)
     terms = np.exp(-self.beta * s * (Vi - self.energy_offsets))
     scaling_factors = terms / np.sum(terms)
     
@@ -487,12 +542,8 @@ class Reeds:
     V_orig = np.array([0.,0.])
     V_exch = np.array([0.,0.])
     for i, p in enumerate(partners):
-      self.simulations.context.setState(self.states[p])
-      
-      #for j in range(self.num_endstates):
-      #  self.simulations.context.setParameter('scaling_' + str(j), 1)
-      
-      Vi = [self.simulations.context.getState(getEnergy=True, groups=1<<j+1).getPotentialEnergy().value_in_unit(u.kilojoules_per_mole) for j in range(self.num_endstates)]
+      # cached end-state energies, the configurations did not change since the propagation
+      Vi = self.end_state_energies(p)
       
       # calculate reference state with original s value
       s = self.s_values[p]
@@ -525,6 +576,7 @@ class Reeds:
     time = self.initial_time
     step_size = self.integrators.getStepSize()._value
     run = 1
+    scaling_parameters = ['scaling_' + str(j) for j in range(self.num_endstates)]
 
     for total_steps in range(0,self.reeds_simulation_variables.total_steps, self.reeds_simulation_variables.num_steps_between_exchanges):
       # print time every 1000th step
@@ -532,36 +584,32 @@ class Reeds:
         print("time ", "{:.4f}".format(time))
         sys.stdout.flush()
 
-      for idx, state in enumerate(self.states):
-        # propagate replica at position idx
-        self.simulations.context.setState(state)
+      for idx in range(self.num_replicas):
+        # propagate replica idx
+        context = self.replica_context(idx)
+        integrator = self.replica_integrators[idx]
         for step in range(self.reeds_simulation_variables.num_steps_between_exchanges):
           # calculate scaling factors for forces
-          #for i in range(self.num_endstates):
-          #  self.simulations.context.setParameter('scaling_' + str(i), 1)
+          scal = self.get_scaling(idx)
 
-          scal = self.get_scaling(self.s_values[idx])        
-
-          for j in range(self.num_endstates):
-            self.simulations.context.setParameter('scaling_' + str(j), scal[j])
+          for name, scaling in zip(scaling_parameters, scal):
+            context.setParameter(name, scaling)
 
-          # perform a simulation step
-          self.simulations.step(1)
+          # perform a simulation step, the end-state energies have to be evaluated again afterwards
+          integrator.step(1)
+          del self.energy_cache[idx]
 
-        # store state of current replica
-        self.states[idx] = self.simulations.context.getState(getPositions=True, getVelocities=True)
+        # evaluate the end-state energies for the output and the exchanges while the replica is in the context
+        self.end_state_energies(idx)
 
       # print output to energy trajectories
       time += step_size * self.reeds_simulation_variables.num_steps_between_exchanges
-      Vi = [[0.] * self.num_endstates] * self.num_replicas
+      Vi = [self.end_state_energies(pos) for pos in self.replica_positions]
     
       for idx, pos in enumerate(self.replica_positions):
-        self.simulations.context.setState(self.states[pos])
         self.ene_traj_files[idx].write('{0: <14}'.format("{:.4f}".format(time)) + " ")
 
         for i in range(self.num_endstates):
-          #self.simulations.context.setParameter('scaling_' + str(i), 1)
-          Vi[idx][i] = self.simulations.context.getState(getEnergy=True, groups=1<<i+1).getPotentialEnergy().value_in_unit(u.kilojoules_per_mole)
           self.ene_traj_files[idx].write('{0: <14}'.format("{:.10f}".format(Vi[idx][i])) + " ")
         
         self.ene_traj_files[idx].write('{0: <15}'.format("{:.10f}".format(self.reference_state(pos))))
@@ -643,8 +691,7 @@ class Reeds:
       # TODO: add output frequency as ReedsSimulationVariables member
       if(not (total_steps % 1000)):
         for idx, pos in enumerate(self.replica_positions):
-          self.simulations.context.setState(self.states[pos])
-          self.simulations.saveState(self.system_name + "_state_s_" + str(idx))
+          self.save_state(pos, self.system_name + "_state_s_" + str(idx))
         for idx in range(self.num_replicas):
           self.ene_traj_files[idx].flush()
         self.repdat.flush()
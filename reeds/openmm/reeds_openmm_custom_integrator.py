@@ -9,6 +9,8 @@ import pandas as pd
 
 from scipy.special import logsumexp
 
+from reeds.openmm.reaction_field import NonbondedParameters, add_particles, add_exclusions, add_bonds
+
 class ReedsSimulationVariables:
   """
   define the simulation variables for a RE-EDS simulation such as temperature, pressure etc.
@@ -132,6 +134,9 @@ class Reeds:
     default_nonbonded_force.setReactionFieldDielectric(reeds_simulation_variables.eps_reaction_field)
     default_nonbonded_force.setCutoffDistance(reeds_simulation_variables.cutoff)
 
+    # read the nonbonded parameters once, they are shared by all end states and the environment
+    nonbonded_parameters = NonbondedParameters(default_nonbonded_force)
+
     # assumption: end-state molecules are listed consecutively at beginning of the topology, all non end-state particles are environment
     environment_particles = []
     for mol in self.simulations[0].context.getMolecules()[self.num_endstates:]:
@@ -145,7 +150,7 @@ class Reeds:
       for i, active_particles in enumerate(active_particles_):
 
           if(active_particles != environment_particles):
-            a, b, c, d = (self.custom_reaction_field(i, default_nonbonded_force, active_particles, environment_particles))
+            a, b, c, d = (self.custom_reaction_field(i, default_nonbonded_force, active_particles, environment_particles, nonbonded_parameters = nonbonded_parameters))
             a.setName("lj_rf_endstate_" + str(i+1))
             b.setName("lj_rf_endstate_" + str(i+1) + "_one_four")
             c.setName("rf_endstate_" + str(i+1) + "_excluded")
@@ -155,7 +160,7 @@ class Reeds:
             c.setForceGroup(i+1)
             d.setForceGroup(i+1)
           else:
-            a, b, c, d = (self.custom_reaction_field(i, default_nonbonded_force, active_particles, environment_particles))
+            a, b, c, d = (self.custom_reaction_field(i, default_nonbonded_force, active_particles, environment_particles, nonbonded_parameters = nonbonded_parameters))
             a.setName("lj_rf_environment_environment")
             b.setName("lj_rf_environment_environment_one_four")
             c.setName("rf_environment_environment_excluded")
@@ -238,6 +243,10 @@ class Reeds:
       self.repdat_gromos.write("Vr" + str(i+1) + "\t")
     self.repdat_gromos.write("\n")
 
+    # end-state energies of the current configuration of every replica, keyed by replica.
+    # an entry is removed as soon as the positions of the replica change
+    self.energy_cache = {}
+
   def EDS_integrator(self):
     """
     creates a mm.CustomIntegrator for EDS integration based on the LangevinMiddleIntegrator based on the code snipped for the custom LangevinMiddleIntegrator (http://docs.openmm.org/latest/api-python/generated/openmm.openmm.CustomIntegrator.html) and the calculation of the exponential terms of https://doi.org/10.1016/S0010-4655(03)00245-5
@@ -298,7 +307,7 @@ class Reeds:
     return EDS_integrator
 
 
-  def custom_reaction_field(self, end_state, original_nonbonded_force, active_particles, environment_particles):
+  def custom_reaction_field(self, end_state, original_nonbonded_force, active_particles, environment_particles, nonbonded_parameters = None):
     """
     defines a reaction field with a shifting function (see A. Kubincova et al, Phys. Chem. Chem. Phys. 2020, 22)
 
@@ -312,6 +321,8 @@ class Reeds:
       list of particle indices of current particles (either all particles of current end-state or all environment particles)
     environment_particles: List
       list of environment particles
+    nonbonded_parameters: NonbondedParameters
+      parameters of the original nonbonded force (read from original_nonbonded_force if None)
 
     Returns
     -------
@@ -324,6 +335,9 @@ class Reeds:
     force_self_term: mm.CustomBondForce
       reaction field force for self term
     """
+    if nonbonded_parameters is None:
+      nonbonded_parameters = NonbondedParameters(original_nonbonded_force)
+
     # define parameters
     cutoff = original_nonbonded_force.getCutoffDistance()
 
@@ -369,14 +383,10 @@ class Reeds:
     force_lj_crf.setUseLongRangeCorrection(False)
 
     # copy per particle parameters from original nonbonded force
-    for index in range(original_nonbonded_force.getNumParticles()):
-      charge, sigma, epsilon = original_nonbonded_force.getParticleParameters(index)
-      force_lj_crf.addParticle([charge, sigma, epsilon])
+    add_particles(force_lj_crf, nonbonded_parameters.particle_parameters)
         
     # copy exceptions from original nonbonded force
-    for index in range(original_nonbonded_force.getNumExceptions()):
-      j, k, chargeprod, sigma, epsilon = original_nonbonded_force.getExceptionParameters(index)
-      force_lj_crf.addExclusion(j, k)
+    add_exclusions(force_lj_crf, nonbonded_parameters.exclusions)
 
     # set interaction groups -> end-state with itself and end-state with environment (or only environment with environment)
     force_lj_crf.addInteractionGroup(active_particles, environment_particles)
@@ -407,13 +417,7 @@ class Reeds:
     #force_lj_crf_one_four.setUsesPeriodicBoundaryConditions(True)
 
     # copy third neighbors from original nonbonded force
-    for index in range(original_nonbonded_force.getNumExceptions()):
-      j, k, chargeprod, sigma, epsilon = original_nonbonded_force.getExceptionParameters(index)
-  
-      if j in active_particles and k in active_particles and (chargeprod._value != 0 or epsilon._value != 0 ):
-        ch1, _, _ = original_nonbonded_force.getParticleParameters(j)
-        ch2, _, _ = original_nonbonded_force.getParticleParameters(k)
-        force_lj_crf_one_four.addBond(j, k, [chargeprod, sigma, epsilon, ch1*ch2])
+    add_bonds(force_lj_crf_one_four, *nonbonded_parameters.one_four_bonds(active_particles))
 
     #
     # excluded neighbors reaction field
@@ -432,12 +436,7 @@ class Reeds:
     #force_crf_excluded.setUsesPeriodicBoundaryConditions(True)
 
     # copy excluded neighbors from reaction field
-    for index in range(original_nonbonded_force.getNumExceptions()):
-      j, k, chargeprod, sigma, epsilon = original_nonbonded_force.getExceptionParameters(index)
-      if j in active_particles and k in active_particles and (chargeprod._value == 0):
-        ch1, _, _ = original_nonbonded_force.getParticleParameters(j)
-        ch2, _, _ = original_nonbonded_force.getParticleParameters(k)
-        force_crf_excluded.addBond(j, k, [ch1*ch2])
+    add_bonds(force_crf_excluded, *nonbonded_parameters.excluded_bonds(active_particles))
 
     #
     # self term
@@ -450,9 +449,7 @@ class Reeds:
     #force_crf_self_term.setUsesPeriodicBoundaryConditions(True)
 
     # add self interaction of all current end-state/environment particles
-    for i in active_particles:
-      ch1, _, _ = original_nonbonded_force.getParticleParameters(i)
-      force_crf_self_term.addBond(i, i, [ch1*ch1])
+    add_bonds(force_crf_self_term, *nonbonded_parameters.self_term_bonds(active_particles))
 
     return force_lj_crf, force_lj_crf_one_four, force_crf_excluded, force_crf_self_term
 
@@ -475,13 +472,22 @@ class Reeds:
 
     return sum_prefactors, prefactors
 
+  def end_state_energies(self, replica):
+    """
+    returns the end-state energies (force groups 1, ..., num_endstates) of the current configuration of replica.
+    they are only evaluated if the positions of the replica changed since the last call
+    """
+    if replica not in self.energy_cache:
+      context = self.simulations[replica].context
+      self.energy_cache[replica] = np.array([context.getState(getEnergy=True, groups=1<<i+1).getPotentialEnergy().value_in_unit(u.kilojoules_per_mole) for i in range(self.num_endstates)])
+    return self.energy_cache[replica]
+
   def reference_state(self, pos):
     """
     calculates V_R of replica at with s-value at index pos
     """
-    Vi = np.array([self.simulations.context.getState(getEnergy=True, groups=1<<i+1).getPotentialEnergy().value_in_unit(u.kilojoules_per_mole) for i in range(self.num_endstates)])
     s = self.s_values[pos]
-    V_R = - 1/(self.beta * s) * logsumexp(-self.beta * s * (Vi - self.energy_offsets))
+    V_R = - 1/(self.beta * s) * logsumexp(-self.beta * s * (self.end_state_energies(pos) - self.energy_offsets))
           
     return V_R 
 
@@ -492,8 +498,8 @@ class Reeds:
     V_orig = np.array([0.,0.])
     V_exch = np.array([0.,0.])
     for i, p in enumerate(partners):
-         
-      Vi = [self.simulations[p].context.getState(getEnergy=True, groups=1<<j+1).getPotentialEnergy().value_in_unit(u.kilojoules_per_mole) for j in range(self.num_endstates)]
+      # cached end-state energies, the configurations did not change since the propagation
+      Vi = self.end_state_energies(p)
       
       # calculate reference state with original s value
       s = self.s_values[p]
@@ -544,25 +550,25 @@ class Reeds:
         # propagate replica at position idx
         self.integrators[idx].setGlobalVariableByName("s", self.s_values[idx])        
         sim.step(self.reeds_simulation_variables.num_steps_between_exchanges)
+        self.energy_cache.pop(idx, None)
+        # evaluate the end-state energies for the output and the exchanges once per interval
+        self.end_state_energies(idx)
         V_R[idx] = -1/(self.beta * self.s_values[idx]) * self.integrators[idx].getGlobalVariableByName("expsum")
 
       # print output to energy trajectories
       time += step_size * self.reeds_simulation_variables.num_steps_between_exchanges
-      Vi = [[0.] * self.num_endstates] * self.num_replicas
+      Vi = [self.end_state_energies(pos) for pos in self.replica_positions]
     
       for idx, pos in enumerate(self.replica_positions):
-        sim = self.simulations[pos]
         self.ene_traj_files[idx].write('{0: <14}'.format("{:.4f}".format(time)) + " ")
 
         for i in range(self.num_endstates):
-          Vi[idx][i] = sim.context.getState(getEnergy=True, groups=1<<i+1).getPotentialEnergy().value_in_unit(u.kilojoules_per_mole)
           self.ene_traj_files[idx].write('{0: <14}'.format("{:.10f}".format(Vi[idx][i])) + " ")
 
         if(any(np.isnan(Vi[idx]))):
           print("nan")
           for idx, pos in enumerate(self.replica_positions):
-            self.simulations.context.setState(self.states[pos])
-            self.simulations.saveState(self.system_name + "_state_s_" + str(idx))
+            self.simulations[pos].saveState(self.system_name + "_state_s_" + str(idx))
             for idx in range(self.num_replicas):
               self.ene_traj_files[idx].flush()
             self.repdat.flush()
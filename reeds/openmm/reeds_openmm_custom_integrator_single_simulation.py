@@ -9,6 +9,8 @@ import pandas as pd
 
 from scipy.special import logsumexp
 
+from reeds.openmm.reaction_field import NonbondedParameters, add_particles, add_exclusions, add_bonds
+
 class ReedsSimulationVariables:
   """
   define the simulation variables for a RE-EDS simulation such as temperature, pressure etc.
@@ -124,6 +126,9 @@ class Reeds:
     default_nonbonded_force.setReactionFieldDielectric(reeds_simulation_variables.eps_reaction_field)
     default_nonbonded_force.setCutoffDistance(reeds_simulation_variables.cutoff)
 
+    # read the nonbonded parameters once, they are shared by all end states and the environment
+    nonbonded_parameters = NonbondedParameters(default_nonbonded_force)
+
     # assumption: end-state molecules are listed consecutively at beginning of the topology, all non end-state particles are environment
     environment_particles = []
     for mol in self.simulations.context.getMolecules()[self.num_endstates:]:
@@ -136,7 +141,7 @@ class Reeds:
     for i, active_particles in enumerate(active_particles_):
 
         if(active_particles != environment_particles):
-          a, b, c, d = (self.custom_reaction_field(i, default_nonbonded_force, active_particles, environment_particles))
+          a, b, c, d = (self.custom_reaction_field(i, default_nonbonded_force, active_particles, environment_particles, nonbonded_parameters = nonbonded_parameters))
           a.setName("lj_rf_endstate_" + str(i+1))
           b.setName("lj_rf_endstate_" + str(i+1) + "_one_four")
           c.setName("rf_endstate_" + str(i+1) + "_excluded")
@@ -146,7 +151,7 @@ class Reeds:
           c.setForceGroup(i+1)
           d.setForceGroup(i+1)
         else:
-          a, b, c, d = (self.custom_reaction_field(i, default_nonbonded_force, active_particles, environment_particles))
+          a, b, c, d = (self.custom_reaction_field(i, default_nonbonded_force, active_particles, environment_particles, nonbonded_parameters = nonbonded_parameters))
           a.setName("lj_rf_environment_environment")
           b.setName("lj_rf_environment_environment_one_four")
           c.setName("rf_environment_environment_excluded")
@@ -289,7 +294,7 @@ class Reeds:
     return EDS_integrator
 
 
-  def custom_reaction_field(self, end_state, original_nonbonded_force, active_particles, environment_particles):
+  def custom_reaction_field(self, end_state, original_nonbonded_force, active_particles, environment_particles, nonbonded_parameters = None):
     """
     defines a reaction field with a shifting function (see A. Kubincova et al, Phys. Chem. Chem. Phys. 2020, 22)
 
@@ -303,6 +308,8 @@ class Reeds:
       list of particle indices of current particles (either all particles of current end-state or all environment particles)
     environment_particles: List
       list of environment particles
+    nonbonded_parameters: NonbondedParameters
+      parameters of the original nonbonded force (read from original_nonbonded_force if None)
 
     Returns
     -------
@@ -315,6 +322,9 @@ class Reeds:
     force_self_term: mm.CustomBondForce
       reaction field force for self term
     """
+    if nonbonded_parameters is None:
+      nonbonded_parameters = NonbondedParameters(original_nonbonded_force)
+
     # define parameters
     cutoff = original_nonbonded_force.getCutoffDistance()
 
@@ -360,14 +370,10 @@ class Reeds:
     force_lj_crf.setUseLongRangeCorrection(False)
 
     # copy per particle parameters from original nonbonded force
-    for index in range(original_nonbonded_force.getNumParticles()):
-      charge, sigma, epsilon = original_nonbonded_force.getParticleParameters(index)
-      force_lj_crf.addParticle([charge, sigma, epsilon])
+    add_particles(force_lj_crf, nonbonded_parameters.particle_parameters)
         
     # copy exceptions from original nonbonded force
-    for index in range(original_nonbonded_force.getNumExceptions()):
-      j, k, chargeprod, sigma, epsilon = original_nonbonded_force.getExceptionParameters(index)
-      force_lj_crf.addExclusion(j, k)
+    add_exclusions(force_lj_crf, nonbonded_parameters.exclusions)
 
     # set interaction groups -> end-state with itself and end-state with environment (or only environment with environment)
     force_lj_crf.addInteractionGroup(active_particles, environment_particles)
@@ -398,13 +404,7 @@ class Reeds:
     #force_lj_crf_one_four.setUsesPeriodicBoundaryConditions(True)
 
     # copy third neighbors from original nonbonded force
-    for index in range(original_nonbonded_force.getNumExceptions()):
-      j, k, chargeprod, sigma, epsilon = original_nonbonded_force.getExceptionParameters(index)
-  
-      if j in active_particles and k in active_particles and (chargeprod._value != 0 or epsilon._value != 0 ):
-        ch1, _, _ = original_nonbonded_force.getParticleParameters(j)
-        ch2, _, _ = original_nonbonded_force.getParticleParameters(k)
-        force_lj_crf_one_four.addBond(j, k, [chargeprod, sigma, epsilon, ch1*ch2])
+    add_bonds(force_lj_crf_one_four, *nonbonded_parameters.one_four_bonds(active_particles))
 
     #
     # excluded neighbors reaction field
@@ -423,12 +423,7 @@ class Reeds:
     #force_crf_excluded.setUsesPeriodicBoundaryConditions(True)
 
     # copy excluded neighbors from reaction field
-    for index in range(original_nonbonded_force.getNumExceptions()):
-      j, k, chargeprod, sigma, epsilon = original_nonbonded_force.getExceptionParameters(index)
-      if j in active_particles and k in active_particles and (chargeprod._value == 0):
-        ch1, _, _ = original_nonbonded_force.getParticleParameters(j)
-        ch2, _, _ = original_nonbonded_force.getParticleParameters(k)
-        force_crf_excluded.addBond(j, k, [ch1*ch2])
+    add_bonds(force_crf_excluded, *nonbonded_parameters.excluded_bonds(active_particles))
 
     #
     # self term
@@ -441,9 +436,7 @@ class Reeds:
     #force_crf_self_term.setUsesPeriodicBoundaryConditions(True)
 
     # add self interaction of all current end-state/environment particles
-    for i in active_particles:
-      ch1, _, _ = original_nonbonded_force.getParticleParameters(i)
-      force_crf_self_term.addBond(i, i, [ch1*ch1])
+    add_bonds(force_crf_self_term, *nonbonded_parameters.self_term_bonds(active_particles))
 
     return force_lj_crf, force_lj_crf_one_four, force_crf_excluded, force_crf_self_term
 
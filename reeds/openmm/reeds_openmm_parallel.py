@@ -5,7 +5,6 @@ from openmm import unit as u
 from parmed import load_file
 from copy import deepcopy
 import numpy as np
-import pandas as pd
 import os
 from collections.abc import Iterable  
 
@@ -14,6 +13,15 @@ import time
 
 from mpi4py import MPI
 
+from reeds.openmm.output_writer import AsyncOutputWriter
+from reeds.openmm.checkpointing import CheckpointPolicy, AsyncCheckpointWriter
+from reeds.openmm.timing import PhaseTimers, ProfilerWindow
+from reeds.openmm.free_energy import FreeEnergyAccumulator
+from reeds.openmm.devices import DevicePolicy
+from reeds.openmm.exchange import metropolis_exchange, gibbs_exchange
+from reeds.openmm.reaction_field import NonbondedParameters, add_particles, add_exclusions, add_bonds
+from reeds.openmm.system_cache import input_hash, load_system, store_system
+
 class EDSSimulationVariables:
   """
   define the simulation variables for an EDS simulation such as temperature, pressure etc.
@@ -30,7 +38,9 @@ class EDSSimulationVariables:
                      minimize = False,
                      time_step = 0.002 * u.picoseconds,
                      total_steps = 250000,
-                     initial_time = 0):
+                     initial_time = 0,
+                     system_cache_dir = None,
+                     broadcast_system = True):
                      
     self.kb = (u.BOLTZMANN_CONSTANT_kB*u.AVOGADRO_CONSTANT_NA)
     self.temperature = temperature
@@ -42,10 +52,12 @@ class EDSSimulationVariables:
     self.distance_restraint_force_constant = distance_restraint_force_constant
     self.distance_restraint_pairs = distance_restraint_pairs
     self.distance_restraints_start_at_1 = distance_restraints_start_at_1
-    self.minimize = minimize,
+    self.minimize = minimize
     self.time_step = time_step
     self.total_steps = total_steps
     self.initial_time = initial_time
+    self.system_cache_dir = system_cache_dir
+    self.broadcast_system = broadcast_system
 
 class REEDSSimulationVariables:
   """
@@ -64,9 +76,39 @@ class REEDSSimulationVariables:
                      num_steps_between_exchanges = 20,
                      time_step = 0.002 * u.picoseconds,
                      total_steps = 250000,
-                     initial_time = 0):
+                     initial_time = 0,
+                     output_format = "text",
+                     output_buffer_size = 1000,
+                     checkpoint_policy = None,
+                     exchange_scheme = "neighbour",
+                     num_gibbs_attempts = None,
+                     system_cache_dir = None,
+                     broadcast_system = True,
+                     timing_interval = None,
+                     profile_steps = None,
+                     profiler = "cProfile",
+                     device_policy = None,
+                     free_energy_interval = None):
 
     self.s_values = s_values
+    if checkpoint_policy is None:
+      checkpoint_policy = CheckpointPolicy()
+    self.checkpoint_policy = checkpoint_policy
+    if exchange_scheme not in ["neighbour", "gibbs"]:
+      raise ValueError(f"unknown exchange scheme {exchange_scheme} (use 'neighbour' or 'gibbs')")
+    self.exchange_scheme = exchange_scheme
+    # pair exchange attempts per Gibbs exchange (default num_replicas**2), a scalar loop on rank 0 while the other
+    # ranks wait: ~0.5 us per attempt, i.e. num_replicas**3 attempts of 64 replicas take ~0.1 s per exchange
+    self.num_gibbs_attempts = num_gibbs_attempts
+    self.timing_interval = timing_interval
+    self.profile_steps = profile_steps
+    self.profiler = profiler
+    self.free_energy_interval = free_energy_interval
+    if device_policy is None:
+      device_policy = DevicePolicy()
+    self.device_policy = device_policy
+    self.output_format = output_format
+    self.output_buffer_size = output_buffer_size
     self.num_steps_between_exchanges = num_steps_between_exchanges
     if isinstance(energy_offsets[0], Iterable):
       self.energy_offset_matrix = energy_offsets
@@ -88,7 +130,9 @@ class REEDSSimulationVariables:
                                                                  minimize,
                                                                  time_step,
                                                                  total_steps,
-                                                                 initial_time)
+                                                                 initial_time,
+                                                                 system_cache_dir,
+                                                                 broadcast_system)
         else:
           self.eds_simulation_variables = EDSSimulationVariables(s_values[i], 
                                                                  energy_offsets,
@@ -102,7 +146,9 @@ class REEDSSimulationVariables:
                                                                  minimize,
                                                                  time_step,
                                                                  total_steps,
-                                                                 initial_time)
+                                                                 initial_time,
+                                                                 system_cache_dir,
+                                                                 broadcast_system)
 
 class EDSInputFiles:                                                                                  
   """
@@ -147,14 +193,19 @@ class EDSSimulation(app.Simulation):
     self.num_endstates = len(self.energy_offsets)
 
     self.create_system(platform, properties)
-    self.create_distance_restraints()
-    self.create_barostat()
-    
-    # put all unperturbed forces in force group zero
-    for f in self.system.getForces():
-      f.setForceGroup(0)
-
-    self.create_reaction_field()
+    if(not self.system_loaded):
+      self.create_distance_restraints()
+      self.create_barostat()
+      
+      # put all unperturbed forces in force group zero
+      for f in self.system.getForces():
+        f.setForceGroup(0)
+
+      self.create_reaction_field()
+      if(self.eds_simulation_variables.system_cache_dir is not None):
+        store_system(self.eds_simulation_variables.system_cache_dir, self.system_cache_key, self.system)
+    if(self.eds_simulation_variables.broadcast_system and MPI.COMM_WORLD.Get_rank() == 0):
+      MPI.COMM_WORLD.bcast((mm.XmlSerializer.serialize(self.system), self.topology, self.initial_positions, self.eds_input_files.coordinate_file), root = 0)
     self.initialize_positions_and_velocities()
 
     # add pdb reporter
@@ -162,18 +213,50 @@ class EDSSimulation(app.Simulation):
 
   def create_system(self, platform = None, properties = None):
     # create system
-    parmed_sys = load_file(self.eds_input_files.parameter_file, self.eds_input_files.coordinate_file)
-    system = parmed_sys.createSystem(nonbondedMethod = app.CutoffPeriodic, constraints = app.AllBonds)
+    if(self.eds_simulation_variables.broadcast_system and MPI.COMM_WORLD.Get_rank() != 0):
+      # rank 0 builds (or loads) the finished system and broadcasts it, the input files are not read here
+      xml, topology, positions, coordinate_file = MPI.COMM_WORLD.bcast(None, root = 0)
+      system = mm.XmlSerializer.deserialize(xml)
+      self.system_loaded = True
+      self.initial_positions = positions if coordinate_file == self.eds_input_files.coordinate_file else None
+    else:
+      parmed_sys = load_file(self.eds_input_files.parameter_file, self.eds_input_files.coordinate_file)
+      topology = parmed_sys.topology
+      self.initial_positions = parmed_sys.positions
+      system = None
+      if(self.eds_simulation_variables.system_cache_dir is not None):
+        self.system_cache_key = self.get_system_cache_key()
+        system = load_system(self.eds_simulation_variables.system_cache_dir, self.system_cache_key)
+      self.system_loaded = system is not None
+      if(system is None):
+        system = parmed_sys.createSystem(nonbondedMethod = app.CutoffPeriodic, constraints = app.AllBonds)
     sys.stdout.flush()
     mm.LangevinMiddleIntegrator(self.temperature, 1/u.picoseconds, self.eds_simulation_variables.time_step)
     self.integrator = mm.LangevinMiddleIntegrator(self.temperature, 1/u.picoseconds, self.eds_simulation_variables.time_step)
 
     if properties is not None:
-      app.Simulation.__init__(self, parmed_sys.topology, system, self.integrator, platform, platformProperties = properties)
+      app.Simulation.__init__(self, topology, system, self.integrator, platform, platformProperties = properties)
     else:
-      app.Simulation.__init__(self, parmed_sys.topology, system, self.integrator)
+      app.Simulation.__init__(self, topology, system, self.integrator)
+
+    if(self.initial_positions is not None):
+      self.context.setPositions(self.initial_positions)
 
-    self.context.setPositions(parmed_sys.positions)
+  def get_system_cache_key(self):
+    """
+    returns the hash of the input files and of the simulation variables which enter the system
+    """
+    variables = self.eds_simulation_variables
+    return input_hash([self.eds_input_files.parameter_file, self.eds_input_files.coordinate_file],
+                      engine = type(self).__module__,
+                      num_endstates = self.num_endstates,
+                      temperature = variables.temperature,
+                      pressure = variables.pressure,
+                      cutoff = variables.cutoff,
+                      eps_reaction_field = variables.eps_reaction_field,
+                      distance_restraint_pairs = variables.distance_restraint_pairs,
+                      distance_restraint_force_constant = variables.distance_restraint_force_constant,
+                      distance_restraints_start_at_1 = variables.distance_restraints_start_at_1)
 
   def create_distance_restraints(self):
     # create distance restraints
@@ -208,6 +291,9 @@ class EDSSimulation(app.Simulation):
     default_nonbonded_force.setReactionFieldDielectric(self.eds_simulation_variables.eps_reaction_field)
     default_nonbonded_force.setCutoffDistance(self.eds_simulation_variables.cutoff)
 
+    # read the nonbonded parameters once, they are shared by all end states and the environment
+    nonbonded_parameters = NonbondedParameters(default_nonbonded_force)
+
     # assumption: end-state molecules are listed consecutively at beginning of the topology, all non end-state particles are environment
     environment_particles = []
     for mol in self.context.getMolecules()[self.num_endstates:]:
@@ -220,7 +306,7 @@ class EDSSimulation(app.Simulation):
 
     for i, active_particles in enumerate(active_particles_):
         if(active_particles != environment_particles):
-          a, b, c, d = (self.custom_reaction_field(i, default_nonbonded_force, active_particles, environment_particles))
+          a, b, c, d = (self.custom_reaction_field(i, default_nonbonded_force, active_particles, environment_particles, nonbonded_parameters = nonbonded_parameters))
           a.setName(f"lj_rf_endstate_{i+1}")
           b.setName(f"lj_rf_endstate_{i+1}_one_four")
           c.setName(f"rf_endstate_{i+1}_excluded")
@@ -230,7 +316,7 @@ class EDSSimulation(app.Simulation):
           c.setForceGroup(i+1)
           d.setForceGroup(i+1)
         else:
-          a, b, c, d = (self.custom_reaction_field(i, default_nonbonded_force, active_particles, environment_particles))
+          a, b, c, d = (self.custom_reaction_field(i, default_nonbonded_force, active_particles, environment_particles, nonbonded_parameters = nonbonded_parameters))
           a.setName("lj_rf_environment_environment")
           b.setName("lj_rf_environment_environment_one_four")
           c.setName("rf_environment_environment_excluded")
@@ -255,13 +341,19 @@ class EDSSimulation(app.Simulation):
 
   def initialize_positions_and_velocities(self):
     if(self.eds_input_files.state_file is None):
-      parmed_sys = load_file(self.eds_input_files.parameter_file, self.eds_input_files.coordinate_file)
-      self.context.setPositions(parmed_sys.positions)
+      if(self.initial_positions is None):
+        # coordinate file differs from the one of rank 0 (which broadcasted the system)
+        parmed_sys = load_file(self.eds_input_files.parameter_file, self.eds_input_files.coordinate_file)
+        self.initial_positions = parmed_sys.positions
+        self.context.setPeriodicBoxVectors(*parmed_sys.box_vectors)
+      self.context.setPositions(self.initial_positions)
       self.context.setVelocitiesToTemperature(self.temperature)
+    elif(self.eds_input_files.state_file.endswith(".chk")):
+      self.loadCheckpoint(self.eds_input_files.state_file)
     else:
       self.loadState(self.eds_input_files.state_file)
 
-  def custom_reaction_field(self, end_state, original_nonbonded_force, active_particles, environment_particles):
+  def custom_reaction_field(self, end_state, original_nonbonded_force, active_particles, environment_particles, nonbonded_parameters = None):
     """
     defines a reaction field with a shifting function (see A. Kubincova et al, Phys. Chem. Chem. Phys. 2020, 22)
 
@@ -275,6 +367,8 @@ class EDSSimulation(app.Simulation):
       list of particle indices of current particles (either all particles of current end-state or all environment particles)
     environment_particles: List
       list of environment particles
+    nonbonded_parameters: NonbondedParameters
+      parameters of the original nonbonded force (read from original_nonbonded_force if None)
 
     Returns
     -------
@@ -287,6 +381,9 @@ class EDSSimulation(app.Simulation):
     force_self_term: mm.CustomBondForce
       reaction field force for self term
     """
+    if nonbonded_parameters is None:
+      nonbonded_parameters = NonbondedParameters(original_nonbonded_force)
+
     # define parameters
     cutoff = original_nonbonded_force.getCutoffDistance()
     scal = 'scaling_' + str(end_state)
@@ -334,14 +431,10 @@ class EDSSimulation(app.Simulation):
     force_lj_crf.addGlobalParameter(scal, 1)
 
     # copy per particle parameters from original nonbonded force
-    for index in range(original_nonbonded_force.getNumParticles()):
-      charge, sigma, epsilon = original_nonbonded_force.getParticleParameters(index)
-      force_lj_crf.addParticle([charge, sigma, epsilon])
+    add_particles(force_lj_crf, nonbonded_parameters.particle_parameters)
         
     # copy exceptions from original nonbonded force
-    for index in range(original_nonbonded_force.getNumExceptions()):
-      j, k, chargeprod, sigma, epsilon = original_nonbonded_force.getExceptionParameters(index)
-      force_lj_crf.addExclusion(j, k)
+    add_exclusions(force_lj_crf, nonbonded_parameters.exclusions)
 
     # set interaction groups -> end-state with itself and end-state with environment (or only environment with environment)
     force_lj_crf.addInteractionGroup(active_particles, environment_particles)
@@ -373,13 +466,7 @@ class EDSSimulation(app.Simulation):
     #force_lj_crf_one_four.setUsesPeriodicBoundaryConditions(True)
 
     # copy third neighbors from original nonbonded force
-    for index in range(original_nonbonded_force.getNumExceptions()):
-      j, k, chargeprod, sigma, epsilon = original_nonbonded_force.getExceptionParameters(index)
-  
-      if j in active_particles and k in active_particles and (chargeprod._value != 0 or epsilon._value != 0 ):
-        ch1, _, _ = original_nonbonded_force.getParticleParameters(j)
-        ch2, _, _ = original_nonbonded_force.getParticleParameters(k)
-        force_lj_crf_one_four.addBond(j, k, [chargeprod, sigma, epsilon, ch1*ch2])
+    add_bonds(force_lj_crf_one_four, *nonbonded_parameters.one_four_bonds(active_particles))
 
     #
     # excluded neighbors reaction field
@@ -399,12 +486,7 @@ class EDSSimulation(app.Simulation):
     #force_crf_excluded.setUsesPeriodicBoundaryConditions(True)
 
     # copy excluded neighbors from reaction field
-    for index in range(original_nonbonded_force.getNumExceptions()):
-      j, k, chargeprod, sigma, epsilon = original_nonbonded_force.getExceptionParameters(index)
-      if j in active_particles and k in active_particles and (chargeprod._value == 0):
-        ch1, _, _ = original_nonbonded_force.getParticleParameters(j)
-        ch2, _, _ = original_nonbonded_force.getParticleParameters(k)
-        force_crf_excluded.addBond(j, k, [ch1*ch2])
+    add_bonds(force_crf_excluded, *nonbonded_parameters.excluded_bonds(active_particles))
 
     #
     # self term
@@ -418,26 +500,30 @@ class EDSSimulation(app.Simulation):
     #force_crf_self_term.setUsesPeriodicBoundaryConditions(True)
 
     # add self interaction of all current end-state/environment particles
-    for i in active_particles:
-      ch1, _, _ = original_nonbonded_force.getParticleParameters(i)
-      force_crf_self_term.addBond(i, i, [ch1*ch1])
+    add_bonds(force_crf_self_term, *nonbonded_parameters.self_term_bonds(active_particles))
 
     return force_lj_crf, force_lj_crf_one_four, force_crf_excluded, force_crf_self_term
 
   def step(self, steps):
+    """
+    performs steps MD steps. the scaling factors are calculated in python from the end-state energies,
+    therefore the integrator is called for every single step. the CI and CustomCVForce engines calculate
+    the scaling on the device and perform all steps between two exchanges with a single call of step.
+    """
+    scaling_parameters = ['scaling_' + str(j) for j in range(self.num_endstates)]
     for step in range(steps):
-      for j in range(self.num_endstates):
-          self.context.setParameter('scaling_' + str(j), 1.0)
+      for name in scaling_parameters:
+        self.context.setParameter(name, 1.0)
 
       scal = self.get_scaling()        
 
-      for j in range(self.num_endstates):
-        self.context.setParameter('scaling_' + str(j), scal[j])
+      for name, scaling in zip(scaling_parameters, scal):
+        self.context.setParameter(name, scaling)
 
       super().step(1)
 
-    for j in range(self.num_endstates):
-      self.context.setParameter('scaling_' + str(j), 1.0)
+    for name in scaling_parameters:
+      self.context.setParameter(name, 1.0)
 
   def logsumexp_(self, s, Vi):
     """
@@ -496,19 +582,14 @@ class REEDS:
       raise Exception(f"not as many MPI cores ({self.comm.Get_size()}) as replicas ({self.num_replicas})")  
    
     #create simulation
-    n_gpu = self.get_num_gpus()
-    print("ngpu", n_gpu)
+    self.device_assignment = reeds_simulation_variables.device_policy.assign(self.comm)
+    print("rank", self.rank, self.device_assignment)
     if(self.comm.Get_size() > 1):
       eds_system_name = f"{system_name}_{self.rank}"
     else:
       eds_system_name = system_name
-    if(n_gpu):
-      platform = mm.Platform.getPlatformByName("CUDA")
-      os.environ['CUDA_LAUNCH_BLOCKING'] = '0'
-      properties = {'DeviceIndex': str(self.rank % n_gpu)}
-      self.EDS_simulation = EDSSimulation(eds_system_name, reeds_simulation_variables.eds_simulation_variables, reeds_input_files.eds_input_files, platform, properties)
-    else:
-      self.EDS_simulation = EDSSimulation(eds_system_name, reeds_simulation_variables.eds_simulation_variables, reeds_input_files.eds_input_files)
+    platform = mm.Platform.getPlatformByName(self.device_assignment.platform)
+    self.EDS_simulation = EDSSimulation(eds_system_name, reeds_simulation_variables.eds_simulation_variables, reeds_input_files.eds_input_files, platform, self.device_assignment.properties)
 
     # print some infos
     print("rank", self.rank, "num_endstates", self.EDS_simulation.num_endstates, "num_replicas ", self.num_replicas)
@@ -522,34 +603,36 @@ class REEDS:
     self.system_name = system_name
     self.initialize_output()
 
+    self.checkpoint_policy = reeds_simulation_variables.checkpoint_policy
+    self.checkpoint_writer = AsyncCheckpointWriter(self.checkpoint_policy.keep_last)
+
+    # per phase timers of run and optional profiling of a window of MD steps
+    self.timers = PhaseTimers(self.comm, f"{self.system_name}_timings.jsonl", reeds_simulation_variables.timing_interval)
+    self.profiler = ProfilerWindow(reeds_simulation_variables.profile_steps, f"{self.system_name}_profile_rank{self.rank}", reeds_simulation_variables.profiler)
+
     sys.stdout.flush()
   
-  def get_num_gpus(self):
-    """Returns the number of GPUs available"""
-    from pycuda import driver
-    try:
-      driver.init()
-      num_gpus = driver.Device.count()
-      return num_gpus 
-    except:
-      return 0  
-
   def initialize_output(self):
     # initialize output files, i.e. energy trajectories and repdat files
     if(self.num_replicas > 1):
       self.ene_traj_filenames = [f"ene_traj_{self.system_name}_{i}" for i in range(1, self.num_replicas + 1)]
     else:
       self.ene_traj_filenames = [f"ene_traj_{self.system_name}"]
-    self.ene_traj_files = [open(name, "w") for name in self.ene_traj_filenames]
     if self.rank == 0:
-      for file in self.ene_traj_files:
-          file.write('{0: <15}'.format("t"))
-          for i in range(1, self.EDS_simulation.num_endstates +1):
-              file.write('{0: <15}'.format(f"V_{i}"))
-          file.write('{0: <15}'.format("V_R") + "\n")
-
-      self.repdat = open(f"repdat_{self.system_name}", "w")
-      self.repdat.write('{0: <15}'.format("time") + '{0: <15}'.format("partner_i") + '{0: <15}'.format("partner_j")+ '{0: <15}'.format("s_i") + '{0: <15}'.format("s_j")+'{0: <15}'.format("position_i")+'{0: <15}'.format("position_j")+'{0: <15}'.format("probability")+'{0: <15}'.format("exchanged")+"\n")
+      # energy trajectories and repdat are formatted and written by a background thread
+      self.output_writer = AsyncOutputWriter(self.reeds_simulation_variables.output_format, self.reeds_simulation_variables.output_buffer_size)
+      # running free energy differences of all s values, updated with the gathered energies
+      self.free_energies = FreeEnergyAccumulator(len(self.ene_traj_filenames), self.EDS_simulation.num_endstates, self.EDS_simulation.beta, f"{self.system_name}_free_energies.json", self.reeds_simulation_variables.free_energy_interval)
+
+      columns = ["t"] + [f"V_{i}" for i in range(1, self.EDS_simulation.num_endstates +1)] + ["V_R"]
+      header = "".join(['{0: <15}'.format(c) for c in columns]) + "\n"
+      row_format = "{:<14.4f} " + "{:<14.10f} " * self.EDS_simulation.num_endstates + "{:<15.10f}\n"
+      self.ene_traj_filenames = [self.output_writer.add_stream(idx, name, columns, row_format, header) for idx, name in enumerate(self.ene_traj_filenames)]
+
+      columns = ["time", "partner_i", "partner_j", "s_i", "s_j", "position_i", "position_j", "probability", "exchanged"]
+      header = "".join(['{0: <15}'.format(c) for c in columns]) + "\n"
+      row_format = "{:<14.4f} {:<14.0f} {:<14.0f} {:<14.4f} {:<14.4f} {:<14.0f} {:<14.0f} {:<14.4f} {:<14.0f}\n"
+      self.output_writer.add_stream("repdat", f"repdat_{self.system_name}", columns, row_format, header)
       
       # repdat in GROMOS format to use with existing analysis script -> remove in the long run
       self.repdat_gromos = open(f"repdat_gromos_{self.system_name}", "w")
@@ -577,12 +660,10 @@ class REEDS:
   def calculate_free_energy_differences(self, s_index):
     """
     calculate the free energy differences of all end-state pairs for the s value with index s_index
+    from the running log-sum-exp accumulators (rank 0), the energy trajectories are not read
     """
     if self.rank == 0:
-      ene_traj = pd.read_csv(self.ene_traj_filenames[s_index], header = [0], delim_whitespace = True)
-      df = [- 1/self.EDS_simulation.beta * np.log(np.mean(np.exp(-self.EDS_simulation.beta * (ene_traj["V_" + str(j+1)] - ene_traj["V_R"])))/np.mean(np.exp(-self.EDS_simulation.beta * (ene_traj["V_" + str(i+1)] - ene_traj["V_R"])))) for i in range(self.EDS_simulation.num_endstates) for j in range(i+1, self.EDS_simulation.num_endstates)]
-        
-    return df
+      return self.free_energies.pair_differences(s_index)
 
   def run(self):
     """
@@ -599,6 +680,7 @@ class REEDS:
     self.run = 1
     start_time = time.time()
 
+    steps_done = 0
     for total_steps in range(0,self.reeds_simulation_variables.eds_simulation_variables.total_steps, self.reeds_simulation_variables.num_steps_between_exchanges):
       # print time every 1000th step
       if(self.rank == 0 and not (total_steps % 1000)):
@@ -606,24 +688,50 @@ class REEDS:
         sys.stdout.flush()
         
       # propagate replica at position idx      
-      self.EDS_simulation.step(self.reeds_simulation_variables.num_steps_between_exchanges)
+      self.profiler.update(total_steps)
+      with self.timers.phase("md"):
+        self.EDS_simulation.step(self.reeds_simulation_variables.num_steps_between_exchanges)
       
       # print output to energy trajectories
       self.sim_time += step_size * self.reeds_simulation_variables.num_steps_between_exchanges
-      self.Vi = self.EDS_simulation.get_Vi()
-      self.V_R = self.EDS_simulation.get_VR()
-      self.write_ene_traj()
+      with self.timers.phase("Vi"):
+        self.Vi = self.EDS_simulation.get_Vi()
+        self.V_R = self.EDS_simulation.get_VR()
+      with self.timers.phase("ene_traj"):
+        self.write_ene_traj()
 
       # perform replica exchanges
-      self.perform_replica_exchanges()
-
-      # store state files every 1000 steps and flush
-      # TODO: add output frequency as REEDSSimulationVariables member
-      if(not (total_steps % 10000)):
-        self.save_state()
+      with self.timers.phase("exchange"):
+        self.perform_replica_exchanges()
+
+      # write checkpoints according to the checkpoint policy and flush the output
+      steps_done = total_steps + self.reeds_simulation_variables.num_steps_between_exchanges
+      checkpoint_due = self.checkpoint_policy.is_due(steps_done)
+      if(self.checkpoint_policy.every_seconds is not None):
+        # the wall-clock time differs between ranks -> rank 0 decides
+        checkpoint_due = self.comm.bcast(checkpoint_due, root = 0)
+      if(checkpoint_due):
+        with self.timers.phase("checkpoint"):
+          self.save_checkpoint()
+        self.checkpoint_policy.mark(steps_done)
+      if(self.timers.is_due(steps_done)):
+        self.timers.dump(steps_done, self.sim_time)
+      if(self.rank == 0 and self.free_energies.is_due(steps_done)):
+        self.free_energies.dump(steps_done, self.sim_time)
    
+    self.profiler.close()
     print("simulation time: ", time.time() - start_time)
-    self.save_state()
+    with self.timers.phase("checkpoint"):
+      # not again if the checkpoint of the last interval was written at the same step
+      if(self.checkpoint_policy.is_due_at_end(steps_done)):
+        self.save_checkpoint()
+      self.save_state()
+      self.checkpoint_writer.close()
+    if self.rank == 0:
+      with self.timers.phase("ene_traj"):
+        self.output_writer.close()
+        self.free_energies.dump(self.reeds_simulation_variables.eds_simulation_variables.total_steps, self.sim_time)
+    self.timers.dump(self.reeds_simulation_variables.eds_simulation_variables.total_steps, self.sim_time)
 
   def write_ene_traj(self):
     if self.rank == 0:
@@ -634,27 +742,27 @@ class REEDS:
           VR_ = self.V_R
           Vi_ = self.Vi
         else:
-          VR_ = self.comm.recv(source = pos)
-          Vi_ = self.comm.recv(source = pos)
+          VR_ = self.receive(source = pos)
+          Vi_ = self.receive(source = pos)
 
         self.Vi_all[idx] = Vi_
-        self.ene_traj_files[idx].write('{0: <14}'.format("{:.4f}".format(self.sim_time)) + " ")
-
-        for i in range(self.EDS_simulation.num_endstates):
-          self.ene_traj_files[idx].write('{0: <14}'.format("{:.10f}".format(self.Vi_all[idx][i])) + " ")
 
         if(any(np.isnan(Vi_))):
           print(f"Error: there is a nan in the energies of replica {idx} (s = {self.EDS_simulation.s_value}): {Vi_}")
           sys.stdout.flush()
           self.comm.Abort()
       
-        self.ene_traj_files[idx].write('{0: <15}'.format("{:.10f}".format(VR_)))
-        self.ene_traj_files[idx].write("\n")
+        self.output_writer.append(idx, [self.sim_time, *Vi_, VR_])
+        self.free_energies.update(idx, Vi_, VR_)
     else:
       self.comm.send(self.V_R, dest = 0)
       self.comm.send(self.Vi, dest = 0)
 
   def perform_replica_exchanges(self):
+    if(self.reeds_simulation_variables.exchange_scheme == "gibbs"):
+      self.perform_gibbs_exchanges()
+      return
+
     # replica 0 calculates exchange probabilities and sends new s values to other replicas
     if self.rank == 0:
       if(self.begin or self.num_replicas == 2):
@@ -670,40 +778,21 @@ class REEDS:
           self.comm.send(self.s_values[self.replica_positions[0]], dest = self.replica_positions[0])
           self.comm.send(self.energy_offset_matrix[self.replica_positions[0]], dest = self.replica_positions[0])
             
+      # calculate the exchange probabilities of all pairs at once
+      exchange = metropolis_exchange(self.Vi_all, self.s_values, self.energy_offset_matrix, self.replica_positions, self.begin, self.EDS_simulation.beta)
+
       i = 0      
       # alternate replica partners (i.e. even = s values at 0-1, 2-3, 4-5, ... and odd = s values at 1-2, 3-4, 5-6, ...)    
-      for i in range(self.begin, self.num_replicas-1,2):
-        # calculate exchange probability
+      for k, i in enumerate(exchange.pairs):
         p1 = self.replica_positions[i]
         p2 = self.replica_positions[i+1]
-        partners = [p1, p2]
-        rnd = np.random.uniform(0,1)
-        #prob, V_orig, V_exch = self.exchange_probability(partners)
-
-        V_orig_p1 = -1/(self.EDS_simulation.beta * self.s_values[p1]) * self.EDS_simulation.logsumexp_(self.s_values[p1], self.Vi_all[i])
-        V_exch_p1 = -1/(self.EDS_simulation.beta * self.s_values[p2]) * self.EDS_simulation.logsumexp_(self.s_values[p2], self.Vi_all[i])
-
-        V_orig_p2 = -1/(self.EDS_simulation.beta * self.s_values[p2]) * self.EDS_simulation.logsumexp_(self.s_values[p2], self.Vi_all[i+1])
-        V_exch_p2 = -1/(self.EDS_simulation.beta * self.s_values[p1]) * self.EDS_simulation.logsumexp_(self.s_values[p1], self.Vi_all[i+1])
-
-        delta = V_exch_p1 + V_exch_p2 - (V_orig_p1 + V_orig_p2)
-        if delta < 0:
-          prob = 1
-        else:
-          prob = np.exp(- self.EDS_simulation.beta * delta)
+        prob = exchange.probabilities[k]
+        V_orig_p1, V_orig_p2 = exchange.V_orig[k]
 
         # print info to repdat file
-        self.repdat.write('{0: <14}'.format("{:.4f}".format(self.sim_time)) + " ")
-        self.repdat.write('{0: <14}'.format(str(i)) + " ")
-        self.repdat.write('{0: <14}'.format(str(i+1)) + " ")
-        
-        self.repdat.write('{0: <14}'.format("{:.4f}".format(self.s_values[p1])) + " ")
-        self.repdat.write('{0: <14}'.format("{:.4f}".format(self.s_values[p2])) + " ")
-        self.repdat.write('{0: <14}'.format(str(p1)) + " ")
-        self.repdat.write('{0: <14}'.format(str(p2)) + " ")
-        self.repdat.write('{0: <14}'.format("{:.4f}".format(prob)) + " ")
+        repdat_record = [self.sim_time, i, i+1, self.s_values[p1], self.s_values[p2], p1, p2, prob]
         
-        if(prob > rnd):
+        if(exchange.accepted[k]):
           # perform exchange
           self.s_values[p1], self.s_values[p2] = self.s_values[p2], self.s_values[p1]
           self.energy_offset_matrix[p1], self.energy_offset_matrix[p2] = self.energy_offset_matrix[p2], self.energy_offset_matrix[p1]
@@ -711,7 +800,7 @@ class REEDS:
           self.replica_positions[i+1] = p1
 
           # print info to repdat file
-          self.repdat.write('{0: <14}'.format("1"))
+          self.output_writer.append("repdat", repdat_record + [1])
           self.repdat_gromos.write(str(i+1) + "\t" + str(i+1) + "\t" + str(self.replica_positions[i]+1) + "\t" + str(i+2) + "\t" + str(i+2) + "\t" + str(self.replica_positions[i+1]+1)+ "\t" + str(self.run) + "\t" + str(V_orig_p1) + "\t" + str(V_orig_p2) + "\t" + str(prob) + "\t1")
           for j in range(self.EDS_simulation.num_endstates):
             self.repdat_gromos.write("\t" + str(self.Vi_all[i][j]))
@@ -723,7 +812,7 @@ class REEDS:
 
         else:
           # print info to repdat file
-          self.repdat.write('{0: <14}'.format("0"))
+          self.output_writer.append("repdat", repdat_record + [0])
           self.repdat_gromos.write(str(i+1) + "\t" + str(i+1) + "\t" + str(self.replica_positions[i]) + "\t" + str(i+2) + "\t" + str(i+2) + "\t" + str(self.replica_positions[i+1])+ "\t" + str(self.run) + "\t" + str(V_orig_p1) + "\t" + str(V_orig_p2) + "\t" + str(prob) + "\t0")
           for j in range(self.EDS_simulation.num_endstates):
             self.repdat_gromos.write("\t" + str(self.Vi_all[i][j]))
@@ -737,17 +826,13 @@ class REEDS:
           self.comm.send(self.s_values[p1], dest = p1)
           self.comm.send(self.energy_offset_matrix[p1], dest = p1)
         else:
-          self.EDS_simulation.s_value = self.s_values[p1]
-          self.EDS_simulation.energy_offsets = self.energy_offset_matrix[p1]
+          self.set_eds_parameters(self.s_values[p1], self.energy_offset_matrix[p1])
 
         if(p2 != 0):
           self.comm.send(self.s_values[p2], dest = p2)
           self.comm.send(self.energy_offset_matrix[p2], dest = p2)
         else:
-          self.EDS_simulation.s_value = self.s_values[p2]
-          self.EDS_simulation.energy_offsets = self.energy_offset_matrix[p2]
-
-        self.repdat.write("\n")
+          self.set_eds_parameters(self.s_values[p2], self.energy_offset_matrix[p2])
 
       # if last replica doesn't have a partner -> print info to repdat file
       if(i+2 < self.num_replicas):
@@ -763,25 +848,105 @@ class REEDS:
 
     # replicas != 0 receive their current s values
     else:
-      self.EDS_simulation.s_value = self.comm.recv(source = 0)
-      self.EDS_simulation.energy_offsets = self.comm.recv(source = 0)
+      s_value = self.receive(source = 0)
+      energy_offsets = self.receive(source = 0)
+      self.set_eds_parameters(s_value, energy_offsets)
 
-  def save_state(self):
+  def perform_gibbs_exchanges(self):
+    """
+    replica exchange by Gibbs sampling over the permutations of all replicas (exchange_scheme = 'gibbs'),
+    i.e. repeated exchange attempts between random pairs of positions using the gathered end-state energies.
+    one line per position is written to the repdat files, the partner being the position the replica moves to.
+    """
     if self.rank == 0:
-      if self.comm.Get_size() == 1:
-        self.EDS_simulation.saveState(self.system_name)
-      else:
-        for idx, pos in enumerate(self.replica_positions):
-          if pos == 0:
-            self.EDS_simulation.saveState(self.system_name + "_state_s_" + str(idx))
-          else:
-            self.comm.send(idx, dest = pos)
-      for idx in range(self.num_replicas):
-        self.ene_traj_files[idx].flush()
-      self.repdat.flush()
+      exchange = gibbs_exchange(self.Vi_all, self.s_values, self.energy_offset_matrix, self.replica_positions, self.EDS_simulation.beta, self.reeds_simulation_variables.num_gibbs_attempts)
+
+      old_positions = list(self.replica_positions)
+      old_s_values = list(self.s_values)
+      # copies of the rows, the rows of an array are views which are overwritten below
+      old_energy_offsets = [np.array(row, copy = True) for row in self.energy_offset_matrix]
+      self.replica_positions = exchange.replica_positions
+      for i, j in enumerate(exchange.targets):
+        p1 = old_positions[i]
+        p2 = old_positions[j]
+        exchanged = int(i != j)
+
+        # the replica at position i takes over the parameters at position j
+        self.s_values[p1] = old_s_values[p2]
+        self.energy_offset_matrix[p1] = old_energy_offsets[p2]
+
+        # print info to repdat file
+        self.output_writer.append("repdat", [self.sim_time, i, j, old_s_values[p1], old_s_values[p2], p1, p2, exchange.probabilities[i], exchanged])
+        self.repdat_gromos.write(str(i+1) + "\t" + str(i+1) + "\t" + str(self.replica_positions[i]+1) + "\t" + str(j+1) + "\t" + str(j+1) + "\t" + str(p1+1) + "\t" + str(self.run) + "\t" + str(exchange.V_orig[i]) + "\t" + str(exchange.V_exch[i]) + "\t" + str(exchange.probabilities[i]) + "\t" + str(exchanged))
+        for k in range(self.EDS_simulation.num_endstates):
+          self.repdat_gromos.write("\t" + str(self.Vi_all[i][k]))
+        self.repdat_gromos.write("\n")
+
+      for replica in range(self.num_replicas):
+        if(replica != 0):
+          self.comm.send(self.s_values[replica], dest = replica)
+          self.comm.send(self.energy_offset_matrix[replica], dest = replica)
+        else:
+          self.set_eds_parameters(self.s_values[replica], self.energy_offset_matrix[replica])
+
+      self.run += 1
+
+    # replicas != 0 receive their current s values
+    else:
+      s_value = self.receive(source = 0)
+      energy_offsets = self.receive(source = 0)
+      self.set_eds_parameters(s_value, energy_offsets)
+
+  def receive(self, source):
+    """
+    blocking receive from rank source, the waiting time is counted as mpi_wait
+    """
+    with self.timers.phase("mpi_wait"):
+      return self.comm.recv(source = source)
+
+  def set_eds_parameters(self, s_value, energy_offsets):
+    """
+    sets the s-value and energy offsets of the replica of the current rank
+    """
+    self.EDS_simulation.s_value = s_value
+    self.EDS_simulation.energy_offsets = energy_offsets
+
+  def get_position(self):
+    """
+    returns the index of the s-value the replica of the current rank is at (sent by rank 0)
+    """
+    positions = None
+    if self.rank == 0:
+      positions = [0] * self.num_replicas
+      for idx, pos in enumerate(self.replica_positions):
+        positions[pos] = idx
+    return self.comm.scatter(positions, root = 0)
+
+  def flush_output(self):
+    if self.rank == 0:
+      self.output_writer.flush()
       self.repdat_gromos.flush()
       sys.stdout.flush()
-      
+
+  def save_checkpoint(self):
+    """
+    writes a binary OpenMM checkpoint of all replicas, the files are written in a background thread
+    """
+    idx = self.get_position()
+    checkpoint = self.EDS_simulation.context.createCheckpoint()
+    if self.comm.Get_size() == 1:
+      self.checkpoint_writer.submit(f"{self.system_name}.chk", checkpoint)
+    else:
+      self.checkpoint_writer.submit(f"{self.system_name}_state_s_{idx}.chk", checkpoint)
+    self.flush_output()
+
+  def save_state(self):
+    """
+    writes the (platform independent) xml state files of all replicas, which are used as input for the next simulation
+    """
+    idx = self.get_position()
+    if self.comm.Get_size() == 1:
+      self.EDS_simulation.saveState(self.system_name)
     else:
-      idx = self.comm.recv(source = 0)
       self.EDS_simulation.saveState(self.system_name + "_state_s_" + str(idx))
+    self.flush_output()
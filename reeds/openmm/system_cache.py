@@ -0,0 +1,61 @@
+"""
+cache of the serialized OpenMM systems of the RE-EDS engines
+
+the finished system (including the custom reaction field forces) is stored as XML in a cache directory,
+under a key computed from the contents of the input files and the simulation variables entering the system.
+a restart with the same inputs deserializes the system instead of rebuilding it.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+import openmm as mm
+
+def input_hash(filenames, **parameters):
+  """
+  returns a sha256 hash of the contents of the files and of the given parameters
+
+  Parameters
+  ----------
+  filenames: List[str]
+    input files (None entries are ignored)
+  parameters:
+    further values entering the system, converted with str() if they are not json serializable
+  """
+  sha = hashlib.sha256()
+  for filename in filenames:
+    if filename is None:
+      continue
+    with open(filename, "rb") as file:
+      for chunk in iter(lambda: file.read(1 << 20), b""):
+        sha.update(chunk)
+  sha.update(json.dumps(parameters, sort_keys = True, default = str).encode())
+  return sha.hexdigest()
+
+def cache_filename(cache_dir, key):
+  return os.path.join(cache_dir, f"{key}.xml")
+
+def load_system(cache_dir, key):
+  """
+  returns the cached system with the given key, or None if it is not in the cache
+  """
+  filename = cache_filename(cache_dir, key)
+  if not os.path.exists(filename):
+    return None
+  with open(filename) as file:
+    return mm.XmlSerializer.deserialize(file.read())
+
+def store_system(cache_dir, key, system):
+  """
+  serializes the system into the cache. several processes may store the same key at the same time,
+  therefore every process writes its own temporary file which is then renamed.
+  """
+  os.makedirs(cache_dir, exist_ok = True)
+  fd, tmp_filename = tempfile.mkstemp(dir = cache_dir, suffix = ".tmp")
+  with os.fdopen(fd, "w") as file:
+    file.write(mm.XmlSerializer.serialize(system))
+    file.flush()
+    os.fsync(file.fileno())
+  os.replace(tmp_filename, cache_filename(cache_dir, key))
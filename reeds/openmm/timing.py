@@ -0,0 +1,138 @@
+"""
+timing of the hot path of the parallel OpenMM RE-EDS simulations
+
+every rank accumulates the wall-clock time of the phases of REEDS.run (md, Vi, ene_traj, exchange,
+mpi_wait, checkpoint). the times are exclusive, e.g. the time rank 0 waits for the energies of the
+other replicas within write_ene_traj is only counted as mpi_wait. the timers of all ranks are gathered
+on rank 0, which appends them as one JSON line per dump to the timing file.
+
+optionally, a window of MD steps is profiled with cProfile or pyinstrument on every rank.
+"""
+
+import cProfile
+import json
+import time
+from contextlib import contextmanager
+
+PHASES = ["md", "Vi", "ene_traj", "exchange", "mpi_wait", "checkpoint"]
+
+class PhaseTimers:
+  """
+  per rank timers of the phases of REEDS.run
+
+  Parameters
+  ----------
+  comm: MPI.Comm
+    communicator of all replicas
+  filename: str
+    JSON lines file written by rank 0
+  every_n_steps: int
+    dump the timers every n MD steps (None: only at the end of the simulation)
+  """
+  def __init__(self, comm, filename, every_n_steps = None):
+    self.comm = comm
+    self.filename = filename
+    self.every_n_steps = every_n_steps
+    self.times = dict.fromkeys(PHASES, 0.0)
+    self.stack = []
+    self.last = None
+    self.last_step = 0
+    self.start_time = time.perf_counter()
+
+  @contextmanager
+  def phase(self, name):
+    """
+    counts the time of the enclosed block as phase name (and not for an enclosing phase)
+    """
+    now = time.perf_counter()
+    if self.stack:
+      self.times[self.stack[-1]] += now - self.last
+    self.stack.append(name)
+    self.last = now
+    try:
+      yield
+    finally:
+      now = time.perf_counter()
+      self.times[self.stack.pop()] += now - self.last
+      self.last = now
+
+  def is_due(self, step):
+    """
+    returns True if the timers should be dumped at the given MD step
+    """
+    return self.every_n_steps is not None and step // self.every_n_steps > self.last_step // self.every_n_steps
+
+  def dump(self, step, sim_time):
+    """
+    gathers the timers of all ranks on rank 0 and appends them to the timing file (collective call)
+    """
+    self.last_step = step
+    ranks = self.comm.gather(dict(self.times), root = 0)
+    if self.comm.Get_rank() != 0:
+      return
+    record = {
+      "step": step,
+      "time": sim_time,
+      "wall_time": time.perf_counter() - self.start_time,
+      "max": {phase: max(times[phase] for times in ranks) for phase in PHASES},
+      "mean": {phase: sum(times[phase] for times in ranks) / len(ranks) for phase in PHASES},
+      "ranks": ranks,
+    }
+    with open(self.filename, "a") as file:
+      file.write(json.dumps(record) + "\n")
+
+class ProfilerWindow:
+  """
+  profiles the MD steps [start, stop) of a simulation
+
+  Parameters
+  ----------
+  steps: Tuple[int, int]
+    first and last (exclusive) MD step of the window (None: no profiling)
+  filename: str
+    output file without extension (.prof for cProfile, readable with pstats/snakeviz, .txt for pyinstrument)
+  profiler: str
+    "cProfile" or "pyinstrument"
+  """
+  def __init__(self, steps, filename, profiler = "cProfile"):
+    if profiler not in ["cProfile", "pyinstrument"]:
+      raise ValueError(f"unknown profiler {profiler} (use 'cProfile' or 'pyinstrument')")
+    self.steps = steps
+    self.filename = filename
+    self.profiler_name = profiler
+    self.profiler = None
+    self.done = steps is None
+
+  def update(self, step):
+    """
+    starts or stops the profiler, called before the MD steps starting at step
+    """
+    if self.done:
+      return
+    start, stop = self.steps
+    if self.profiler is None and start <= step < stop:
+      if self.profiler_name == "pyinstrument":
+        from pyinstrument import Profiler
+        self.profiler = Profiler()
+        self.profiler.start()
+      else:
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+    elif self.profiler is not None and step >= stop:
+      self.close()
+
+  def close(self):
+    """
+    stops the profiler and writes the profile
+    """
+    if self.profiler is None:
+      return
+    if self.profiler_name == "pyinstrument":
+      self.profiler.stop()
+      with open(f"{self.filename}.txt", "w") as file:
+        file.write(self.profiler.output_text())
+    else:
+      self.profiler.disable()
+      self.profiler.dump_stats(f"{self.filename}.prof")
+    self.profiler = None
+    self.done = True
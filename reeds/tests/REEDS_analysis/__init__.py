@@ -0,0 +1,3 @@
+"""
+This module tests the analysis functions, which do not need gromos++.
+"""
@@ -0,0 +1,89 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from scipy import constants as const
+
+from reeds.function_libs.analysis.live_monitor import LiveREEDSMonitor, ZwanzigAccumulator
+
+
+class test_live_monitor(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.kt = (298.0 * const.k * const.Avogadro) / 1000
+        self.rng = np.random.default_rng(42)
+        self.energies = [self.rng.normal(-100.0, 5.0, size=(200, 3)) for _ in range(2)]
+        for replicaID in range(2):
+            with open(os.path.join(self.tmp_dir.name, "ene_traj_test_" + str(replicaID + 1)), "w") as out_file:
+                out_file.write("t              V_1            V_2            V_R            \n")
+        with open(os.path.join(self.tmp_dir.name, "repdat_test"), "w") as out_file:
+            out_file.write("time partner_i partner_j s_i s_j position_i position_j probability exchanged\n")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def append_frames(self, start: int, end: int, gibbs: bool = False):
+        for replicaID in range(2):
+            with open(os.path.join(self.tmp_dir.name, "ene_traj_test_" + str(replicaID + 1)), "a") as out_file:
+                for step in range(start, end):
+                    out_file.write(" ".join([str(step)] + [str(value) for value in self.energies[replicaID][step]]) + "\n")
+        with open(os.path.join(self.tmp_dir.name, "repdat_test"), "a") as out_file:
+            for step in range(start, end):
+                if (gibbs):
+                    # one row per position, the replicas swap at odd steps and stay at even steps
+                    for position in range(2):
+                        target = (position + step) % 2
+                        out_file.write(" ".join([str(step), str(position), str(target), "1", "0.1", str(position),
+                                                 str(target), "0.5", str(int(position != target))]) + "\n")
+                else:
+                    out_file.write(" ".join([str(step), "0", "1", "1", "0.1", "0", "1", "0.5", str(step % 2)]) + "\n")
+
+    def test_zwanzig_accumulator(self):
+        accumulator = ZwanzigAccumulator(3)
+        energies = self.energies[0]
+        for start in range(0, 200, 30):
+            accumulator.update(energies[start:start + 30], energies[start:start + 30, 0])
+        reference = -self.kt * np.log(np.mean(np.exp(-(energies - energies[:, [0]]) / self.kt), axis=0))
+        np.testing.assert_allclose(accumulator.free_energy_differences()[0], reference - reference[0], atol=1e-8)
+
+    def test_monitor(self):
+        monitor = LiveREEDSMonitor.from_openmm_output("test", 2, self.tmp_dir.name,
+                                                      energy_offsets=[[0.0, 0.0], [0.0, 10.0]])
+        monitor.update()
+        self.assertEqual(monitor.num_frames(), [0, 0])
+        self.assertTrue(np.isnan(monitor.exchange_frequencies()[0]))
+
+        self.append_frames(0, 120)
+        monitor.update()
+        self.append_frames(120, 200)
+        summary = monitor.update()
+        self.assertEqual(summary["num_frames"], [200, 200])
+        self.assertEqual(monitor.exchange_attempts.tolist(), [200])
+        np.testing.assert_allclose(monitor.exchange_frequencies(), [0.5])
+
+        state_energies = self.energies[1][:, :2]
+        np.testing.assert_allclose(monitor.sampling_fractions()[1],
+                                   np.bincount(np.argmin(state_energies, axis=1), minlength=2) / 200)
+        np.testing.assert_allclose(monitor.sampling_fractions("max_contributing_state")[1],
+                                   np.bincount(np.argmin(state_energies - [0.0, 10.0], axis=1), minlength=2) / 200)
+
+        V_i, V_R = self.energies[0][:, :2], self.energies[0][:, 2]
+        dF = -self.kt * np.log(np.mean(np.exp(-(V_i[:, 1] - V_R) / self.kt)) / np.mean(np.exp(-(V_i[:, 0] - V_R) / self.kt)))
+        self.assertAlmostEqual(summary["free_energy_differences"]["1_2"], dF, places=6)
+
+        self.assertEqual(monitor.check(min_exchange_frequency=0.2), [])
+        self.assertEqual(len(monitor.check(min_exchange_frequency=0.8)), 1)
+
+    def test_gibbs_exchanges(self):
+        monitor = LiveREEDSMonitor.from_openmm_output("test", 2, self.tmp_dir.name)
+        self.append_frames(0, 100, gibbs=True)
+        monitor.update()
+        self.append_frames(100, 200, gibbs=True)
+        summary = monitor.update()
+        self.assertEqual(summary["exchange_scheme"], "gibbs")
+        self.assertEqual(monitor.exchange_attempts.tolist(), [200, 200])
+        np.testing.assert_allclose(monitor.exchange_frequencies(), [0.5, 0.5])
+        self.assertEqual(monitor.check(min_exchange_frequency=0.2), [])
+        self.assertEqual(len(monitor.check(min_exchange_frequency=0.8)), 2)
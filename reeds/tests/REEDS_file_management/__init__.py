@@ -0,0 +1,3 @@
+"""
+This module tests the file management functions, which do not need gromos++.
+"""
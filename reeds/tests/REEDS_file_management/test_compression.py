@@ -0,0 +1,54 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+from reeds.function_libs.file_management import compression
+
+
+class test_compression(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.in_path = os.path.join(self.tmp_dir.name, "test_1.trc")
+        self.content = b"".join([("{:15d}{:20.9f}\n".format(step, step * 0.002)).encode() for step in range(20000)])
+        with open(self.in_path, "wb") as in_file:
+            in_file.write(self.content)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_compress_gzip(self):
+        out_path = compression.compress_file(self.in_path, n_threads=3, block_size=64 * 1024)
+        self.assertEqual(out_path, self.in_path + ".gz")
+        self.assertFalse(os.path.exists(self.in_path))
+        with gzip.open(out_path, "rb") as out_file:
+            self.assertEqual(out_file.read(), self.content)
+
+        index = compression.read_block_index(out_path)
+        self.assertEqual(index["size"], len(self.content))
+        self.assertEqual(len(index["offsets"]) - 1, -(-len(self.content) // (64 * 1024)))
+        self.assertEqual(compression.read_range(out_path, 100000, 200000), self.content[100000:300000])
+        self.assertEqual(compression.read_range(out_path, len(self.content) - 10, 100), self.content[-10:])
+
+    def test_without_index(self):
+        out_path = compression.compress_file(self.in_path, block_size=64 * 1024, write_index=False, remove_in_file=False)
+        self.assertTrue(os.path.exists(self.in_path))
+        self.assertIsNone(compression.read_block_index(out_path))
+        with compression.open_compressed(out_path, "rt") as out_file:
+            self.assertEqual(out_file.read(), self.content.decode())
+
+    def test_compress_zstd(self):
+        try:
+            import zstandard
+        except ImportError:
+            self.skipTest("zstandard is not installed")
+        out_path = compression.compress_file(self.in_path, codec="zstd", n_threads=2, block_size=64 * 1024)
+        self.assertEqual(out_path, self.in_path + ".zst")
+        with compression.open_compressed(out_path) as out_file:
+            self.assertEqual(out_file.read(), self.content)
+        self.assertEqual(compression.read_range(out_path, 65000, 1000), self.content[65000:66000])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import tarfile
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from reeds.data import ene_ana_libs
+from reeds.function_libs.file_management import compression, concatenation, tre_reader
+from reeds.tests.REEDS_file_management.test_tre_reader import write_tre
+
+
+class test_concatenation(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_concatenate_tre(self):
+        # three runs, each restarting at step 0 with the last frame of the previous run
+        paths = [os.path.join(self.tmp_dir.name, "test_1_" + str(run) + ".tre") for run in range(1, 4)]
+        eds = [write_tre(path, 10, seed=run)[1] for run, path in enumerate(paths)]
+        paths[1] = paths[1] + ".gz"
+        write_tre(paths[1], 10, seed=1)
+        with tarfile.open(paths[2] + ".tar.gz", "w:gz") as tar_file:
+            tar_file.add(paths[2], arcname="cluster/" + os.path.basename(paths[2]))
+        paths[2] = paths[2] + ".tar.gz"
+
+        out_path = os.path.join(self.tmp_dir.name, "test_1.tre.gz")
+        concatenation.concatenate_tre(paths, out_path)
+        energies = pd.concat(tre_reader.read_tre_chunks(out_path, ene_ana_libs.ene_ana_lib_path, ["e1"]), ignore_index=True)
+
+        np.testing.assert_allclose(energies["time"], 0.002 * np.arange(28), atol=1e-9)
+        np.testing.assert_allclose(energies["e1"], np.concatenate([eds[0][:, 0, 0], eds[1][1:, 0, 0], eds[2][1:, 0, 0]]))
+
+    def test_concatenate_trc(self):
+        # two runs with 3 frames of 4 solute and 9 solvent atoms, both starting at step 0
+        paths = []
+        for run in range(2):
+            path = os.path.join(self.tmp_dir.name, "test_" + str(run + 1) + "_1.trc")
+            with open(path, "w") as trc_file:
+                trc_file.write("TITLE\n\trun " + str(run) + "\nEND\n")
+                for frame in range(3):
+                    trc_file.write("TIMESTEP\n{:15d}{:20.9f}\nEND\nPOSITIONRED\n".format(frame * 100, frame * 0.2))
+                    for atom in range(13):
+                        trc_file.write("{:15.9f}{:15.9f}{:15.9f}\n".format(run, frame, atom))
+                        if ((atom + 1) % 10 == 0):
+                            trc_file.write("#{:10d}\n".format(atom + 1))
+                    trc_file.write("END\nGENBOX\n    1\n    3.0    3.0    3.0\nEND\n")
+            paths.append(path)
+        paths[1] = compression.compress_file(paths[1])
+
+        out_path = os.path.join(self.tmp_dir.name, "test_1.trc.gz")
+        concatenation.concatenate_trc(paths, out_path, time=10, dt=0.5, num_atoms=4)
+        with compression.open_compressed(out_path, "rt") as trc_file:
+            lines = trc_file.read().split("\n")
+
+        self.assertEqual(lines.count("TITLE"), 1)
+        self.assertIn("\trun 0", lines)
+        steps = [lines[i + 1].split() for i, line in enumerate(lines) if (line == "TIMESTEP")]
+        self.assertEqual([int(step) for step, _ in steps], [0, 100, 200, 300, 400, 500])
+        self.assertEqual([float(time) for _, time in steps], [10, 10.5, 11, 11.5, 12, 12.5])
+        positions = [line for line in lines if (len(line) == 45)]
+        self.assertEqual(len(positions), 6 * 4)
+        self.assertEqual([float(x) for x in positions[-1].split()], [1, 2, 3])
+        self.assertEqual(lines.count("GENBOX"), 6)
+        self.assertNotIn("#        10", lines)
+
+    def test_count_solute_atoms(self):
+        topology_path = os.path.join(os.path.dirname(__file__), "..", "pipeline_test", "PNMT_WATER_PIPELINE", "input",
+                                     "0_input_start", "PNMT_9lig_water.top")
+        self.assertEqual(concatenation.count_solute_atoms(topology_path), 170)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from reeds.function_libs.file_management import energy_trajectory
+
+in_BRD4_7ligs = os.path.dirname(__file__) + "/../REEDS_eoff/data/7ligs/energies_BRD4_7ligs_s1.dat"
+
+
+class test_energy_trajectory(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        # tre_reader output: tab separated with a plain header
+        self.tre_reader_path = os.path.join(self.tmp_dir.name, "energies_s1.dat")
+        with open(self.tre_reader_path, "w") as out_file:
+            out_file.write("time\te1\te2\teR\n")
+            for step in range(10):
+                out_file.write("\t".join([str(step * 0.2), str(-10.0 - step), str(-20.0 - step), str(-30.0 - step)]) + "\n")
+        # ene_ana output: comments, the last one contains the column names
+        self.ene_ana_path = os.path.join(self.tmp_dir.name, "energies_s2.dat")
+        with open(self.ene_ana_path, "w") as out_file:
+            out_file.write("# ene_ana output\n#  time     e1     e2     eR\n")
+            for step in range(10):
+                out_file.write("  " + "    ".join([str(step * 0.2), str(-10.0 - step), str(-20.0 - step), str(-30.0 - step)]) + "\n")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_read_header(self):
+        self.assertEqual(energy_trajectory.read_header(self.tre_reader_path), (1, ["time", "e1", "e2", "eR"], "\t"))
+        self.assertEqual(energy_trajectory.read_header(self.ene_ana_path), (2, ["time", "e1", "e2", "eR"], r"\s+"))
+
+    def test_read_energy_trajectory(self):
+        for in_path in [self.tre_reader_path, self.ene_ana_path]:
+            ene_traj = energy_trajectory.read_energy_trajectory(in_path, chunk_size=3)
+            self.assertEqual(list(ene_traj.columns), ["time", "e1", "e2", "eR"])
+            self.assertEqual(len(ene_traj), 10)
+            np.testing.assert_allclose(ene_traj["eR"], -30.0 - np.arange(10))
+
+            ene_traj = energy_trajectory.read_energy_trajectory(in_path, columns=["time", "eR"], dtype=np.float32,
+                                                                trim_equil=0.3, chunk_size=4)
+            self.assertEqual(list(ene_traj.columns), ["time", "eR"])
+            self.assertEqual(ene_traj["eR"].dtype, np.float32)
+            np.testing.assert_allclose(ene_traj["eR"], -33.0 - np.arange(7))
+
+        with self.assertRaises(ValueError):
+            energy_trajectory.read_energy_trajectory(self.tre_reader_path, columns=["e3"])
+
+    def test_read_reference_data(self):
+        ene_traj = energy_trajectory.read_energy_trajectory(in_BRD4_7ligs, columns=["time", "e1", "eR"], trim_equil=0.1)
+        self.assertEqual(len(ene_traj), 10050 - 1005)
+        self.assertEqual(ene_traj["time"].iloc[0], 1005 * 4)
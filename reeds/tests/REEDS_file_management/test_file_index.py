@@ -0,0 +1,57 @@
+import os
+import tempfile
+import time
+import unittest
+
+from reeds.function_libs.file_management import file_index
+
+
+class test_file_index(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = self.tmp_dir.name
+        for run in [1, 2, 10]:
+            run_dir = os.path.join(self.root, "run_" + str(run), "simulation")
+            os.makedirs(run_dir)
+            for replica in [1, 2, 12]:
+                suffix = ".tre.gz" if (run == 1) else ".tre"
+                open(os.path.join(run_dir, "PNMT_sopt_" + str(run) + "_" + str(replica) + suffix), "w").close()
+            open(os.path.join(run_dir, "PNMT_sopt_" + str(run) + "_1.cnf"), "w").close()
+        os.makedirs(os.path.join(self.root, "eq_1"))
+        open(os.path.join(self.root, "eq_1", "PNMT_eq_1_1.tre"), "w").close()
+        # pretend the files were written earlier, so the listings are cached
+        past = time.time() - 60
+        for path, _, _ in os.walk(self.root):
+            os.utime(path, (past, past))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_parse_file_name(self):
+        self.assertEqual(file_index.parse_file_name("PNMT_sopt_2_13.tre.gz"), (13, 2, ".tre.gz"))
+        self.assertEqual(file_index.parse_file_name("PNMT_13.cnf"), (13, None, ".cnf"))
+        self.assertIsNone(file_index.parse_file_name("repdat.dat"))
+
+    def test_replica_files(self):
+        index = file_index.FileIndex(self.root)
+        files = index.replica_files(12, fileSuffixes=[".tre", ".tre.tar.gz"])
+        self.assertEqual([os.path.basename(path) for path in files[1]], ["PNMT_sopt_1_1.tre.gz", "PNMT_sopt_2_1.tre", "PNMT_sopt_10_1.tre"])
+        self.assertEqual(len(files[12]), 3)
+        self.assertEqual(files[3], [])
+        self.assertEqual(len(index.replica_files(12, fileSuffixes=".cnf")[1]), 3)
+
+    def test_cache(self):
+        file_index.FileIndex(self.root)
+        self.assertTrue(os.path.exists(os.path.join(self.root, file_index.index_file_name)))
+
+        # a new file in a listed directory changes its modification time
+        run_dir = os.path.join(self.root, "run_2", "simulation")
+        open(os.path.join(run_dir, "PNMT_sopt_2_3.tre"), "w").close()
+        index = file_index.FileIndex(self.root)
+        self.assertEqual(len(index.replica_files(12)[3]), 1)
+        self.assertEqual(sorted(path for path, _, _ in index.walk()), sorted(path for path, _, _ in os.walk(self.root)))
+
+
+if __name__ == '__main__':
+    unittest.main()
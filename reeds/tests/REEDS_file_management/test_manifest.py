@@ -0,0 +1,52 @@
+import os
+import tempfile
+import unittest
+
+from reeds.function_libs.file_management import manifest
+
+
+class test_manifest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.in_paths = [os.path.join(self.tmp_dir.name, "test_" + str(run) + "_1.tre") for run in range(1, 3)]
+        for run, path in enumerate(self.in_paths):
+            with open(path, "w") as in_file:
+                in_file.write("run " + str(run) + "\n")
+        self.out_path = os.path.join(self.tmp_dir.name, "out_1.tre")
+        with open(self.out_path, "w") as out_file:
+            out_file.write("run 0\nrun 1\n")
+        self.parameters = {"dt": 0.002, "properties": ["eR", "e1"]}
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_up_to_date(self):
+        # no entry: e.g. a partial file of a crashed job
+        self.assertFalse(manifest.is_up_to_date(self.out_path, self.in_paths, self.parameters))
+        manifest.record(self.out_path, self.in_paths, self.parameters)
+        self.assertTrue(manifest.is_up_to_date(self.out_path, self.in_paths, self.parameters))
+        self.assertFalse(manifest.is_up_to_date(self.out_path, self.in_paths, {"dt": 0.004, "properties": ["eR", "e1"]}))
+        self.assertFalse(manifest.is_up_to_date(self.out_path, self.in_paths[:1], self.parameters))
+
+        # same content with a new modification time
+        os.utime(self.in_paths[0], ns=(0, 10 ** 9))
+        self.assertTrue(manifest.is_up_to_date(self.out_path, self.in_paths, self.parameters))
+
+        with open(self.in_paths[1], "w") as in_file:
+            in_file.write("run 2\n")
+        self.assertFalse(manifest.is_up_to_date(self.out_path, self.in_paths, self.parameters))
+
+    def test_changed_output(self):
+        manifest.record(self.out_path, self.in_paths)
+        with open(self.out_path, "w") as out_file:
+            out_file.write("run 0\n")
+        self.assertFalse(manifest.is_up_to_date(self.out_path, self.in_paths))
+
+        manifest.invalidate(self.out_path)
+        self.assertFalse(os.path.exists(self.out_path))
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir.name, manifest.manifest_dir_name, "out_1.tre.json")))
+
+
+if __name__ == '__main__':
+    unittest.main()
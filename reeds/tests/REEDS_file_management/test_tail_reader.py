@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from reeds.function_libs.file_management import tail_reader
+
+
+class test_tail_reader(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.in_path = os.path.join(self.tmp_dir.name, "ene_traj_test_1")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def append(self, content: str, path: str = None):
+        with open(path or self.in_path, "a") as out_file:
+            out_file.write(content)
+
+    def test_text(self):
+        reader = tail_reader.open_tail_reader(self.in_path, keep_data=True)
+        # the file does not exist yet
+        self.assertEqual(len(reader.read_new()), 0)
+
+        self.append("t              V_1            V_R            \n0.0000         -1.5           -2.5\n1.00")
+        new_rows = reader.read_new()
+        self.assertEqual(list(new_rows.columns), ["t", "V_1", "V_R"])
+        self.assertEqual(new_rows["V_R"].tolist(), [-2.5])
+
+        # the incomplete line is parsed once it is complete
+        self.append("00         -1.6           -2.6\n")
+        self.assertEqual(reader.read_new()["t"].tolist(), [1.0])
+        self.assertEqual(len(reader.read_new()), 0)
+        self.assertEqual(reader.data["V_1"].tolist(), [-1.5, -1.6])
+
+        # a restarted run writes a new (shorter) file
+        os.remove(self.in_path)
+        self.append("t V_1 V_R\n5.0 -1.0 -2.0\n")
+        self.assertEqual(reader.read_new()["t"].tolist(), [5.0])
+        self.assertEqual(reader.num_resets, 1)
+
+    def test_comment_header(self):
+        reader = tail_reader.open_tail_reader(self.in_path)
+        self.append("# ene_ana\n#  time  e1  eR\n  0.0  -1.0  -2.0\n")
+        self.assertEqual(reader.read_new().columns.tolist(), ["time", "e1", "eR"])
+
+    def test_binary(self):
+        from reeds.openmm.output_writer import AsyncOutputWriter
+
+        writer = AsyncOutputWriter("binary", buffer_size=2)
+        path = writer.add_stream(0, self.in_path, ["t", "V_1", "V_R"], "")
+        reader = tail_reader.open_tail_reader(path)
+        for step in range(3):
+            writer.append(0, [step, -1.0 - step, -2.0 - step])
+        writer.flush()
+        np.testing.assert_allclose(reader.read_new()["t"], [0.0, 1.0, 2.0])
+
+        # half a chunk is not read
+        with open(path, "ab") as out_file:
+            out_file.write(np.array([1], dtype=np.int64).tobytes() + np.zeros(2).tobytes())
+        self.assertEqual(len(reader.read_new()), 0)
+        with open(path, "ab") as out_file:
+            out_file.write(np.array([-3.0]).tobytes())
+        np.testing.assert_allclose(reader.read_new().to_numpy(), [[0.0, 0.0, -3.0]])
+        writer.close()
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import unittest
+
+from reeds.function_libs.file_management import task_graph
+
+
+def append_line(path: str, line: str) -> str:
+    with open(path, "a") as out_file:
+        out_file.write(line + "\n")
+    return line
+
+
+def fail(message: str):
+    raise IOError(message)
+
+
+class test_task_graph(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.log_path = os.path.join(self.tmp_dir.name, "log")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def run_chains(self, n_processes: int):
+        graph = task_graph.TaskGraph(n_processes=n_processes)
+        for replicaID in range(1, 5):
+            graph.add_task(("cat_tre", replicaID), append_line, args=(self.log_path, "cat_tre " + str(replicaID)))
+            graph.add_task(("ene_ana", replicaID), append_line, args=(self.log_path, "ene_ana " + str(replicaID)),
+                           dependencies=[("cat_tre", replicaID)])
+        results = graph.run()
+        self.assertEqual(results[("ene_ana", 3)], "ene_ana 3")
+
+        with open(self.log_path, "r") as log_file:
+            order = log_file.read().split("\n")
+        for replicaID in range(1, 5):
+            self.assertLess(order.index("cat_tre " + str(replicaID)), order.index("ene_ana " + str(replicaID)))
+
+    def test_serial(self):
+        self.run_chains(1)
+
+    def test_parallel(self):
+        self.run_chains(2)
+
+    def test_errors(self):
+        graph = task_graph.TaskGraph(n_processes=2)
+        graph.add_task(("cat_tre", 1), fail, args=("broken tre",))
+        self.assertRaises(ValueError, graph.add_task, ("cat_tre", 1), fail)
+        self.assertRaises(ValueError, graph.add_task, ("ene_ana", 2), fail, dependencies=[("cat_tre", 2)])
+        graph.add_task(("ene_ana", 1), append_line, args=(self.log_path, "ene_ana 1"), dependencies=[("cat_tre", 1)])
+        self.assertRaises(ChildProcessError, graph.run)
+        self.assertFalse(os.path.exists(self.log_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
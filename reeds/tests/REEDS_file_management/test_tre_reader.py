@@ -0,0 +1,99 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from reeds.data import ene_ana_libs
+from reeds.function_libs.file_management import tre_reader
+
+num_states = 9
+
+
+def write_tre(path, num_frames, first_step=0, dt=0.002, seed=0):
+    """writes a random energy trajectory in the layout of the 9 state ene_ana library, returns ENER and EDS"""
+    rng = np.random.default_rng(seed)
+    ener = rng.normal(size=(num_frames, 43))
+    eds = rng.normal(size=(num_frames, num_states, 4))
+    temperature = rng.normal(300, 5, size=(num_frames, 2, 4))
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "wt") as tre_file:
+        tre_file.write("TITLE\n  test trajectory\nEND\nENEVERSION\n 2015-06-23-A\nEND\n")
+        for frame in range(num_frames):
+            step = first_step + frame
+            tre_file.write("TIMESTEP\n" + f"{step:>15d}{step * dt:>15.6f}\n" + "END\n")
+            tre_file.write("ENERGY03\n# totals\n" + "\n".join(f"{x:.9e}" for x in ener[frame]) + "\n")
+            tre_file.write("# baths\n 2\n" + "\n".join(" ".join(["1.0"] * 3) for _ in range(2)) + "\n")
+            tre_file.write("# bonded\n 2\n" + "\n".join(" ".join(["2.0"] * 5) for _ in range(2)) + "\n")
+            tre_file.write("# nonbonded\n" + "\n".join(" ".join(["3.0"] * 4) for _ in range(3)) + "\n")
+            tre_file.write("# special\n" + "\n".join(" ".join(["4.0"] * 11) for _ in range(2)) + "\n")
+            tre_file.write("# eds\n " + str(num_states) + "\n" + "\n".join(" ".join(f"{x:.9e}" for x in row) for row in eds[frame]) + "\nEND\n")
+            tre_file.write("VOLUMEPRESSURE03\n 100.0\n 2\n" + "\n".join(" ".join(f"{x:.9e}" for x in row) for row in temperature[frame]) + "\n")
+            tre_file.write("\n".join(["5.0"] * 10) + "\n" + "\n".join(["6.0"] * 30) + "\nEND\n")
+    return ener, eds, temperature
+
+
+class test_tre_reader(unittest.TestCase):
+    properties = ["solvtemp2", "totdisres", "eR"] + ["e" + str(i) for i in range(1, num_states + 1)]
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_chunks(self):
+        path = os.path.join(self.tmp_dir.name, "test_1.tre.gz")
+        ener, eds, temperature = write_tre(path, 25)
+        chunks = list(tre_reader.read_tre_chunks(path, ene_ana_libs.ene_ana_lib_path, self.properties, chunk_size=10))
+        self.assertEqual([len(chunk) for chunk in chunks], [10, 10, 5])
+
+        energies = pd.concat(chunks, ignore_index=True)
+        self.assertEqual(list(energies.columns), ["time"] + self.properties)
+        np.testing.assert_allclose(energies["time"], np.arange(25) * 0.002)
+        np.testing.assert_allclose(energies["eR"], ener[:, 34])
+        np.testing.assert_allclose(energies["totdisres"], ener[:, 24])
+        np.testing.assert_allclose(energies["solvtemp2"], temperature[:, 1, 0])
+        for i in range(num_states):
+            np.testing.assert_allclose(energies["e" + str(i + 1)], eds[:, i, 0])
+
+        liglig = next(tre_reader.read_tre_chunks(path, ene_ana_libs.ene_ana_lib_path, ["liglig", "pressu"]))
+        np.testing.assert_allclose(liglig["liglig"], 6.0)
+        np.testing.assert_allclose(liglig["pressu"], 6.0 * 16.388453)
+
+    def test_isolate_energies(self):
+        paths = [os.path.join(self.tmp_dir.name, "test_" + str(i) + ".tre") for i in range(2)]
+        eds = np.concatenate([write_tre(path, 7, first_step=7 * i, seed=i)[1] for i, path in enumerate(paths)])
+
+        out_path = os.path.join(self.tmp_dir.name, "test_energies_s1.dat")
+        tre_reader.isolate_energies(paths, out_path, ene_ana_libs.ene_ana_lib_path, self.properties, chunk_size=3, time=10, dt=0.2)
+        energies = pd.read_csv(out_path, sep="\t")
+        np.testing.assert_allclose(energies["time"], 10 + 0.2 * np.arange(14))
+        np.testing.assert_allclose(energies["e3"], eds[:, 2, 0])
+
+        out_path = os.path.join(self.tmp_dir.name, "test_energies_s1.npy")
+        tre_reader.isolate_energies(paths, out_path, ene_ana_libs.ene_ana_lib_path, self.properties, out_format="npy")
+        energies = np.load(out_path)
+        np.testing.assert_allclose(energies["time"], 0.002 * np.arange(14))
+        np.testing.assert_allclose(energies["e9"], eds[:, 8, 0])
+
+    def test_isolate_energies_npy_chunks(self):
+        paths = [os.path.join(self.tmp_dir.name, "test_" + str(i) + ".tre.gz") for i in range(2)]
+        ener = np.concatenate([write_tre(path, 8, first_step=8 * i, seed=i)[0] for i, path in enumerate(paths)])
+
+        # the records are streamed in chunks of 3 frames and the header is written at the end
+        out_path = os.path.join(self.tmp_dir.name, "test_energies_s1.npy")
+        tre_reader.isolate_energies(paths, out_path, ene_ana_libs.ene_ana_lib_path, self.properties, chunk_size=3,
+                                    out_format="npy")
+        energies = np.load(out_path)
+        self.assertEqual(energies.shape, (16,))
+        self.assertEqual(energies.dtype.names, tuple(["time"] + self.properties))
+        np.testing.assert_allclose(energies["time"], 0.002 * np.arange(16))
+        np.testing.assert_allclose(energies["eR"], ener[:, 34])
+        self.assertEqual(sorted(os.listdir(self.tmp_dir.name)), sorted([os.path.basename(path) for path in paths] + ["test_energies_s1.npy"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
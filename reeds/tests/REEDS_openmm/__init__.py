@@ -0,0 +1,3 @@
+"""
+This module tests the MPI and OpenMM independent parts of the OpenMM RE-EDS engines.
+"""
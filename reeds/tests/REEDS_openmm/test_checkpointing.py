@@ -0,0 +1,18 @@
+import unittest
+
+from reeds.openmm.checkpointing import CheckpointPolicy
+
+class test_checkpointing(unittest.TestCase):
+
+    def test_end_checkpoint(self):
+        policy = CheckpointPolicy(every_n_steps = 100)
+        steps = list(range(20, 220, 20))
+        for step in steps:
+            if policy.is_due(step):
+                policy.mark(step)
+        # the checkpoint of the last interval (step 200) is the end-of-run checkpoint
+        self.assertEqual(policy.last_step, 200)
+        self.assertFalse(policy.is_due_at_end(200))
+        self.assertTrue(policy.is_due_at_end(220))
+        self.assertTrue(policy.is_due_at_end(0))
+        self.assertFalse(CheckpointPolicy(at_end = False).is_due_at_end(220))
@@ -0,0 +1,41 @@
+import unittest
+
+from reeds.openmm.devices import assign_device, get_local_rank
+
+class test_devices(unittest.TestCase):
+    platforms = ["Reference", "CPU", "CUDA", "OpenCL"]
+
+    def test_local_rank(self):
+        self.assertEqual(get_local_rank(5, {}), 5)
+        self.assertEqual(get_local_rank(5, {"OMPI_COMM_WORLD_LOCAL_RANK": "2"}), 2)
+        self.assertEqual(get_local_rank(5, {"SLURM_LOCALID": "3"}), 3)
+
+    def test_gpus_spread_evenly(self):
+        devices = [assign_device(rank, list(range(8)), 0, 1, self.platforms, {"CUDA": 3}).properties["DeviceIndex"] for rank in range(8)]
+        self.assertEqual([devices.count(str(device)) for device in range(3)], [3, 3, 2])
+        assignment = assign_device(0, list(range(8)), 0, 1, self.platforms, {"CUDA": 0, "OpenCL": 2})
+        self.assertEqual(assignment.platform, "OpenCL")
+
+    def test_cpu_threads_and_pinning(self):
+        cores = list(range(16))
+        cpu_sets = []
+        for rank in range(4):
+            assignment = assign_device(rank, cores, rank, 4, self.platforms, {"CUDA": 0, "OpenCL": 0})
+            self.assertEqual(assignment.platform, "CPU")
+            self.assertEqual(assignment.properties, {"Threads": "4"})
+            cpu_sets += assignment.cpu_set
+        self.assertEqual(sorted(cpu_sets), cores)
+
+        # more ranks than cores: one thread per rank, no pinning
+        assignment = assign_device(5, cores[:4], 5, 8, self.platforms, {})
+        self.assertEqual(assignment.properties, {"Threads": "1"})
+        self.assertIsNone(assignment.cpu_set)
+
+        # ranks bound to their cores by the launcher use all of them
+        assignment = assign_device(1, [2, 3], 0, 1, self.platforms, {})
+        self.assertEqual((assignment.properties, assignment.cpu_set), ({"Threads": "2"}, [2, 3]))
+
+    def test_explicit_platform(self):
+        self.assertEqual(assign_device(0, [0], 0, 1, self.platforms, {"CUDA": 2}, platform = "Reference").platform, "Reference")
+        with self.assertRaises(ValueError):
+            assign_device(0, [0], 0, 1, ["Reference", "CPU"], {}, platform = "CUDA")
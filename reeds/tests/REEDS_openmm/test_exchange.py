@@ -0,0 +1,79 @@
+import unittest
+
+import numpy as np
+
+from reeds.openmm import exchange
+
+class test_exchange(unittest.TestCase):
+    beta = 1 / (0.0083144626 * 298.15)
+    num_replicas = 7
+    num_endstates = 4
+
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        self.Vi = rng.normal(-100, 20, (self.num_replicas, self.num_endstates))
+        self.s_values = np.logspace(0, -3, self.num_replicas)
+        self.energy_offsets = rng.normal(0, 10, (self.num_replicas, self.num_endstates))
+        self.replica_positions = [3, 1, 0, 2, 6, 4, 5]
+
+    def V_R(self, Vi, s, energy_offsets):
+        # scalar reference, as in the GROMOS-like loop of the engines
+        terms = -self.beta * s * (np.array(Vi) - energy_offsets)
+        return -1 / (self.beta * s) * (np.max(terms) + np.log(np.sum(np.exp(terms - np.max(terms)))))
+
+    def test_reference_energies(self):
+        V_R = exchange.reference_energies(self.Vi, self.s_values, self.energy_offsets, self.beta)
+        for i in range(self.num_replicas):
+            self.assertAlmostEqual(V_R[i], self.V_R(self.Vi[i], self.s_values[i], self.energy_offsets[i]))
+
+    def test_metropolis_exchange_probabilities(self):
+        for begin in [0, 1]:
+            result = exchange.metropolis_exchange(self.Vi, self.s_values, self.energy_offsets, self.replica_positions, begin, self.beta)
+            self.assertEqual(result.pairs, list(range(begin, self.num_replicas - 1, 2)))
+            for k, i in enumerate(result.pairs):
+                p1, p2 = self.replica_positions[i], self.replica_positions[i+1]
+                V_orig = self.V_R(self.Vi[i], self.s_values[p1], self.energy_offsets[p1]) + self.V_R(self.Vi[i+1], self.s_values[p2], self.energy_offsets[p2])
+                V_exch = self.V_R(self.Vi[i], self.s_values[p2], self.energy_offsets[p2]) + self.V_R(self.Vi[i+1], self.s_values[p1], self.energy_offsets[p1])
+                expected = min(1, np.exp(-self.beta * (V_exch - V_orig)))
+                self.assertAlmostEqual(result.probabilities[k], expected)
+
+    def test_metropolis_exchange_permutation(self):
+        result = exchange.metropolis_exchange(self.Vi, self.s_values, self.energy_offsets, self.replica_positions, 0, self.beta, np.random.default_rng(1))
+        self.assertEqual(sorted(result.replica_positions), list(range(self.num_replicas)))
+        for k, i in enumerate(result.pairs):
+            if result.accepted[k]:
+                self.assertEqual(result.replica_positions[i], self.replica_positions[i+1])
+                self.assertEqual(result.replica_positions[i+1], self.replica_positions[i])
+            else:
+                self.assertEqual(result.replica_positions[i], self.replica_positions[i])
+        # last replica has no partner for an odd number of replicas
+        self.assertEqual(result.replica_positions[-1], self.replica_positions[-1])
+
+    def test_gibbs_exchange_permutation(self):
+        result = exchange.gibbs_exchange(self.Vi, self.s_values, self.energy_offsets, self.replica_positions, self.beta, rng = np.random.default_rng(1))
+        self.assertEqual(sorted(result.targets), list(range(self.num_replicas)))
+        for i, j in enumerate(result.targets):
+            # the replica at position i moves to position j and takes over the parameters found there
+            self.assertEqual(result.replica_positions[j], self.replica_positions[i])
+            p = self.replica_positions[j]
+            self.assertAlmostEqual(result.V_exch[i], self.V_R(self.Vi[i], self.s_values[p], self.energy_offsets[p]))
+
+    def test_gibbs_exchange_distribution(self):
+        # for three replicas the Boltzmann weights of all 6 permutations can be enumerated
+        import itertools
+        rng = np.random.default_rng(7)
+        Vi = rng.normal(0, 2, (3, 2))
+        s_values = np.array([1.0, 0.3, 0.1])
+        energy_offsets = np.zeros((3, 2))
+        V_R = exchange.reference_energies(Vi[:, None, :], s_values[None, :], energy_offsets[None, :, :], self.beta)
+        permutations = list(itertools.permutations(range(3)))
+        weights = np.array([np.exp(-self.beta * sum(V_R[a, t[a]] for a in range(3))) for t in permutations])
+        weights /= np.sum(weights)
+
+        counts = dict.fromkeys(permutations, 0)
+        num_samples = 4000
+        for _ in range(num_samples):
+            result = exchange.gibbs_exchange(Vi, s_values, energy_offsets, [0, 1, 2], self.beta, num_attempts = 300, rng = rng)
+            counts[tuple(result.targets)] += 1
+        for t, w in zip(permutations, weights):
+            self.assertAlmostEqual(counts[t] / num_samples, w, delta = 0.03)
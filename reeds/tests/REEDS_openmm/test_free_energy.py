@@ -0,0 +1,61 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from reeds.openmm.free_energy import FreeEnergyAccumulator
+
+class test_free_energy(unittest.TestCase):
+    beta = 1 / (0.0083144626 * 298.15)
+    num_replicas = 3
+    num_endstates = 4
+
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        self.Vi = rng.normal(-100, 5, (self.num_replicas, 500, self.num_endstates))
+        self.V_R = self.Vi.min(axis = 2) - 1.0
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmp_dir.name, "test_free_energies.json")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def fill(self, accumulator):
+        for frame in range(self.Vi.shape[1]):
+            for s_index in range(self.num_replicas):
+                accumulator.update(s_index, self.Vi[s_index, frame], self.V_R[s_index, frame])
+
+    def test_zwanzig(self):
+        accumulator = FreeEnergyAccumulator(self.num_replicas, self.num_endstates, self.beta)
+        self.assertTrue(np.all(np.isnan(accumulator.free_energy_differences(0))))
+        self.fill(accumulator)
+
+        for s_index in range(self.num_replicas):
+            mean_exp = np.mean(np.exp(-self.beta * (self.Vi[s_index] - self.V_R[s_index][:, None])), axis = 0)
+            reference = [-1/self.beta * np.log(mean_exp[j]/mean_exp[i]) for i in range(self.num_endstates) for j in range(i+1, self.num_endstates)]
+            np.testing.assert_allclose(accumulator.pair_differences(s_index), reference, atol = 1e-8)
+
+    def test_no_overflow(self):
+        accumulator = FreeEnergyAccumulator(1, 2, self.beta)
+        # exp(beta * 5000) overflows a float64
+        for _ in range(10):
+            accumulator.update(0, [-5000.0, -4990.0], 0.0)
+        np.testing.assert_allclose(accumulator.free_energy_differences(0)[0, 1], 10.0)
+
+    def test_dump(self):
+        accumulator = FreeEnergyAccumulator(self.num_replicas, self.num_endstates, self.beta, self.filename, every_n_steps = 1000)
+        self.assertFalse(accumulator.is_due(500))
+        self.assertTrue(accumulator.is_due(1000))
+        accumulator.dump(1000, 2.0)
+        self.fill(accumulator)
+        accumulator.dump(2000, 4.0)
+
+        with open(self.filename, "r") as file:
+            record = json.load(file)
+        self.assertEqual(record["pairs"][:3], ["1_2", "1_3", "1_4"])
+        self.assertEqual(record["num_frames"], [500] * self.num_replicas)
+        np.testing.assert_allclose(record["dF"][1], accumulator.pair_differences(1))
+        self.assertEqual([entry["step"] for entry in record["convergence"]], [1000, 2000])
+        self.assertIsNone(record["convergence"][0]["dF"][0][0])
@@ -0,0 +1,48 @@
+import io
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+
+from reeds.openmm import reeds_openmm_CI_parallel, reeds_openmm_CustomCVForce_parallel, reeds_openmm_parallel, reeds_openmm_parallel_ptp
+from reeds.openmm.exchange import gibbs_result
+
+class test_gibbs_exchanges(unittest.TestCase):
+    engines = [reeds_openmm_parallel, reeds_openmm_CI_parallel, reeds_openmm_CustomCVForce_parallel, reeds_openmm_parallel_ptp]
+
+    def make_reeds(self, engine, energy_offsets):
+        # rank 0 of a simulation with three replicas, only the state used by perform_gibbs_exchanges
+        reeds = object.__new__(engine.REEDS)
+        reeds.rank = 0
+        reeds.num_replicas = 3
+        reeds.run = 1
+        reeds.sim_time = 0.0
+        reeds.s_values = [1.0, 0.1, 0.01]
+        reeds.energy_offset_matrix = energy_offsets
+        reeds.replica_positions = [0, 1, 2]
+        reeds.Vi_all = np.zeros((3, 2))
+        reeds.EDS_simulation = SimpleNamespace(beta = 1.0, num_endstates = 2)
+        reeds.reeds_simulation_variables = SimpleNamespace(num_gibbs_attempts = 1)
+        reeds.output_writer = mock.Mock()
+        reeds.repdat_gromos = io.StringIO()
+        reeds.comm = mock.Mock()
+        reeds.set_eds_parameters = mock.Mock()
+        return reeds
+
+    def test_cyclic_permutation(self):
+        # the replica at position i takes over the parameters at position (i+1) % 3
+        exchange = gibbs_result(targets = [1, 2, 0], probabilities = [1.0] * 3, replica_positions = [2, 0, 1], V_orig = [0.0] * 3, V_exch = [0.0] * 3)
+        energy_offsets = np.array([[0.0, 1.0], [0.0, 2.0], [0.0, 3.0]])
+
+        for engine in self.engines:
+            reeds = self.make_reeds(engine, energy_offsets.copy())
+            with mock.patch.object(engine, "gibbs_exchange", return_value = exchange):
+                reeds.perform_gibbs_exchanges()
+
+            np.testing.assert_array_equal(reeds.energy_offset_matrix, energy_offsets[[1, 2, 0]], err_msg = engine.__name__)
+            self.assertEqual(reeds.s_values, [0.1, 0.01, 1.0])
+            sent = [call.args[0] for call in reeds.comm.send.call_args_list]
+            np.testing.assert_array_equal(sent[1], energy_offsets[2])
+            np.testing.assert_array_equal(sent[3], energy_offsets[0])
+            np.testing.assert_array_equal(reeds.set_eds_parameters.call_args.args[1], energy_offsets[1])
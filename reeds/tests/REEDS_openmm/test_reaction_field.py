@@ -0,0 +1,81 @@
+import unittest
+
+import numpy as np
+import openmm as mm
+
+from reeds.openmm.reaction_field import NonbondedParameters, PerturbedParameters
+
+class test_reaction_field(unittest.TestCase):
+    num_particles = 30
+
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        self.force = mm.NonbondedForce()
+        for _ in range(self.num_particles):
+            self.force.addParticle(rng.choice([0, 0.3, -0.5]), rng.uniform(0.1, 0.4), rng.choice([0, 0.2]))
+        pairs = set()
+        while len(pairs) < 60:
+            j, k = sorted(rng.choice(self.num_particles, 2, replace = False).tolist())
+            pairs.add((j, k))
+        for j, k in sorted(pairs):
+            self.force.addException(j, k, rng.choice([0, 0.1]), 0.3, rng.choice([0, 0.5]))
+        self.active_particles = list(range(5, 20))
+
+    def test_one_four_bonds(self):
+        # reference: the per exception loop of the engines
+        expected_pairs, expected_parameters = [], []
+        for index in range(self.force.getNumExceptions()):
+            j, k, chargeprod, sigma, epsilon = self.force.getExceptionParameters(index)
+            if j in self.active_particles and k in self.active_particles and (chargeprod._value != 0 or epsilon._value != 0):
+                ch1, _, _ = self.force.getParticleParameters(j)
+                ch2, _, _ = self.force.getParticleParameters(k)
+                expected_pairs.append([j, k])
+                expected_parameters.append([chargeprod._value, sigma._value, epsilon._value, (ch1*ch2)._value])
+
+        pairs, parameters = NonbondedParameters(self.force).one_four_bonds(self.active_particles)
+        self.assertEqual(pairs, expected_pairs)
+        np.testing.assert_allclose(parameters, expected_parameters)
+
+    def test_excluded_and_self_term_bonds(self):
+        expected_pairs, expected_parameters = [], []
+        for index in range(self.force.getNumExceptions()):
+            j, k, chargeprod, sigma, epsilon = self.force.getExceptionParameters(index)
+            if j in self.active_particles and k in self.active_particles and chargeprod._value == 0:
+                ch1, _, _ = self.force.getParticleParameters(j)
+                ch2, _, _ = self.force.getParticleParameters(k)
+                expected_pairs.append([j, k])
+                expected_parameters.append([(ch1*ch2)._value])
+
+        nonbonded_parameters = NonbondedParameters(self.force)
+        pairs, parameters = nonbonded_parameters.excluded_bonds(self.active_particles)
+        self.assertEqual(pairs, expected_pairs)
+        np.testing.assert_allclose(np.reshape(parameters, (-1, 1)), np.reshape(expected_parameters, (-1, 1)))
+
+        pairs, parameters = nonbonded_parameters.self_term_bonds(self.active_particles)
+        self.assertEqual(pairs, [[i, i] for i in self.active_particles])
+        np.testing.assert_allclose(np.ravel(parameters), [self.force.getParticleParameters(i)[0]._value**2 for i in self.active_particles])
+
+    def test_perturbed_parameters(self):
+        num_endstates = 3
+        rng = np.random.default_rng(5)
+        perturbations = {}
+        for particle in self.active_particles:
+            perturbations[particle] = [[rng.uniform(-10, 10), rng.choice([0, 2.0e6]), rng.choice([0, 1.5e3])] for _ in range(num_endstates)]
+
+        perturbed_parameters = PerturbedParameters(NonbondedParameters(self.force), perturbations, num_endstates)
+        # reference: the per particle conversion of custom_reaction_field_ptp
+        for particle in range(self.num_particles):
+            for state in range(num_endstates):
+                if particle in perturbations:
+                    charge, a, b = perturbations[particle][state]
+                    charge /= 18.2223
+                    sigma, epsilon = ((a / b)**(1/6) * 0.1, b**2 / (4 * a) * 4.184) if a != 0 and b != 0 else (0.0, 0.0)
+                else:
+                    charge, sigma, epsilon = [p._value for p in self.force.getParticleParameters(particle)]
+                np.testing.assert_allclose([perturbed_parameters.charges[particle, state], perturbed_parameters.sigmas[particle, state], perturbed_parameters.epsilons[particle, state]], [charge, sigma, epsilon])
+
+        pairs, parameters = perturbed_parameters.excluded_bonds()
+        expected_pairs, _ = NonbondedParameters(self.force).excluded_bonds(self.active_particles)
+        self.assertEqual(pairs, expected_pairs)
+        for (j, k), bond_parameters in zip(pairs, parameters):
+            np.testing.assert_allclose(bond_parameters, perturbed_parameters.charges[j] * perturbed_parameters.charges[k])
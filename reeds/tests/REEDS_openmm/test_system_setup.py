@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+import openmm as mm
+from openmm import unit as u
+
+from reeds.openmm import reeds_openmm_CustomCVForce_parallel as engine
+
+input_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "examples", "openmm", "input")
+energy_offsets = [0.0, -25.13, -94.15, 105.73, 122.62, 139.76]
+
+class FakeComm:
+    """COMM_WORLD seen by one rank, bcast returns the system broadcasted by rank 0"""
+    def __init__(self, rank, broadcasted = None):
+        self.rank = rank
+        self.broadcasted = broadcasted
+
+    def Get_rank(self):
+        return self.rank
+
+    def bcast(self, data, root = 0):
+        if self.rank == root:
+            self.broadcasted = data
+        return self.broadcasted
+
+class test_system_setup(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp_dir.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp_dir.cleanup()
+
+    def make_simulation(self, comm, system_cache_dir = None):
+        variables = engine.EDSSimulationVariables(0.1, energy_offsets, pressure = None, eps_reaction_field = 1, system_cache_dir = system_cache_dir)
+        input_files = engine.EDSInputFiles(os.path.join(input_dir, "all_ligands_vac.leap.prm"), os.path.join(input_dir, "all_ligands_vac.leap.crd"))
+        with mock.patch.object(engine, "MPI", SimpleNamespace(COMM_WORLD = comm)):
+            return engine.EDSSimulation("test", variables, input_files, mm.Platform.getPlatformByName("Reference"))
+
+    def test_broadcasted_system(self):
+        root_comm = FakeComm(0)
+        root = self.make_simulation(root_comm)
+        replica = self.make_simulation(FakeComm(1, root_comm.broadcasted))
+
+        self.assertFalse(root.system_loaded)
+        self.assertTrue(replica.system_loaded)
+        # the end-state forces (groups 2, ...) only enter through the EDS force (group 1)
+        self.assertEqual(root.integrator.getIntegrationForceGroups(), 0b11)
+        self.assertEqual(replica.integrator.getIntegrationForceGroups(), 0b11)
+
+    def test_cached_system(self):
+        cache_dir = os.path.join(self.tmp_dir.name, "system_cache")
+        built = self.make_simulation(FakeComm(0), system_cache_dir = cache_dir)
+        loaded = self.make_simulation(FakeComm(0), system_cache_dir = cache_dir)
+
+        self.assertFalse(built.system_loaded)
+        self.assertTrue(loaded.system_loaded)
+        self.assertEqual(built.integrator.getIntegrationForceGroups(), 0b11)
+        self.assertEqual(loaded.integrator.getIntegrationForceGroups(), 0b11)
+
+        # the integrated forces (groups 0 and 1) of the same configuration
+        positions = built.context.getState(getPositions = True).getPositions()
+        loaded.context.setPositions(positions)
+        forces = [simulation.context.getState(getForces = True, groups = {0, 1}).getForces(asNumpy = True).value_in_unit(u.kilojoule_per_mole/u.nanometer)
+                  for simulation in (built, loaded)]
+        np.testing.assert_allclose(forces[1], forces[0], rtol = 1e-6, atol = 1e-6)
@@ -0,0 +1,3 @@
+"""
+This module tests the job scheduling functions, which do not need a queueing system.
+"""
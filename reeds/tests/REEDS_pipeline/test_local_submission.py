@@ -0,0 +1,65 @@
+import os
+import tempfile
+import unittest
+
+from reeds.function_libs.pipeline.jobScheduling_scripts.local_submission import LocalProcessPoolSubmission
+
+
+class test_local_submission(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, "queue.sqlite")
+        self.log_path = os.path.join(self.tmp_dir.name, "log")
+        self.queue = LocalProcessPoolSubmission(db_path=self.db_path, n_cpus=4, memory=1000, poll_interval=0.05,
+                                                autostart=False)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def submit(self, name: str, command: str = None, **kwargs) -> int:
+        return self.queue.submit_to_queue(command=command or "echo " + name + " >> " + self.log_path, jobName=name,
+                                          submit_from_dir=self.tmp_dir.name, **kwargs)
+
+    def test_dependencies(self):
+        first = self.submit("run_1")
+        second = self.submit("run_2", queue_after_jobID=first)
+        failing = self.submit("fail", command="exit 3")
+        cancelled = self.submit("after_fail", queue_after_jobID=failing)
+        chained = self.submit("after_cancelled", queue_after_jobID=cancelled)
+        forced = self.submit("ana", queue_after_jobID=failing, force_queue_start_after=True)
+
+        self.assertEqual(self.queue.get_jobs_from_queue(job_name="run_2"), [second])
+        states = self.queue.wait(timeout=30)
+        self.assertEqual(states, {first: "DONE", second: "DONE", failing: "EXIT", cancelled: "CANCELLED",
+                                  chained: "CANCELLED", forced: "DONE"})
+        self.assertEqual(self.queue.get_jobs_from_queue(job_name="run_2"), [])
+
+        with open(self.log_path, "r") as log_file:
+            order = log_file.read().split()
+        self.assertLess(order.index("run_1"), order.index("run_2"))
+        self.assertNotIn("after_fail", order)
+
+        # the state is kept in the queue file
+        self.assertEqual(LocalProcessPoolSubmission(db_path=self.db_path, autostart=False).job_state(failing), "EXIT")
+
+    def test_slots(self):
+        big = self.submit("big", command="sleep 0.5", nmpi=3)
+        too_big = self.submit("too_big", nmpi=2)
+        small = self.submit("small", nmpi=1)
+
+        # the small job is packed onto the free core, the other jobs wait for the big one
+        self.assertEqual(self.queue.dispatch(), [big, small])
+        self.assertEqual(self.queue.job_state(too_big), "PEND")
+        self.assertEqual(self.queue.wait(timeout=30)[too_big], "DONE")
+
+        with self.assertRaises(ValueError):
+            self.submit("too_many_cores", nmpi=5)
+        with self.assertRaises(ValueError):
+            self.submit("too_much_memory", nmpi=2, maxStorage=600)
+        with self.assertRaises(ValueError):
+            self.submit("unknown_dependency", queue_after_jobID=1000)
+
+    def test_duration(self):
+        job = self.submit("slow", command="sleep 30", duration="0:00:01")
+        self.assertEqual(self.queue.wait(timeout=20)[job], "EXIT")
@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from reeds.function_libs.pipeline.jobScheduling_scripts.local_submission import LocalProcessPoolSubmission
+from reeds.function_libs.pipeline.jobScheduling_scripts.scheduler_functions import QueueSnapshot, do_skip_job
+
+
+class CountingSubmission(LocalProcessPoolSubmission):
+    num_queries = 0
+
+    def get_queued_jobs(self):
+        self.num_queries += 1
+        return super().get_queued_jobs()
+
+    def get_jobs_from_queue(self, job_name: str, **kwargs):
+        self.num_queries += 1
+        return super().get_jobs_from_queue(job_name, **kwargs)
+
+
+class test_scheduler_functions(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.out_dir = os.path.join(self.tmp_dir.name, "simulation")
+        self.queue = CountingSubmission(db_path=os.path.join(self.tmp_dir.name, "queue.sqlite"), n_cpus=1,
+                                        autostart=False)
+        self.job_ids = [self.queue.submit_to_queue(command="true", jobName="test_" + str(run),
+                                                   submit_from_dir=self.tmp_dir.name) for run in (3, 4)]
+        # run 1 and 2 are finished
+        for run in (1, 2):
+            os.makedirs(os.path.join(self.out_dir, "test_" + str(run)))
+            open(os.path.join(self.out_dir, "test_" + str(run), "test_" + str(run) + "_1.cnf"), "w").close()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def skip_decisions(self, queue_snapshot: QueueSnapshot = None):
+        decisions = []
+        for run in range(1, 6):
+            tmp_out_cnf = os.path.join(self.out_dir, "test_" + str(run), "test_" + str(run) + ".cnf")
+            decisions.append(do_skip_job(tmp_out_cnf=tmp_out_cnf, simSystem=SimpleNamespace(coordinates=None),
+                                         tmp_jobname="test_" + str(run), job_submission_system=self.queue,
+                                         previous_job=None, queue_snapshot=queue_snapshot, verbose=False))
+        return decisions
+
+    def test_snapshot(self):
+        expected = [(True, None), (True, None), (True, self.job_ids[0]), (True, self.job_ids[1]), (False, None)]
+        self.assertEqual(self.skip_decisions(), expected)
+        self.assertEqual(self.queue.num_queries, 5)
+
+        self.queue.num_queries = 0
+        queue_snapshot = QueueSnapshot(self.queue, out_dir_path=self.out_dir)
+        self.assertEqual(self.skip_decisions(queue_snapshot), expected)
+        self.assertEqual(self.queue.num_queries, 1)
+
+        queue_snapshot.add_job("test_5", 100)
+        self.assertEqual(queue_snapshot.get_jobs_from_queue("test_5"), [100])
+        self.assertEqual(queue_snapshot.glob_out_cnfs(os.path.join(self.out_dir, "test_2", "test*.cnf")),
+                         [os.path.join(self.out_dir, "test_2", "test_2_1.cnf")])